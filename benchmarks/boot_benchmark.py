@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Boot-time benchmark for web processes.
+
+Measures wall time and peak RSS of `manage.py check` and of booting the WSGI
+and ASGI applications (including loading the URLconf, as the first request
+would), and fails if the media stack was imported or a budget is exceeded.
+
+    python benchmarks/boot_benchmark.py --runs 5 --max-seconds 3 --max-rss-mb 120
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only worker processes should ever import
+MEDIA_MODULES = ['speech_recognition', 'pysrt', 'moviepy', 'pydub', 'numpy', 'imageio', 'PIL']
+
+BOOT_SNIPPET = """
+import json, os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'subtitle_generator.settings')
+from subtitle_generator.{module} import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps(sorted(name for name in {media_modules!r} if name in sys.modules)))
+"""
+
+CHECK_SNIPPET = """
+import json, os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'subtitle_generator.settings')
+sys.argv = ['manage.py', 'check']
+from django.core.management import execute_from_command_line
+execute_from_command_line(sys.argv)
+print(json.dumps(sorted(name for name in {media_modules!r} if name in sys.modules)))
+"""
+
+
+def measure(code):
+    """Run a Python snippet in a fresh interpreter; return (seconds, peak RSS in MB, loaded media modules)."""
+    env = dict(os.environ, SUBTITLE_INLINE_WORKERS='False')
+    wrapper = (
+        "import resource, sys\n"
+        + code
+        + "\nprint(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stderr)\n"
+    )
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', wrapper],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    max_rss_kb = int(result.stderr.strip().splitlines()[-1])
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    rss_mb = max_rss_kb / (1024 * 1024) if sys.platform == 'darwin' else max_rss_kb / 1024
+    return elapsed, rss_mb, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None, help='Budget for the median boot time.')
+    parser.add_argument('--max-rss-mb', type=float, default=None, help='Budget for the peak RSS.')
+    args = parser.parse_args()
+
+    scenarios = {
+        'manage.py check': CHECK_SNIPPET.format(media_modules=MEDIA_MODULES),
+        'wsgi boot': BOOT_SNIPPET.format(module='wsgi', media_modules=MEDIA_MODULES),
+        'asgi boot': BOOT_SNIPPET.format(module='asgi', media_modules=MEDIA_MODULES),
+    }
+
+    failures = []
+    for name, code in scenarios.items():
+        timings = []
+        peak_rss = 0.0
+        loaded = []
+        for _ in range(args.runs):
+            elapsed, rss_mb, loaded = measure(code)
+            timings.append(elapsed)
+            peak_rss = max(peak_rss, rss_mb)
+        median = statistics.median(timings)
+        print(f"{name:16} median {median:.3f}s  min {min(timings):.3f}s  peak RSS {peak_rss:.1f} MB")
+
+        if loaded:
+            failures.append(f"{name}: media stack imported at boot: {', '.join(loaded)}")
+        if args.max_seconds is not None and median > args.max_seconds:
+            failures.append(f"{name}: median boot {median:.3f}s exceeds {args.max_seconds}s")
+        if args.max_rss_mb is not None and peak_rss > args.max_rss_mb:
+            failures.append(f"{name}: peak RSS {peak_rss:.1f} MB exceeds {args.max_rss_mb} MB")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
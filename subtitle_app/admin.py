@@ -1,9 +1,18 @@
 from django.contrib import admin
-from .models import VideoUpload
+from .models import VideoUpload, WebhookDelivery
 
 @admin.register(VideoUpload)
 class VideoUploadAdmin(admin.ModelAdmin):
-    list_display = ('id', 'filename', 'status', 'created_at', 'updated_at')
+    list_display = ('id', 'filename', 'status', 'priority', 'media_duration', 'created_at', 'updated_at')
     list_filter = ('status', 'created_at')
+    list_editable = ('priority',)
     search_fields = ('video_file', 'status')
-    readonly_fields = ('created_at', 'updated_at')
\ No newline at end of file
+    readonly_fields = ('created_at', 'updated_at', 'started_at')
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'upload', 'event', 'url', 'status', 'attempts', 'response_status', 'next_attempt_at', 'created_at')
+    list_filter = ('status', 'event')
+    search_fields = ('url',)
+    readonly_fields = ('created_at', 'last_attempt_at', 'delivered_at')
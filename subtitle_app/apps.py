@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class SubtitleAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'subtitle_app'
\ No newline at end of file
+    name = 'subtitle_app'
+
+    def ready(self):
+        # Register signal handlers (status cache invalidation)
+        from . import signals  # noqa: F401
@@ -0,0 +1,156 @@
+"""
+Cache of preprocessed audio for fast subtitle regeneration.
+
+After extraction and preprocessing, the 16kHz mono audio of a job is stored
+as FLAC (roughly a third of the size of the WAV) together with its
+calibrated energy threshold and the preprocessing steps it was made with.
+Re-running a job with the same steps (regenerate endpoint, retries after a
+failure or a requeue) starts from that artifact and skips decoding and
+preprocessing. Artifacts live in the media storage and are evicted least
+recently used first to stay within SUBTITLE_AUDIO_CACHE_MAX_BYTES.
+"""
+import os
+import subprocess
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .media import get_ffmpeg_binary
+from .models import AudioArtifact
+from .storage import file_exists
+
+SAMPLE_RATE = 16000
+# Jobs in these states may be about to read an artifact (a queued regeneration) or reading it
+IN_USE_STATUSES = ('pending', 'processing')
+
+
+def cache_enabled():
+    return getattr(settings, 'SUBTITLE_AUDIO_CACHE_MAX_BYTES', 0) > 0
+
+
+def flac_encoder_command(output_path):
+    """ffmpeg command that encodes int16 mono 16kHz PCM from stdin to a FLAC file."""
+    return [get_ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-i', 'pipe:0',
+            '-c:a', 'flac', output_path]
+
+
+class FlacEncoder:
+    """Encode a stream of int16 mono 16kHz windows to a FLAC file through an ffmpeg pipe."""
+
+    def __init__(self, output_path, timeout=None):
+        self.output_path = output_path
+        self.timeout = timeout
+        self.process = subprocess.Popen(
+            flac_encoder_command(output_path),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+
+    def write(self, samples):
+        self.process.stdin.write(samples.tobytes())
+
+    def close(self):
+        """Finish the file; raises if ffmpeg failed."""
+        self.process.stdin.close()
+        try:
+            returncode = self.process.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+            raise Exception(f"Audio encoding timed out after {self.timeout} seconds")
+        error_output = self.process.stderr.read().decode('utf-8', errors='replace').strip()
+        self.process.stderr.close()
+        if returncode != 0:
+            raise Exception(f"Failed to encode audio: {error_output[-500:]}")
+        return self.output_path
+
+    def abort(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        for stream in (self.process.stdin, self.process.stderr):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+def find_artifact(video_upload, preprocessing=None):
+    """
+    Return the usable audio artifact of an upload (or of the upload it was
+    deduplicated from), or None. With `preprocessing`, only an artifact made
+    with those preprocessing steps is returned.
+    """
+    for upload_id in (video_upload.pk, video_upload.deduplicated_from_id):
+        if upload_id is None:
+            continue
+        artifacts = AudioArtifact.objects.filter(upload_id=upload_id)
+        if preprocessing is not None:
+            artifacts = artifacts.filter(preprocessing=preprocessing)
+        artifact = artifacts.first()
+        if artifact is not None and file_exists(artifact.audio_file):
+            return artifact
+    return None
+
+
+def touch_artifact(artifact):
+    """Mark an artifact as recently used."""
+    artifact.last_used_at = timezone.now()
+    artifact.save(update_fields=['last_used_at'])
+
+
+def store_artifact(video_upload, flac_path, duration=None, energy_threshold=None, preprocessing=''):
+    """Save a FLAC file as the upload's audio artifact (replacing an older one) and enforce the budget."""
+    if not cache_enabled():
+        return None
+    size = os.path.getsize(flac_path)
+    AudioArtifact.objects.filter(upload=video_upload).delete()
+    artifact = AudioArtifact(
+        upload=video_upload,
+        size=size,
+        duration=duration,
+        energy_threshold=energy_threshold,
+        preprocessing=preprocessing,
+    )
+    with open(flac_path, 'rb') as f:
+        artifact.audio_file.save('audio.flac', File(f), save=False)
+    artifact.save()
+    print(f"Cached preprocessed audio of upload {video_upload.id} ({size} bytes)")
+    enforce_budget()
+    return artifact
+
+
+def enforce_budget(max_bytes=None):
+    """
+    Delete least recently used artifacts until the cache fits in its size budget.
+
+    Artifacts of queued or running jobs (or of their deduplicated copies) are
+    never evicted, including the one a running job has just stored.
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'SUBTITLE_AUDIO_CACHE_MAX_BYTES', 0)
+    total = AudioArtifact.objects.aggregate(total=Sum('size'))['total'] or 0
+    if total <= max_bytes:
+        return 0
+
+    in_use = Q(upload__status__in=IN_USE_STATUSES) | Q(upload__duplicates__status__in=IN_USE_STATUSES)
+    evicted = 0
+    for artifact in AudioArtifact.objects.exclude(in_use).order_by('last_used_at').iterator():
+        if total <= max_bytes:
+            break
+        total -= artifact.size
+        # The file is removed by the post_delete signal
+        artifact.delete()
+        evicted += 1
+    print(f"Evicted {evicted} cached audio artifacts to stay within {max_bytes} bytes")
+    return evicted
+
+
+def delete_artifact_file(artifact):
+    """Delete an artifact's file from storage."""
+    if artifact.audio_file and artifact.audio_file.storage.exists(artifact.audio_file.name):
+        artifact.audio_file.storage.delete(artifact.audio_file.name)
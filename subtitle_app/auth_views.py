@@ -1,11 +1,16 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny
 from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import aauthenticate, logout
 from django.contrib.auth.models import User
 from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+import json
+from .authentication import InvalidToken, aauthenticate_request, invalidate_user_tokens
 
 
 @api_view(['POST'])
@@ -81,24 +86,40 @@ def register(request):
         )
 
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def login_view(request):
-    """User login endpoint."""
-    data = request.data
+def parse_request_data(request):
+    """Parse a JSON or form-encoded request body into a dict."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+@csrf_exempt
+@require_POST
+async def login_view(request):
+    """User login endpoint (async)."""
+    data = parse_request_data(request)
+    if data is None:
+        return JsonResponse(
+            {'detail': 'JSON parse error.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
     if 'email' not in data or 'password' not in data:
-        return Response(
+        return JsonResponse(
             {'error': 'Email and password are required'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
     # Authenticate user (username is email in our case)
-    user = authenticate(request, username=data['email'], password=data['password'])
+    user = await aauthenticate(request, username=data['email'], password=data['password'])
     
     if user is not None:
-        token, _ = Token.objects.get_or_create(user=user)
-        return Response(
+        token, _ = await Token.objects.aget_or_create(user=user)
+        return JsonResponse(
             {
                 'message': 'Login successful',
                 'token': token.key,
@@ -112,7 +133,7 @@ def login_view(request):
             status=status.HTTP_200_OK
         )
     else:
-        return Response(
+        return JsonResponse(
             {'error': 'Invalid email or password'},
             status=status.HTTP_401_UNAUTHORIZED
         )
@@ -123,6 +144,8 @@ def login_view(request):
 def logout_view(request):
     """User logout endpoint. Invalidates token when authenticated via token."""
     if request.user.is_authenticated:
+        # Drop the cached token -> user entries before deleting the tokens
+        invalidate_user_tokens(request.user)
         Token.objects.filter(user=request.user).delete()
         logout(request)
     return Response(
@@ -131,24 +154,28 @@ def logout_view(request):
     )
 
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def current_user(request):
-    """Get current logged in user."""
-    if request.user.is_authenticated:
-        return Response(
+@require_GET
+async def current_user(request):
+    """Get current logged in user (async)."""
+    try:
+        user = await aauthenticate_request(request)
+    except InvalidToken as e:
+        return JsonResponse({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    if user.is_authenticated:
+        return JsonResponse(
             {
                 'user': {
-                    'id': request.user.id,
-                    'email': request.user.email,
-                    'first_name': request.user.first_name,
-                    'last_name': request.user.last_name,
+                    'id': user.id,
+                    'email': user.email,
+                    'first_name': user.first_name,
+                    'last_name': user.last_name,
                 }
             },
             status=status.HTTP_200_OK
         )
     else:
-        return Response(
+        return JsonResponse(
             {'user': None},
             status=status.HTTP_200_OK
         )
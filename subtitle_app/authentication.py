@@ -0,0 +1,182 @@
+"""
+Token authentication with caching, plus helpers for the async (non-DRF) API views.
+
+DRF's TokenAuthentication runs a Token + User query on every request. Here a
+token resolves to its user through a small in-process LRU (short TTL) and the
+shared Django cache before falling back to the database. Entries are dropped
+as soon as a token is deleted (logout) or its user is saved or deactivated.
+Other processes learn about it through a revocation marker in the shared
+cache, which is checked before an in-process entry is used.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class InvalidToken(Exception):
+    """Raised when a token header is present but does not match an active user."""
+
+
+class LocalTokenCache:
+    """Thread-safe LRU of token key -> user with a per-entry TTL."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_token_cache = LocalTokenCache(
+    max_size=getattr(settings, 'SUBTITLE_TOKEN_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'SUBTITLE_TOKEN_CACHE_TTL', 10),
+)
+
+
+def shared_cache_key(key):
+    # Hash the token so raw credentials never appear in cache keys
+    return 'subtitle_app:token:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def shared_cache_timeout():
+    return getattr(settings, 'SUBTITLE_TOKEN_SHARED_CACHE_TTL', 300)
+
+
+def revocation_key(key):
+    return 'subtitle_app:token-revoked:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def revocation_timeout():
+    # Outlives every in-process entry made before the revocation
+    return getattr(settings, 'SUBTITLE_TOKEN_CACHE_TTL', 10) + 1
+
+
+def invalidate_token(key):
+    """Forget a cached token in this process and in the shared cache, and mark it for other processes."""
+    local_token_cache.delete(key)
+    cache.delete(shared_cache_key(key))
+    cache.set(revocation_key(key), True, revocation_timeout())
+
+
+def invalidate_user_tokens(user):
+    """Forget every cached token of a user (logout, deactivation, profile changes)."""
+    for key in Token.objects.filter(user_id=user.pk).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+def check_active(user):
+    if not user.is_active:
+        raise InvalidToken('User inactive or deleted.')
+    return user
+
+
+def get_token_user(key):
+    """Return the active user for a token key, using the caches before the database."""
+    user = local_token_cache.get(key)
+    if user is not None:
+        if not cache.get(revocation_key(key)):
+            return check_active(user)
+        local_token_cache.delete(key)
+
+    user = cache.get(shared_cache_key(key))
+    if user is None:
+        try:
+            user = Token.objects.select_related('user').get(key=key).user
+        except Token.DoesNotExist:
+            raise InvalidToken('Invalid token.')
+        cache.set(shared_cache_key(key), user, shared_cache_timeout())
+    local_token_cache.set(key, user)
+    return check_active(user)
+
+
+async def aget_token_user(key):
+    """Async version of get_token_user."""
+    user = local_token_cache.get(key)
+    if user is not None:
+        if not await cache.aget(revocation_key(key)):
+            return check_active(user)
+        local_token_cache.delete(key)
+
+    user = await cache.aget(shared_cache_key(key))
+    if user is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            raise InvalidToken('Invalid token.')
+        user = token.user
+        await cache.aset(shared_cache_key(key), user, shared_cache_timeout())
+    local_token_cache.set(key, user)
+    return check_active(user)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in replacement for TokenAuthentication that caches token -> user lookups."""
+
+    def authenticate_credentials(self, key):
+        try:
+            user = get_token_user(key)
+        except InvalidToken as e:
+            raise exceptions.AuthenticationFailed(str(e))
+        # Unsaved Token instance: request.auth keeps the key without another query
+        return (user, Token(key=key, user=user))
+
+
+def get_token_key(request):
+    """Return the token key from the Authorization header, or None if there is none."""
+    parts = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if not parts or parts[0].lower() != 'token':
+        return None
+    if len(parts) != 2:
+        raise InvalidToken('Invalid token header.')
+    return parts[1]
+
+
+async def aauthenticate_request(request):
+    """
+    Return the user making the request (AnonymousUser if unauthenticated).
+
+    Raises InvalidToken for a bad token, like DRF's TokenAuthentication.
+    """
+    key = get_token_key(request)
+    if key is not None:
+        return await aget_token_user(key)
+
+    user = await request.auser()
+    return user if user is not None else AnonymousUser()
@@ -0,0 +1,151 @@
+"""
+Queue-driven scaling of `run_subtitle_worker` processes on one node.
+
+The `run_subtitle_supervisor` command samples the queue (pending jobs and
+how long the oldest has waited) and the host (load average per CPU and
+available memory) every SUBTITLE_AUTOSCALE_INTERVAL seconds and asks
+`AutoscalePolicy` how many worker processes it should run. Workers are added
+while jobs wait longer than SUBTITLE_AUTOSCALE_SCALE_UP_AGE and the host has
+headroom (at most once per SUBTITLE_AUTOSCALE_SCALE_UP_COOLDOWN, so new
+workers get to boot and claim jobs before more are added), and retired one
+at a time after the queue has been empty for
+SUBTITLE_AUTOSCALE_SCALE_DOWN_DELAY seconds. Retired workers get SIGTERM,
+so they stop claiming jobs and exit once their running jobs are done.
+"""
+import math
+import os
+import time
+
+from django.conf import settings
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import VideoUpload
+
+
+def queue_metrics(now=None):
+    """Return the number of pending jobs and the age in seconds of the oldest one."""
+    now = now or timezone.now()
+    stats = VideoUpload.objects.filter(status='pending').aggregate(
+        pending=Count('pk'),
+        # Regenerated and requeued jobs are re-queued in place, so updated_at is when they were queued
+        oldest=Min('updated_at'),
+    )
+    oldest_age = (now - stats['oldest']).total_seconds() if stats['oldest'] else 0.0
+    return {'pending': stats['pending'], 'oldest_age': max(oldest_age, 0.0)}
+
+
+def cpu_load():
+    """Return the 1-minute load average per CPU, or None where it is not available."""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def available_memory_mb():
+    """Return the memory available for new processes in MB (Linux), or None."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def host_metrics():
+    return {'cpu_load': cpu_load(), 'available_memory_mb': available_memory_mb()}
+
+
+class AutoscalePolicy:
+    """Decide how many worker processes to run from queue and host metrics."""
+
+    def __init__(self, min_workers=None, max_workers=None, worker_concurrency=None,
+                 scale_up_age=None, scale_down_delay=None, max_cpu_load=None, min_free_memory_mb=None,
+                 scale_up_cooldown=None):
+        self.min_workers = max(
+            min_workers if min_workers is not None else getattr(settings, 'SUBTITLE_AUTOSCALE_MIN_WORKERS', 1), 0
+        )
+        self.max_workers = max(
+            max_workers or getattr(settings, 'SUBTITLE_AUTOSCALE_MAX_WORKERS', 0) or os.cpu_count() or 1,
+            self.min_workers,
+        )
+        self.worker_concurrency = max(
+            worker_concurrency or getattr(settings, 'SUBTITLE_WORKER_CONCURRENCY', 2), 1
+        )
+        self.scale_up_age = (
+            scale_up_age if scale_up_age is not None
+            else getattr(settings, 'SUBTITLE_AUTOSCALE_SCALE_UP_AGE', 30.0)
+        )
+        self.scale_up_cooldown = (
+            scale_up_cooldown if scale_up_cooldown is not None
+            else getattr(settings, 'SUBTITLE_AUTOSCALE_SCALE_UP_COOLDOWN', 60.0)
+        )
+        self.scale_down_delay = (
+            scale_down_delay if scale_down_delay is not None
+            else getattr(settings, 'SUBTITLE_AUTOSCALE_SCALE_DOWN_DELAY', 120.0)
+        )
+        self.max_cpu_load = max_cpu_load or getattr(settings, 'SUBTITLE_AUTOSCALE_MAX_CPU_LOAD', 0.9)
+        self.min_free_memory_mb = (
+            min_free_memory_mb if min_free_memory_mb is not None
+            else getattr(settings, 'SUBTITLE_AUTOSCALE_MIN_FREE_MEMORY_MB', 1024)
+        )
+        self._idle_since = None
+        self._scaled_up_at = None
+
+    def host_saturated(self, host):
+        """Return the reason the host cannot take another worker, or None."""
+        if host.get('cpu_load') is not None and host['cpu_load'] >= self.max_cpu_load:
+            return f"CPU load {host['cpu_load']:.2f} per core"
+        memory = host.get('available_memory_mb')
+        if memory is not None and memory < self.min_free_memory_mb:
+            return f"{memory:.0f} MB memory available"
+        return None
+
+    def desired_workers(self, current, queue, host, now=None):
+        """
+        Return (desired worker count, reason).
+
+        Scaling up adds enough workers for the pending jobs (each runs
+        `worker_concurrency` of them) in one step, then waits out the cooldown
+        while those workers boot and claim jobs; scaling down retires one
+        worker per decision, so capacity drops gradually.
+        """
+        now = now if now is not None else time.monotonic()
+        pending = queue['pending']
+
+        if pending:
+            self._idle_since = None
+        elif self._idle_since is None:
+            self._idle_since = now
+
+        if current < self.min_workers:
+            self._scaled_up_at = now
+            return self.min_workers, 'below minimum'
+
+        # With no workers at all nothing will pick the jobs up, so don't wait for them to age
+        waiting = pending and (current == 0 or queue['oldest_age'] >= self.scale_up_age)
+        if waiting and current < self.max_workers:
+            # Jobs the last workers added have not claimed yet still count as pending
+            since_scale_up = now - self._scaled_up_at if self._scaled_up_at is not None else None
+            if since_scale_up is not None and since_scale_up < self.scale_up_cooldown:
+                return current, f"{pending} jobs waiting; workers added {since_scale_up:.0f}s ago are still starting"
+            saturated = self.host_saturated(host)
+            if saturated:
+                return current, f"{pending} jobs waiting but host is busy ({saturated})"
+            wanted = min(current + math.ceil(pending / self.worker_concurrency), self.max_workers)
+            self._scaled_up_at = now
+            return wanted, f"{pending} jobs waiting, oldest for {queue['oldest_age']:.0f}s"
+
+        if current > self.max_workers:
+            return self.max_workers, 'above maximum'
+
+        if (current > self.min_workers and self._idle_since is not None
+                and now - self._idle_since >= self.scale_down_delay):
+            # Restart the delay so the next worker is only retired after another idle period
+            self._idle_since = now
+            return current - 1, f"queue empty for {self.scale_down_delay:.0f}s"
+
+        return current, None
@@ -0,0 +1,100 @@
+"""
+Cooperative cancellation of running subtitle jobs.
+
+The cancel endpoint only records `cancel_requested_at`; the pipeline checks
+for it between stages and before every chunk and stops by raising
+JobCancelled. Shard worker processes cannot query the database, so the
+parent writes a marker file into the job's scratch directory that they
+check instead.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import VideoUpload
+from .status_cache import invalidate_status_cache
+
+MARKER_NAME = 'CANCELLED'
+
+
+class JobCancelled(Exception):
+    """Raised inside the pipeline when the job was cancelled."""
+
+
+class MarkerCancellation:
+    """Cancellation check based on a marker file (picklable, used in shard processes)."""
+
+    def __init__(self, marker_path):
+        self.marker_path = marker_path
+
+    def is_cancelled(self):
+        return os.path.exists(self.marker_path)
+
+    def check(self):
+        if self.is_cancelled():
+            raise JobCancelled("Job was cancelled.")
+
+
+class JobCancellation(MarkerCancellation):
+    """
+    Cancellation check for a job, polling the database at most every
+    SUBTITLE_CANCEL_CHECK_INTERVAL seconds and mirroring the flag to the marker file.
+    """
+
+    def __init__(self, upload_id, scratch_dir, interval=None):
+        super().__init__(os.path.join(scratch_dir, MARKER_NAME))
+        self.upload_id = upload_id
+        if interval is None:
+            interval = getattr(settings, 'SUBTITLE_CANCEL_CHECK_INTERVAL', 1.0)
+        self.interval = interval
+        self._last_checked = None
+
+    def is_cancelled(self):
+        if super().is_cancelled():
+            return True
+        now = time.monotonic()
+        if self._last_checked is not None and now - self._last_checked < self.interval:
+            return False
+        self._last_checked = now
+        cancelled = VideoUpload.objects.filter(pk=self.upload_id, cancel_requested_at__isnull=False).exists()
+        if cancelled:
+            print(f"Cancellation requested for upload {self.upload_id}")
+            self.mark()
+        return cancelled
+
+    def mark(self):
+        """Write the marker file so shard processes stop too."""
+        with open(self.marker_path, 'w') as marker:
+            marker.write('cancelled\n')
+
+    def shard_check(self):
+        """Return the check to hand to shard worker processes."""
+        return MarkerCancellation(self.marker_path)
+
+
+def request_cancellation(video_upload):
+    """
+    Cancel an upload.
+
+    Pending jobs are cancelled immediately; processing jobs get the cancel flag
+    and are stopped by their worker. Returns the new status ('cancelled' or
+    'processing'), or None if the job has already finished.
+    """
+    now = timezone.now()
+    cancelled = VideoUpload.objects.filter(pk=video_upload.pk, status='pending').update(
+        status='cancelled',
+        cancel_requested_at=now,
+        updated_at=now,
+    )
+    if not cancelled:
+        flagged = VideoUpload.objects.filter(pk=video_upload.pk, status='processing').update(
+            cancel_requested_at=now,
+            updated_at=now,
+        )
+        if not flagged:
+            return None
+    # update() bypasses save() signals, so drop the cached status explicitly
+    invalidate_status_cache(video_upload.pk)
+    return 'cancelled' if cancelled else 'processing'
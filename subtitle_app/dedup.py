@@ -0,0 +1,127 @@
+"""
+Pre-upload deduplication by content hash.
+
+Before sending a file the client posts its SHA-256 and size. If an upload
+with the same content has already been processed, a new VideoUpload is
+created that points at the existing source and subtitle files (no transfer,
+no processing). Otherwise the client gets a signed upload session that it
+passes along with the actual upload; the server checks the received file
+against it and records the hash so later re-submissions can be matched.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+
+from .models import TranscriptSegment, VideoUpload
+from .profiles import default_profile_name
+from .storage import file_exists
+
+HASH_BUFFER_SIZE = 1024 * 1024  # 1MB
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+UPLOAD_SESSION_SALT = 'subtitle_app.upload_session'
+
+
+class UploadSessionError(Exception):
+    """Raised when an upload session token is invalid, expired or does not match the file."""
+
+
+def normalize_sha256(value):
+    """Return a lowercase hex digest, or None if the value is not a SHA-256 digest."""
+    value = (value or '').strip().lower()
+    return value if SHA256_PATTERN.match(value) else None
+
+
+def hash_uploaded_file(uploaded_file):
+    """Return the (sha256 hex digest, size) of an uploaded file, reading it in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in uploaded_file.chunks(HASH_BUFFER_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest(), size
+
+
+def find_processed_upload(user, sha256, size, language='en-US', profile=None, range_start=None, range_end=None):
+    """
+    Return a completed upload with the same content, language, processing profile
+    (the server default if not given) and time range whose subtitles are still available,
+    or None.
+
+    Only the user's own uploads are considered: announcing a hash and size
+    proves nothing about having the file, so matching other users' uploads
+    would hand out their subtitles to anyone who knows a file's checksum.
+    """
+    profile = profile or default_profile_name()
+    queryset = (
+        VideoUpload.objects
+        .filter(content_sha256=sha256, content_size=size, language=language, profile=profile, status='completed')
+        .filter(user=user, range_start=range_start, range_end=range_end)
+        .exclude(subtitle_file='')
+        .order_by('-created_at')
+    )
+
+    for upload in queryset[:5]:
+        if file_exists(upload.subtitle_file):
+            return upload
+    return None
+
+
+def create_duplicate_upload(user, original, discard_source=False):
+    """Create a completed upload for `user` that shares the files and transcript of `original`."""
+    with transaction.atomic():
+        upload = VideoUpload.objects.create(
+            user=user,
+            video_file=original.video_file.name,
+            subtitle_file=original.subtitle_file.name,
+            status='completed',
+            media_duration=original.media_duration,
+            language=original.language,
+            profile=original.profile,
+            range_start=original.range_start,
+            range_end=original.range_end,
+            discard_source=discard_source,
+            source_discarded_at=original.source_discarded_at,
+            content_sha256=original.content_sha256,
+            content_size=original.content_size,
+            deduplicated_from=original,
+        )
+        TranscriptSegment.objects.bulk_create([
+            TranscriptSegment(
+                upload=upload,
+                position=segment.position,
+                start_time=segment.start_time,
+                end_time=segment.end_time,
+                text=segment.text,
+            )
+            for segment in original.segments.all()
+        ], batch_size=500)
+    print(f"Upload {upload.id} deduplicated from upload {original.id} ({original.content_sha256})")
+    return upload
+
+
+def create_upload_session(user, sha256, size):
+    """Return a signed token binding the announced hash and size to the user."""
+    return signing.dumps({'user': user.pk, 'sha256': sha256, 'size': size}, salt=UPLOAD_SESSION_SALT)
+
+
+def verify_upload_session(token, user, sha256, size):
+    """Check that a received file matches the upload session the client announced it with."""
+    try:
+        session = signing.loads(
+            token,
+            salt=UPLOAD_SESSION_SALT,
+            max_age=getattr(settings, 'SUBTITLE_UPLOAD_SESSION_MAX_AGE', 3600),
+        )
+    except signing.SignatureExpired:
+        raise UploadSessionError("Upload session has expired. Please check the file again.")
+    except signing.BadSignature:
+        raise UploadSessionError("Invalid upload session.")
+
+    if session.get('user') != user.pk:
+        raise UploadSessionError("Upload session belongs to another user.")
+    if session.get('sha256') != sha256 or session.get('size') != size:
+        raise UploadSessionError("Uploaded file does not match the checksum of the upload session.")
@@ -0,0 +1,224 @@
+"""
+In-process job dispatcher for subtitle generation.
+
+Uploads are saved as `pending` and a fixed pool of worker threads claims them
+one at a time, asking the configured scheduling policy which pending upload
+should run next. Claiming is an atomic `pending -> processing` update, so
+several processes can dispatch from the same database safely: the threads
+run inside web processes (SUBTITLE_INLINE_WORKERS) or in dedicated
+`manage.py run_subtitle_worker` processes.
+"""
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .liveness import finish_attempt, job_deadline, reap_stale_jobs
+from .models import VideoUpload
+from .scheduling import get_policy
+from .status_cache import invalidate_status_cache
+from .webhooks import get_delivery_worker, queue_job_webhooks
+
+
+def run_subtitle_generation(video_upload):
+    """
+    Run subtitle generation in background; set status failed on uncaught exception.
+    Webhooks are queued once the job has completed or failed.
+    """
+    try:
+        # Imported here so web processes never load the media stack
+        # (speech_recognition, pysrt, pydub, numpy) unless they run jobs
+        from .subtitle_generator import generate_subtitles
+        generate_subtitles(video_upload)
+    except Exception as e:
+        error_message = str(e)
+        error_traceback = traceback.format_exc()
+        print(f"ERROR processing video {video_upload.id}: {error_message}\n{error_traceback}")
+        if video_upload.status != 'failed':
+            # Not recorded by the pipeline itself (e.g. it failed to import)
+            finish_attempt(video_upload, status='failed', error_message=error_message)
+
+    if video_upload.status in ('completed', 'failed'):
+        try:
+            queue_job_webhooks(video_upload.pk)
+        except Exception as e:
+            print(f"Could not queue webhooks for video {video_upload.id}: {str(e)}")
+
+
+def claim_next_job(policy=None):
+    """
+    Pick the next pending upload according to the scheduling policy and mark it processing.
+
+    Returns the claimed VideoUpload, or None when nothing is pending.
+    """
+    select = get_policy(policy)
+    limit = getattr(settings, 'SUBTITLE_SCHEDULER_CANDIDATE_LIMIT', 500)
+
+    while True:
+        candidates = list(
+            VideoUpload.objects
+            .filter(status='pending')
+            .select_related('user')
+            .order_by('created_at')[:limit]
+        )
+        if not candidates:
+            return None
+
+        now = timezone.now()
+        upload = select(candidates, now)
+        if upload is None:
+            return None
+
+        # Another worker may have claimed it between the select and the update
+        deadline_at = job_deadline(upload, now)
+        claimed = VideoUpload.objects.filter(pk=upload.pk, status='pending').update(
+            status='processing',
+            started_at=now,
+            heartbeat_at=now,
+            deadline_at=deadline_at,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        if claimed:
+            # update() bypasses save() signals, so drop the cached status explicitly
+            invalidate_status_cache(upload.pk)
+            upload.status = 'processing'
+            upload.started_at = now
+            upload.heartbeat_at = now
+            upload.deadline_at = deadline_at
+            upload.attempts += 1
+            return upload
+
+
+class JobDispatcher:
+    """Pool of worker threads that run pending uploads in scheduling-policy order."""
+
+    def __init__(self, concurrency=None, poll_interval=None):
+        if concurrency is None:
+            concurrency = getattr(settings, 'SUBTITLE_WORKER_CONCURRENCY', 2)
+        if poll_interval is None:
+            poll_interval = getattr(settings, 'SUBTITLE_DISPATCH_POLL_INTERVAL', 5.0)
+        self.concurrency = max(int(concurrency), 1)
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._claim_lock = threading.Lock()
+        self._pending_wakeups = 0
+        self._last_reap = None
+        self._threads = []
+        self._stopping = threading.Event()
+        # Webhooks are delivered wherever jobs run
+        self._webhooks = get_delivery_worker()
+
+    def start(self, daemon=True):
+        """Start the worker threads (idempotent)."""
+        if self._threads:
+            return
+        for index in range(self.concurrency):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f'subtitle-worker-{index + 1}',
+                daemon=daemon,
+            )
+            thread.start()
+            self._threads.append(thread)
+        self._webhooks.start(daemon=daemon)
+        print(f"Subtitle job dispatcher started with {self.concurrency} workers "
+              f"(policy: {getattr(settings, 'SUBTITLE_SCHEDULING_POLICY', 'fifo')})")
+
+    def stop(self):
+        """Stop claiming new jobs; running jobs finish normally."""
+        self._stopping.set()
+        with self._condition:
+            self._condition.notify_all()
+        self._webhooks.stop()
+
+    def join(self, timeout=None):
+        """Wait for the worker threads to exit after stop()."""
+        for thread in self._threads:
+            thread.join(timeout)
+        self._webhooks.join(timeout)
+
+    @property
+    def stopping(self):
+        return self._stopping.is_set()
+
+    def notify(self):
+        """Wake an idle worker because a new job was queued."""
+        with self._condition:
+            self._pending_wakeups += 1
+            self._condition.notify()
+
+    def _wait_for_work(self):
+        with self._condition:
+            if self._pending_wakeups == 0 and not self.stopping:
+                self._condition.wait(timeout=self.poll_interval)
+            self._pending_wakeups = max(self._pending_wakeups - 1, 0)
+
+    def _reap_if_due(self):
+        # Called under the claim lock: one thread per process reaps every SUBTITLE_REAPER_INTERVAL seconds
+        interval = getattr(settings, 'SUBTITLE_REAPER_INTERVAL', 60.0)
+        now = time.monotonic()
+        if interval <= 0 or (self._last_reap is not None and now - self._last_reap < interval):
+            return
+        self._last_reap = now
+        reap_stale_jobs()
+
+    def _worker_loop(self):
+        while not self.stopping:
+            try:
+                with self._claim_lock:
+                    self._reap_if_due()
+                    upload = claim_next_job()
+            except Exception as e:
+                print(f"Subtitle dispatcher could not claim a job: {str(e)}")
+                upload = None
+            finally:
+                close_old_connections()
+
+            if upload is None:
+                self._wait_for_work()
+                continue
+
+            print(f"Dispatching video upload {upload.id} (priority {upload.priority}, "
+                  f"duration {upload.media_duration}s)")
+            try:
+                run_subtitle_generation(upload)
+            finally:
+                close_old_connections()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def runs_inline_workers():
+    """Return True if this (web) process should run jobs itself instead of leaving them to worker processes."""
+    return getattr(settings, 'SUBTITLE_INLINE_WORKERS', True)
+
+
+def get_dispatcher():
+    """Return the process-wide dispatcher, starting it on first use."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = JobDispatcher()
+            _dispatcher.start()
+        return _dispatcher
+
+
+def enqueue(video_upload):
+    """
+    Queue an upload for processing.
+
+    With inline workers a local dispatcher thread is woken; otherwise the job
+    stays pending until a `run_subtitle_worker` process polls for it.
+    """
+    if video_upload.status != 'pending':
+        video_upload.status = 'pending'
+        video_upload.save(update_fields=['status', 'updated_at'])
+    if runs_inline_workers():
+        get_dispatcher().notify()
@@ -0,0 +1,143 @@
+"""
+Bulk export of subtitle files as a streamed ZIP archive.
+
+The archive is built while it is sent: every subtitle file is read line by
+line, converted to the requested formats (SRT as stored, WebVTT, plain text)
+and compressed into a ZIP entry written with data descriptors, so neither an
+entry nor the archive has to be known in full before the first bytes go out.
+Only the compressed bytes produced since the last yield are held in memory.
+"""
+import os
+import zipfile
+
+from asgiref.sync import sync_to_async
+
+from .storage import file_exists, iter_text_lines
+
+EXPORT_FORMATS = ('srt', 'vtt', 'txt')
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+class StreamBuffer:
+    """Write-only, unseekable file object that collects what ZipFile writes until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.pending = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        self.pending += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.pending = 0
+        return data
+
+
+def iter_srt_cues(lines):
+    """Parse SRT lines into (start, end, text lines) cues, one block at a time."""
+    block = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.strip():
+            block.append(line)
+            continue
+        if block:
+            cue = parse_srt_block(block)
+            if cue:
+                yield cue
+            block = []
+    if block:
+        cue = parse_srt_block(block)
+        if cue:
+            yield cue
+
+
+def parse_srt_block(block):
+    # First line is the index, second the timing ("00:00:01,000 --> 00:00:05,000"), the rest text
+    timing = next((i for i, line in enumerate(block) if '-->' in line), None)
+    if timing is None:
+        return None
+    start, _, end = block[timing].partition('-->')
+    return start.strip(), end.strip(), block[timing + 1:]
+
+
+def iter_formatted(field_file, fmt):
+    """Yield a stored SRT file converted to `fmt` ('srt', 'vtt' or 'txt'), piece by piece."""
+    if fmt == 'srt':
+        yield from iter_text_lines(field_file)
+        return
+
+    if fmt == 'vtt':
+        yield 'WEBVTT\n\n'
+    for start, end, text_lines in iter_srt_cues(iter_text_lines(field_file)):
+        if fmt == 'vtt':
+            yield f"{start.replace(',', '.')} --> {end.replace(',', '.')}\n" + '\n'.join(text_lines) + '\n\n'
+        else:
+            # Same layout as the transcript_text of the status endpoint: [00:00:00 - 00:00:05] Text
+            text = ' '.join(line.strip() for line in text_lines if line.strip())
+            if text:
+                yield f"[{start.split(',')[0]} - {end.split(',')[0]}] {text}\n\n"
+
+
+def export_name(video_upload, fmt):
+    base = os.path.splitext(video_upload.filename())[0]
+    return f"{video_upload.id}-{base}.{fmt}"
+
+
+def iter_zip_export(uploads, formats, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield a ZIP archive with the subtitles of `uploads` in each of `formats`.
+
+    Uploads whose subtitle file is missing are listed in `skipped.txt`.
+    """
+    buffer = StreamBuffer()
+    skipped = []
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for video_upload in uploads:
+            if not file_exists(video_upload.subtitle_file):
+                skipped.append(video_upload)
+                continue
+            for fmt in formats:
+                info = zipfile.ZipInfo(export_name(video_upload, fmt), date_time=video_upload.updated_at.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with archive.open(info, 'w') as entry:
+                    for piece in iter_formatted(video_upload.subtitle_file, fmt):
+                        entry.write(piece.encode('utf-8'))
+                        if buffer.pending >= chunk_size:
+                            yield buffer.drain()
+                if buffer.pending:
+                    yield buffer.drain()
+
+        if skipped:
+            archive.writestr('skipped.txt', ''.join(
+                f"{video_upload.id}\t{video_upload.filename()}\tsubtitle file not found\n" for video_upload in skipped
+            ))
+    # The central directory is written when the archive is closed
+    yield buffer.drain()
+
+
+async def aiter_zip_export(uploads, formats, chunk_size=EXPORT_CHUNK_SIZE):
+    """Async wrapper: builds the archive in a worker thread, one chunk at a time."""
+    chunks = iter_zip_export(uploads, formats, chunk_size)
+    done = object()
+    try:
+        while True:
+            chunk = await sync_to_async(next, thread_sensitive=False)(chunks, done)
+            if chunk is done:
+                break
+            if chunk:
+                yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=False)()
@@ -0,0 +1,443 @@
+"""
+Live transcription over a WebSocket (`ws://<host>/ws/live/`).
+
+A client streams audio as binary messages and gets subtitle cues back as JSON
+text messages while it is still talking:
+
+- `format=pcm` (default): raw 16-bit little-endian mono PCM at 16 kHz.
+- `format=opus`: an Ogg or WebM Opus stream (what browsers' MediaRecorder
+  produces), decoded to PCM through an ffmpeg pipe.
+
+The audio is cut into segments at pauses (at least
+SUBTITLE_LIVE_MIN_SEGMENT_SECONDS long, at most the profile's chunk length);
+each segment is recognized in a thread as soon as it is complete and its cue
+is sent. When the client sends {"type": "stop"} or disconnects, the remaining
+audio is recognized and the session is saved as a completed VideoUpload: the
+recording (FLAC) as its file and the cues as its SRT, indexed for search and
+announced through webhooks like any other job.
+"""
+import asyncio
+import json
+import math
+import os
+import tempfile
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from pydub import AudioSegment
+from rest_framework.exceptions import ValidationError
+
+from .audio_cache import flac_encoder_command
+from .authentication import InvalidToken, aget_token_user
+from .media import get_ffmpeg_binary
+from .models import VideoUpload
+from .noise_profile import NoiseProfile
+from .profiles import JobStats, get_profile
+from .search import index_transcript
+from .serializers import validate_language_tag
+from .storage import scratch_root
+from .streaming import SAMPLE_RATE, SAMPLE_WIDTH
+from .subtitle_generator import (
+    build_srt, calibrated_energy_threshold, create_recognizer, preprocess_audio, recognize_chunk, remove_temp_dir,
+)
+from .webhooks import absolute_url, queue_job_webhooks
+
+LIVE_PATH = '/ws/live'
+LIVE_FORMATS = ('pcm', 'opus')
+FRAME_SECONDS = 0.03
+# Silence threshold (RMS) until enough audio has been heard to estimate the noise floor
+DEFAULT_SILENCE_RMS = 300.0
+
+
+class LiveSegmenter:
+    """
+    Cut a stream of int16 samples into segments, preferring pauses.
+
+    A segment ends in the middle of the first pause (`pause_seconds` of frames
+    below the silence threshold) after `min_seconds`, or at `max_seconds` when
+    there is no pause. The threshold follows the noise floor heard so far.
+    """
+
+    def __init__(self, min_seconds, max_seconds, pause_seconds=0.5, sample_rate=SAMPLE_RATE):
+        self.frame_samples = int(sample_rate * FRAME_SECONDS)
+        self.min_frames = max(int(min_seconds / FRAME_SECONDS), 1)
+        self.max_frames = max(int(max_seconds / FRAME_SECONDS), self.min_frames)
+        self.pause_frames = max(int(pause_seconds / FRAME_SECONDS), 1)
+        self.noise_profile = NoiseProfile(frame_ms=FRAME_SECONDS * 1000, sample_rate=sample_rate)
+        self.buffer = np.zeros(0, dtype=np.int16)
+        self.levels = []  # RMS of each complete frame in the buffer
+        self.start_sample = 0  # stream position of buffer[0]
+
+    def silence_threshold(self):
+        return self.noise_profile.energy_threshold() or DEFAULT_SILENCE_RMS
+
+    def feed(self, samples):
+        """Add samples; return the (start_sample, samples, voiced) segments they complete."""
+        self.noise_profile.add(samples)
+        self.buffer = np.concatenate([self.buffer, samples])
+        complete = len(self.buffer) // self.frame_samples
+        if complete > len(self.levels):
+            frames = self.buffer[len(self.levels) * self.frame_samples:complete * self.frame_samples]
+            frames = frames.astype(np.float64).reshape(-1, self.frame_samples)
+            self.levels.extend(np.sqrt(np.mean(frames * frames, axis=1)).tolist())
+
+        segments = []
+        cut = self.find_cut()
+        while cut is not None:
+            segments.append(self.take(cut))
+            cut = self.find_cut()
+        return segments
+
+    def find_cut(self):
+        """Return the frame to end the next segment at, or None if it is not complete yet."""
+        threshold = self.silence_threshold()
+        quiet = 0
+        for index, level in enumerate(self.levels[:self.max_frames]):
+            quiet = quiet + 1 if level < threshold else 0
+            cut = index + 1 - self.pause_frames // 2
+            if quiet >= self.pause_frames and cut >= self.min_frames:
+                return cut
+        if len(self.levels) >= self.max_frames:
+            return self.max_frames
+        return None
+
+    def take(self, frames):
+        samples = self.buffer[:frames * self.frame_samples]
+        voiced = any(level >= self.silence_threshold() for level in self.levels[:frames])
+        segment = (self.start_sample, samples, voiced)
+        self.buffer = self.buffer[len(samples):]
+        self.levels = self.levels[frames:]
+        self.start_sample += len(samples)
+        return segment
+
+    def flush(self):
+        """Return the buffered audio as a last segment (None if there is none)."""
+        if not len(self.buffer):
+            return None
+        voiced = any(level >= self.silence_threshold() for level in self.levels)
+        segment = (self.start_sample, self.buffer, voiced)
+        self.start_sample += len(self.buffer)
+        self.buffer = np.zeros(0, dtype=np.int16)
+        self.levels = []
+        return segment
+
+
+def recognize_segment(samples, label, temp_dir, energy_threshold, language, profile):
+    """Preprocess and recognize one segment; returns (text, attempts) like recognize_chunk."""
+    audio = AudioSegment(data=samples.tobytes(), sample_width=SAMPLE_WIDTH, frame_rate=SAMPLE_RATE, channels=1)
+    processed = preprocess_audio(audio, profile)
+    # The threshold was measured on the raw stream; follow the gain preprocessing applied
+    if energy_threshold is not None and math.isfinite(audio.dBFS) and math.isfinite(processed.dBFS):
+        energy_threshold = min(energy_threshold * 10 ** ((processed.dBFS - audio.dBFS) / 20.0), 4000.0)
+    segment_file = os.path.join(temp_dir, f"{label.replace(' ', '_')}.wav")
+    processed.export(segment_file, format='wav')
+    try:
+        return recognize_chunk(
+            create_recognizer(energy_threshold), segment_file, label,
+            max_retries=profile.max_retries, language=language,
+        )
+    finally:
+        os.remove(segment_file)
+
+
+class LiveSession:
+    """One WebSocket client streaming audio; recognizes segments and saves the result."""
+
+    def __init__(self, user, language, profile, audio_format):
+        self.user = user
+        self.language = language
+        self.profile = profile
+        self.audio_format = audio_format
+        self.segmenter = LiveSegmenter(
+            min_seconds=getattr(settings, 'SUBTITLE_LIVE_MIN_SEGMENT_SECONDS', 3.0),
+            max_seconds=profile.chunk_length_ms / 1000,
+            pause_seconds=getattr(settings, 'SUBTITLE_LIVE_PAUSE_SECONDS', 0.5),
+        )
+        self.max_samples = int(getattr(settings, 'SUBTITLE_LIVE_MAX_SECONDS', 7200) * SAMPLE_RATE)
+        self.temp_dir = tempfile.mkdtemp(prefix='live_', dir=scratch_root())
+        # The recording becomes the upload's file; encoded by an ffmpeg subprocess started in run()
+        self.flac_path = os.path.join(self.temp_dir, 'live.flac')
+        self.recording = None
+        self.segments = asyncio.Queue()
+        self.cues = []
+        self.result = {'total_chunks': 0, 'successful_chunks': 0, 'failed_chunks': 0, 'recognizer_calls': 0}
+        self.stats = JobStats(profile)
+        self.samples_received = 0
+        self._odd_byte = b''
+        self.send = None
+        self.connected = True
+
+    @property
+    def duration(self):
+        return self.samples_received / SAMPLE_RATE
+
+    async def send_json(self, message):
+        if not self.connected:
+            return
+        try:
+            await self.send({'type': 'websocket.send', 'text': json.dumps(message)})
+        except OSError:
+            # The client went away (uvicorn raises ClientDisconnected); the session is still saved
+            self.connected = False
+
+    async def add_pcm(self, data):
+        """Record and segment a block of PCM bytes. Returns False once the session is full."""
+        data = self._odd_byte + data
+        usable = len(data) - len(data) % SAMPLE_WIDTH
+        self._odd_byte = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype='<i2').astype(np.int16)
+        samples = samples[:max(self.max_samples - self.samples_received, 0)]
+        if len(samples):
+            # Waits for the encoder to take the data without blocking the event loop
+            self.recording.stdin.write(samples.tobytes())
+            await self.recording.stdin.drain()
+            self.samples_received += len(samples)
+            for segment in self.segmenter.feed(samples):
+                self.queue_segment(segment)
+        return self.samples_received < self.max_samples
+
+    def queue_segment(self, segment):
+        start_sample, samples, voiced = segment
+        if voiced:
+            # Measured here: the noise profile is only touched from the event loop
+            self.segments.put_nowait((start_sample, samples, calibrated_energy_threshold(self.segmenter.noise_profile)))
+
+    async def recognize_segments(self):
+        """Recognize queued segments in order and send a cue for each one with speech."""
+        while True:
+            item = await self.segments.get()
+            if item is None:
+                return
+            start_sample, samples, energy_threshold = item
+            start = start_sample / SAMPLE_RATE
+            end = start + len(samples) / SAMPLE_RATE
+            self.result['total_chunks'] += 1
+            with self.stats.stage('recognition'):
+                text, attempts = await sync_to_async(recognize_segment, thread_sensitive=False)(
+                    samples, f"Live segment {self.result['total_chunks']}", self.temp_dir,
+                    energy_threshold, self.language, self.profile,
+                )
+            self.result['recognizer_calls'] += attempts
+            if not text:
+                self.result['failed_chunks'] += 1
+                continue
+            self.result['successful_chunks'] += 1
+            self.cues.append((start, end, text))
+            await self.send_json({
+                'type': 'cue', 'index': len(self.cues),
+                'start': round(start, 3), 'end': round(end, 3), 'text': text,
+            })
+
+    async def read_decoded(self, stdout):
+        while True:
+            data = await stdout.read(8192)
+            if not data:
+                return
+            await self.add_pcm(data)
+
+    async def run(self, receive, send):
+        """Receive audio until the client stops or disconnects, then save the session."""
+        self.send = send
+        recognition = asyncio.create_task(self.recognize_segments())
+        decoder = reader = decoder_errors = recording_errors = None
+        try:
+            self.recording = await asyncio.create_subprocess_exec(
+                *flac_encoder_command(self.flac_path),
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+            )
+            # Read stderr while the processes run so a full pipe cannot stall them
+            recording_errors = asyncio.create_task(read_output_tail(self.recording.stderr))
+            if self.audio_format == 'opus':
+                decoder = await asyncio.create_subprocess_exec(
+                    get_ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-fflags', 'nobuffer',
+                    '-i', 'pipe:0', '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), 'pipe:1',
+                    stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                )
+                reader = asyncio.create_task(self.read_decoded(decoder.stdout))
+                decoder_errors = asyncio.create_task(read_output_tail(decoder.stderr))
+
+            await self.send_json({
+                'type': 'ready', 'format': self.audio_format, 'sample_rate': SAMPLE_RATE,
+                'language': self.language, 'profile': self.profile.name,
+            })
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    self.connected = False
+                    break
+                if message.get('bytes'):
+                    if decoder is not None:
+                        decoder.stdin.write(message['bytes'])
+                        await decoder.stdin.drain()
+                    elif not await self.add_pcm(message['bytes']):
+                        await self.send_json({'type': 'error', 'message': 'The session reached its maximum length.'})
+                        break
+                elif message.get('text'):
+                    try:
+                        control = json.loads(message['text'])
+                    except ValueError:
+                        control = {}
+                    if isinstance(control, dict) and control.get('type') == 'stop':
+                        break
+                if decoder is not None and self.samples_received >= self.max_samples:
+                    await self.send_json({'type': 'error', 'message': 'The session reached its maximum length.'})
+                    break
+
+            if decoder is not None:
+                # Let ffmpeg decode what it still holds before the last segment is cut
+                decoder.stdin.close()
+                await reader
+                await decoder.wait()
+                error_output = await decoder_errors
+                if decoder.returncode != 0 and not self.samples_received:
+                    raise Exception(f"Could not decode the Opus stream: {error_output}")
+
+            segment = self.segmenter.flush()
+            if segment is not None:
+                self.queue_segment(segment)
+            self.segments.put_nowait(None)
+            await recognition
+
+            self.recording.stdin.close()
+            await self.recording.wait()
+            error_output = await recording_errors
+            if self.recording.returncode != 0 and self.samples_received:
+                raise Exception(f"Failed to encode audio: {error_output}")
+
+            video_upload = await sync_to_async(self.save)()
+            await self.send_json({
+                'type': 'completed',
+                'upload_id': video_upload.id if video_upload else None,
+                'status': video_upload.status if video_upload else None,
+                'duration': round(self.duration, 3),
+                'cues': len(self.cues),
+                'status_url': absolute_url(f'/api/upload/{video_upload.id}/') if video_upload else None,
+                'subtitle_url': absolute_url(f'/api/download/{video_upload.id}/') if self.cues else None,
+            })
+        finally:
+            for task in (recognition, reader, decoder_errors, recording_errors):
+                if task is not None and not task.done():
+                    task.cancel()
+            for process in (decoder, self.recording):
+                if process is not None and process.returncode is None:
+                    process.kill()
+                    await process.wait()
+            await sync_to_async(remove_temp_dir, thread_sensitive=False)(self.temp_dir)
+
+    def save(self):
+        """Store the session as a finished upload (None when no audio was received)."""
+        if not self.samples_received:
+            return None
+
+        video_upload = VideoUpload(
+            user=self.user,
+            language=self.language,
+            profile=self.profile.name,
+            media_duration=self.duration,
+        )
+        with open(self.flac_path, 'rb') as flac_file:
+            video_upload.video_file.save(f"live-{time.strftime('%Y%m%d-%H%M%S')}.flac", File(flac_file), save=False)
+
+        if self.cues:
+            _, srt_content = build_srt(self.cues)
+            video_upload.subtitle_file.save(f"{video_upload.filename().rsplit('.', 1)[0]}.srt",
+                                            ContentFile(srt_content.encode('utf-8')), save=False)
+            video_upload.status = 'completed'
+        else:
+            video_upload.status = 'failed'
+            video_upload.error_message = "No speech detected in the live session."
+        video_upload.processing_stats = self.stats.as_dict(self.result, self.duration)
+        video_upload.save()
+
+        if self.cues:
+            index_transcript(video_upload, self.cues)
+        print(f"Saved live session as upload {video_upload.id}: {self.duration:.1f}s, {len(self.cues)} cues")
+        queue_job_webhooks(video_upload.id)
+        return video_upload
+
+
+async def read_output_tail(stream, limit=500):
+    """Read a subprocess pipe to the end; returns the last `limit` characters of it."""
+    tail = b''
+    while True:
+        data = await stream.read(4096)
+        if not data:
+            return tail.decode('utf-8', errors='replace').strip()[-limit:]
+        tail = (tail + data)[-4 * limit:]
+
+
+def websocket_token(scope, params):
+    """Return the token from `?token=` (browsers cannot set headers) or the Authorization header."""
+    if params.get('token'):
+        return params['token'][0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode('latin-1').split()
+            if len(parts) == 2 and parts[0].lower() == 'token':
+                return parts[1]
+    return None
+
+
+async def close_with_error(send, code, message):
+    await send({'type': 'websocket.send', 'text': json.dumps({'type': 'error', 'message': message})})
+    await send({'type': 'websocket.close', 'code': code})
+
+
+async def live_application(scope, receive, send):
+    """ASGI application for WebSocket connections (routed from subtitle_generator/asgi.py)."""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if scope['path'].rstrip('/') != LIVE_PATH:
+        # Closing before accepting rejects the handshake (HTTP 403)
+        await send({'type': 'websocket.close'})
+        return
+    await send({'type': 'websocket.accept'})
+
+    try:
+        params = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        key = websocket_token(scope, params)
+        if key is None:
+            await close_with_error(send, 4401, 'Authentication credentials were not provided.')
+            return
+        try:
+            user = await aget_token_user(key)
+        except InvalidToken as e:
+            await close_with_error(send, 4401, str(e))
+            return
+
+        audio_format = params.get('format', ['pcm'])[0]
+        if audio_format not in LIVE_FORMATS:
+            await close_with_error(send, 4400, f"Unknown format '{audio_format}'. Choose one of: {', '.join(LIVE_FORMATS)}")
+            return
+        language = params.get('language', ['en-US'])[0]
+        try:
+            validate_language_tag(language)
+        except ValidationError as e:
+            await close_with_error(send, 4400, f"Invalid language: {e.detail[0]}")
+            return
+        try:
+            profile = get_profile(params.get('profile', [''])[0] or None)
+        except ValueError as e:
+            await close_with_error(send, 4400, str(e))
+            return
+
+        session = LiveSession(user, language, profile, audio_format)
+        print(f"Live session started for user {user.pk} ({audio_format}, {language}, profile {profile.name})")
+        try:
+            await session.run(receive, send)
+        except Exception as e:
+            print(f"Live session failed: {str(e)}")
+            if session.connected:
+                await close_with_error(send, 1011, str(e))
+            return
+        if session.connected:
+            await send({'type': 'websocket.close', 'code': 1000})
+    finally:
+        await sync_to_async(close_old_connections)()
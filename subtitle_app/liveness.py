@@ -0,0 +1,155 @@
+"""
+Deadlines, heartbeats and reaping of stuck jobs.
+
+When a job is claimed it gets a wall-clock deadline scaled by its media
+duration. While it runs, the pipeline's periodic checks (between stages,
+before every chunk, while waiting for shards) refresh `heartbeat_at` and
+stop the job once the deadline has passed. Every blocking stage has its own
+timeout (ffmpeg subprocesses, recognizer HTTP calls), so a healthy worker
+always gets back to a check. A job whose heartbeat goes stale anyway (a
+crashed or wedged worker) is requeued by the reaper, or failed once it has
+used up its attempts.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .cancellation import JobCancellation
+from .models import VideoUpload
+from .scheduling import estimated_duration
+from .status_cache import invalidate_status_cache, refresh_status_cache
+from .webhooks import queue_job_webhooks
+
+
+class JobDeadlineExceeded(Exception):
+    """Raised inside the pipeline when a job runs past its deadline."""
+
+
+class JobLost(Exception):
+    """Raised inside the pipeline when the reaper has taken the job away from this worker."""
+
+
+def job_deadline(video_upload, now):
+    """Return the deadline for a job claimed at `now`."""
+    seconds = (
+        getattr(settings, 'SUBTITLE_JOB_DEADLINE_BASE_SECONDS', 900)
+        + getattr(settings, 'SUBTITLE_JOB_DEADLINE_PER_MEDIA_SECOND', 2.0) * estimated_duration(video_upload)
+    )
+    return now + timedelta(seconds=seconds)
+
+
+class JobMonitor(JobCancellation):
+    """
+    Pipeline check that also writes heartbeats and enforces the job deadline.
+
+    Heartbeats are conditional on the job still being this worker's attempt,
+    so a worker whose job was reaped stops instead of finishing it twice.
+    """
+
+    def __init__(self, video_upload, scratch_dir, heartbeat_interval=None):
+        super().__init__(video_upload.id, scratch_dir)
+        self.attempt = video_upload.attempts
+        self.deadline_at = video_upload.deadline_at
+        if heartbeat_interval is None:
+            heartbeat_interval = getattr(settings, 'SUBTITLE_HEARTBEAT_INTERVAL', 15.0)
+        self.heartbeat_interval = heartbeat_interval
+        self._last_heartbeat = None
+
+    def beat(self):
+        """Refresh the job's heartbeat (throttled to the heartbeat interval)."""
+        now = time.monotonic()
+        if self._last_heartbeat is not None and now - self._last_heartbeat < self.heartbeat_interval:
+            return
+        self._last_heartbeat = now
+        updated = VideoUpload.objects.filter(
+            pk=self.upload_id, status='processing', attempts=self.attempt
+        ).update(heartbeat_at=timezone.now())
+        if not updated:
+            raise JobLost(f"Upload {self.upload_id} is no longer assigned to this worker.")
+
+    def check(self):
+        self.beat()
+        if self.deadline_at is not None and timezone.now() > self.deadline_at:
+            raise JobDeadlineExceeded(
+                f"Job exceeded its deadline ({self.deadline_at.isoformat()}) and was stopped."
+            )
+        super().check()
+
+
+def finish_attempt(video_upload, **values):
+    """
+    Write the final state of a job (status, error message, files...) if this
+    attempt still owns it. Returns True if it was written.
+
+    A conditional update instead of save(): fields set meanwhile by the cancel
+    endpoint or the reaper (cancel_requested_at, attempts, heartbeat_at,
+    status) are not overwritten from a stale instance.
+    """
+    now = timezone.now()
+    updated = VideoUpload.objects.filter(
+        pk=video_upload.pk, status='processing', attempts=video_upload.attempts
+    ).update(updated_at=now, **values)
+    if updated:
+        for name, value in values.items():
+            setattr(video_upload, name, value)
+        video_upload.updated_at = now
+    else:
+        print(f"Upload {video_upload.pk} is no longer assigned to this worker; its result was not recorded")
+    # update() sends no signals
+    refresh_status_cache(video_upload.pk)
+    return bool(updated)
+
+
+def reap_stale_jobs(now=None, log=print):
+    """
+    Requeue (or fail, after SUBTITLE_JOB_MAX_ATTEMPTS) processing jobs whose heartbeat is stale.
+
+    Updates are conditional on the heartbeat read here, so a job that beats
+    again in the meantime is left alone. Returns (requeued, failed) counts.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'SUBTITLE_HEARTBEAT_STALE_SECONDS', 600))
+    max_attempts = getattr(settings, 'SUBTITLE_JOB_MAX_ATTEMPTS', 2)
+
+    stale = (
+        VideoUpload.objects
+        .filter(status='processing')
+        .filter(Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, updated_at__lt=cutoff))
+        .only('pk', 'attempts', 'heartbeat_at', 'cancel_requested_at')
+    )
+
+    requeued = failed = 0
+    for job in stale:
+        unchanged = VideoUpload.objects.filter(
+            pk=job.pk, status='processing', attempts=job.attempts, heartbeat_at=job.heartbeat_at
+        )
+        last_seen = job.heartbeat_at.isoformat() if job.heartbeat_at else 'never'
+        if job.cancel_requested_at is None and job.attempts < max_attempts:
+            changed = unchanged.update(
+                status='pending', started_at=None, heartbeat_at=None, deadline_at=None, updated_at=now
+            )
+            if changed:
+                requeued += 1
+                log(f"Requeued stale upload {job.pk} (attempt {job.attempts}, last heartbeat {last_seen})")
+        else:
+            if job.cancel_requested_at:
+                # The worker died before it could honour the cancel request
+                changed = unchanged.update(status='cancelled', updated_at=now)
+            else:
+                changed = unchanged.update(
+                    status='failed',
+                    error_message=f"Job stopped responding (last heartbeat {last_seen}) after {job.attempts} attempts.",
+                    updated_at=now,
+                )
+            if changed:
+                failed += 1
+                log(f"Gave up on stale upload {job.pk} after {job.attempts} attempts (last heartbeat {last_seen})")
+                if not job.cancel_requested_at:
+                    queue_job_webhooks(job.pk)
+        if changed:
+            # update() bypasses save() signals, so drop the cached status explicitly
+            invalidate_status_cache(job.pk)
+    return requeued, failed
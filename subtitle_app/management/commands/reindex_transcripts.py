@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from subtitle_app.models import VideoUpload
+from subtitle_app.search import index_transcript, parse_srt
+from subtitle_app.storage import file_exists, read_text
+
+
+class Command(BaseCommand):
+    help = "Rebuild the transcript search index from stored SRT files (backfills uploads made before indexing)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing-only', action='store_true', help='Only index uploads without segments.')
+
+    def handle(self, *args, **options):
+        queryset = VideoUpload.objects.filter(status='completed').exclude(subtitle_file='').exclude(subtitle_file=None)
+        if options['missing_only']:
+            queryset = queryset.filter(segments__isnull=True)
+
+        indexed = 0
+        for upload in queryset.iterator():
+            if not file_exists(upload.subtitle_file):
+                continue
+            cues = parse_srt(read_text(upload.subtitle_file))
+            index_transcript(upload, cues)
+            indexed += 1
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} uploads"))
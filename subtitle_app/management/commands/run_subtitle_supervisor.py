@@ -0,0 +1,131 @@
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from subtitle_app.autoscaling import AutoscalePolicy, host_metrics, queue_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Run and autoscale `run_subtitle_worker` processes on this node. The number of "
+        "workers follows queue depth and job age between --min-workers and --max-workers, "
+        "held back when CPU or memory is short. Workers are retired with SIGTERM so they "
+        "finish their running jobs first; SIGTERM/SIGINT drains all workers and exits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-workers',
+            type=int,
+            default=getattr(settings, 'SUBTITLE_AUTOSCALE_MIN_WORKERS', 1),
+            help='Worker processes kept running when the queue is empty.',
+        )
+        parser.add_argument(
+            '--max-workers',
+            type=int,
+            default=getattr(settings, 'SUBTITLE_AUTOSCALE_MAX_WORKERS', 0),
+            help='Upper bound on worker processes (0: number of CPUs).',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=getattr(settings, 'SUBTITLE_WORKER_CONCURRENCY', 2),
+            help='Jobs processed concurrently by each worker process.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'SUBTITLE_AUTOSCALE_INTERVAL', 10.0),
+            help='Seconds between scaling decisions.',
+        )
+
+    def handle(self, *args, **options):
+        policy = AutoscalePolicy(
+            min_workers=options['min_workers'],
+            max_workers=options['max_workers'],
+            worker_concurrency=options['concurrency'],
+        )
+        self.concurrency = policy.worker_concurrency
+        self.workers = []   # active workers, oldest first
+        self.draining = []  # workers sent SIGTERM, finishing their jobs
+        stopped = threading.Event()
+
+        def request_stop(signum, frame):
+            self.stdout.write(f"Received signal {signum}, draining all workers")
+            stopped.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        self.stdout.write(
+            f"Subtitle supervisor started ({policy.min_workers}-{policy.max_workers} workers, "
+            f"{self.concurrency} jobs each)"
+        )
+        while not stopped.is_set():
+            self.collect_exited()
+            try:
+                queue = queue_metrics()
+            except Exception as e:
+                self.stdout.write(f"Could not read the job queue: {str(e)}")
+                queue = None
+            finally:
+                close_old_connections()
+
+            if queue is not None:
+                current = len(self.workers)
+                desired, reason = policy.desired_workers(current, queue, host_metrics())
+                if desired > current:
+                    self.stdout.write(f"Scaling up {current} -> {desired} workers: {reason}")
+                    for _ in range(desired - current):
+                        self.spawn_worker()
+                elif desired < current:
+                    self.stdout.write(f"Scaling down {current} -> {desired} workers: {reason}")
+                    for _ in range(current - desired):
+                        self.retire_worker(self.workers[-1])
+                elif reason:
+                    self.stdout.write(f"Keeping {current} workers: {reason}")
+            stopped.wait(options['interval'])
+
+        for process in list(self.workers):
+            self.retire_worker(process)
+        while self.draining:
+            self.collect_exited()
+            time.sleep(1.0)
+        self.stdout.write(self.style.SUCCESS('Subtitle supervisor stopped'))
+
+    def spawn_worker(self):
+        # The settings module is inherited through DJANGO_SETTINGS_MODULE
+        process = subprocess.Popen([
+            sys.executable, '-m', 'django', 'run_subtitle_worker',
+            '--concurrency', str(self.concurrency),
+        ])
+        self.workers.append(process)
+        self.stdout.write(f"Started worker {process.pid}")
+        return process
+
+    def retire_worker(self, process):
+        """Ask a worker to stop claiming jobs; it exits once its running jobs are done."""
+        self.workers.remove(process)
+        self.draining.append(process)
+        try:
+            process.send_signal(signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        self.stdout.write(f"Draining worker {process.pid}")
+
+    def collect_exited(self):
+        """Forget workers that have exited; unexpected exits are replaced by the next decision."""
+        for process in list(self.workers):
+            if process.poll() is not None:
+                self.workers.remove(process)
+                self.stdout.write(f"Worker {process.pid} exited unexpectedly with code {process.returncode}")
+        for process in list(self.draining):
+            if process.poll() is not None:
+                self.draining.remove(process)
+                self.stdout.write(f"Worker {process.pid} drained")
@@ -0,0 +1,53 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from subtitle_app.dispatcher import JobDispatcher
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a subtitle processing worker. Jobs are claimed from the database in "
+        "scheduling-policy order; SIGTERM/SIGINT stops claiming new jobs and exits "
+        "once the running ones have finished."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=getattr(settings, 'SUBTITLE_WORKER_CONCURRENCY', 2),
+            help='Number of jobs processed concurrently by this worker.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'SUBTITLE_WORKER_POLL_INTERVAL', 2.0),
+            help='Seconds between database polls for pending jobs.',
+        )
+
+    def handle(self, *args, **options):
+        # Load the media stack up front so a broken install fails at start, not mid-job
+        import subtitle_app.subtitle_generator  # noqa: F401
+
+        dispatcher = JobDispatcher(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+        )
+        stopped = threading.Event()
+
+        def request_stop(signum, frame):
+            self.stdout.write(f"Received signal {signum}, draining: waiting for running jobs to finish")
+            dispatcher.stop()
+            stopped.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        dispatcher.start(daemon=False)
+        while not stopped.wait(1.0):
+            pass
+        dispatcher.join()
+        self.stdout.write(self.style.SUCCESS('Subtitle worker stopped'))
@@ -0,0 +1,62 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from subtitle_app.webhooks import verify_signature
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local HTTP receiver for testing webhooks: prints every notification "
+        "and whether its signature is valid. Point an upload's callback_url (or your "
+        "webhook URL) at http://127.0.0.1:<port>/ and add 127.0.0.1 to "
+        "SUBTITLE_WEBHOOK_ALLOWED_HOSTS (webhooks only go to public hosts otherwise)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8081, help='Port to listen on.')
+        parser.add_argument('--secret', default='', help='Webhook secret to verify signatures with (GET /api/webhook/).')
+        parser.add_argument(
+            '--fail', type=int, default=0,
+            help='Answer the first N requests with HTTP 500 to exercise retries.',
+        )
+
+    def handle(self, *args, **options):
+        command = self
+        remaining_failures = [options['fail']]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                signature = self.headers.get('X-Subtitle-Signature', '')
+                valid = verify_signature(options['secret'], signature, body) if options['secret'] else None
+                command.stdout.write(
+                    f"{self.headers.get('X-Subtitle-Event')} delivery {self.headers.get('X-Subtitle-Delivery')} "
+                    f"(signature {'not checked' if valid is None else 'valid' if valid else 'INVALID'}):"
+                )
+                try:
+                    command.stdout.write(json.dumps(json.loads(body), indent=2))
+                except ValueError:
+                    command.stdout.write(body.decode('utf-8', errors='replace'))
+
+                if remaining_failures[0] > 0:
+                    remaining_failures[0] -= 1
+                    self.send_response(500)
+                elif valid is False:
+                    self.send_response(401)
+                else:
+                    self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), Handler)
+        self.stdout.write(f"Receiving webhooks on http://127.0.0.1:{options['port']}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
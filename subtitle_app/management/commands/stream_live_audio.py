@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+
+from subtitle_app.media import probe_media_duration
+from subtitle_app.streaming import SAMPLE_RATE, iter_pcm_windows
+
+FRAME_SECONDS = 0.1
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a recorded audio or video file to the live transcription WebSocket "
+        "(/ws/live/) as if it were being recorded, and print the cues as they arrive. "
+        "Run the server with SUBTITLE_RECOGNIZER_BACKEND=fake to test without the recognition service."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Recording to stream.')
+        parser.add_argument('--token', required=True, help='API token of the user the session is saved for.')
+        parser.add_argument('--url', default='ws://127.0.0.1:8000/ws/live/', help='Live transcription endpoint.')
+        parser.add_argument(
+            '--format', choices=['pcm', 'opus'], default='pcm',
+            help='pcm: decode the file and send 16 kHz PCM; opus: send the file as is (Ogg or WebM Opus).',
+        )
+        parser.add_argument('--language', default='en-US')
+        parser.add_argument('--profile', default='')
+        parser.add_argument(
+            '--speed', type=float, default=1.0,
+            help='Playback speed relative to real time (0: send as fast as possible).',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from websockets.sync.client import connect
+        except ImportError:
+            raise CommandError("The websockets package is required (pip install -r requirements.txt)")
+        if not os.path.exists(options['file']):
+            raise CommandError(f"File not found: {options['file']}")
+
+        query = {'token': options['token'], 'format': options['format'], 'language': options['language']}
+        if options['profile']:
+            query['profile'] = options['profile']
+        url = f"{options['url']}?{urlencode(query)}"
+
+        with connect(url, max_size=None) as websocket:
+            finished = threading.Event()
+            receiver = threading.Thread(target=self.print_messages, args=(websocket, finished), daemon=True)
+            receiver.start()
+
+            started = time.monotonic()
+            sent_seconds = 0.0
+            for data, seconds in self.iter_frames(options['file'], options['format']):
+                if finished.is_set():
+                    break
+                websocket.send(data)
+                sent_seconds += seconds
+                if options['speed'] > 0:
+                    # Pace the stream like a live recording
+                    delay = started + sent_seconds / options['speed'] - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+            if not finished.is_set():
+                self.stdout.write(f"Sent {sent_seconds:.1f}s of audio, waiting for the last cues")
+                websocket.send(json.dumps({'type': 'stop'}))
+            receiver.join()
+
+    def iter_frames(self, path, audio_format):
+        """Yield (message, seconds of audio) pairs to send."""
+        if audio_format == 'pcm':
+            frame_samples = int(SAMPLE_RATE * FRAME_SECONDS)
+            for window in iter_pcm_windows(path):
+                for offset in range(0, len(window), frame_samples):
+                    frame = window[offset:offset + frame_samples]
+                    yield frame.astype('<i2').tobytes(), len(frame) / SAMPLE_RATE
+            return
+
+        # Opus is sent as recorded; pace it by the file's average bitrate
+        size = os.path.getsize(path)
+        duration = probe_media_duration(path) or 0.0
+        piece_size = max(int(size / duration * FRAME_SECONDS), 1024) if duration else 4096
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(piece_size)
+                if not data:
+                    return
+                yield data, duration * len(data) / size if duration else 0.0
+
+    def print_messages(self, websocket, finished):
+        from websockets.exceptions import ConnectionClosed
+
+        try:
+            for raw in websocket:
+                message = json.loads(raw)
+                if message['type'] == 'cue':
+                    self.stdout.write(f"[{message['start']:8.2f} - {message['end']:8.2f}] {message['text']}")
+                elif message['type'] == 'ready':
+                    self.stdout.write(
+                        f"Session ready ({message['format']}, {message['language']}, profile {message['profile']})"
+                    )
+                elif message['type'] == 'error':
+                    self.stdout.write(self.style.ERROR(f"Error: {message['message']}"))
+                elif message['type'] == 'completed':
+                    if message['upload_id']:
+                        self.stdout.write(self.style.SUCCESS(
+                            f"Saved as upload {message['upload_id']} ({message['status']}): "
+                            f"{message['duration']:.1f}s, {message['cues']} cues. Subtitles: {message['subtitle_url']}"
+                        ))
+                    else:
+                        self.stdout.write("No audio was received; nothing was saved")
+        except ConnectionClosed:
+            pass
+        finally:
+            finished.set()
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from subtitle_app.retention import sweep
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete source files past their retention period, orphaned job temp dirs "
+        "and unreferenced media files, in batches. Run it periodically (e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting.')
+        parser.add_argument('--batch-size', type=int, default=100, help='Files handled per batch.')
+        parser.add_argument('--pause', type=float, default=0.5, help='Seconds to sleep between batches (bounds I/O).')
+
+    def handle(self, *args, **options):
+        report = sweep(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+            log=self.stdout.write,
+        )
+        prefix = 'Dry run: would reclaim ' if options['dry_run'] else 'Reclaimed '
+        self.stdout.write(self.style.SUCCESS(prefix + str(report)))
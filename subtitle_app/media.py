@@ -0,0 +1,69 @@
+import re
+import subprocess
+
+
+DURATION_PATTERN = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+# ffmpeg errors meaning the input has no audio stream to extract
+NO_AUDIO_MARKERS = ('does not contain any stream', 'matches no streams')
+
+
+def get_ffmpeg_binary():
+    """Return the ffmpeg executable (bundled with imageio-ffmpeg, which MoviePy uses)."""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return 'ffmpeg'
+
+
+def probe_media_duration(path, timeout=30):
+    """
+    Return the duration of a media file in seconds, or None if it cannot be determined.
+
+    Runs `ffmpeg -i` without an output file and parses the Duration line from its
+    banner, so nothing is decoded.
+    """
+    try:
+        result = subprocess.run(
+            [get_ffmpeg_binary(), '-hide_banner', '-i', path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            timeout=timeout,
+        )
+    except Exception as e:
+        print(f"Could not probe media duration for {path}: {str(e)}")
+        return None
+
+    match = DURATION_PATTERN.search(result.stderr.decode('utf-8', errors='replace'))
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def extract_audio_segment(source_path, output_path, start=None, duration=None, sample_rate=16000, timeout=None):
+    """
+    Decode the audio track of a media file into a mono 16-bit PCM WAV file with ffmpeg.
+
+    `start` uses input seeking (-ss before -i), so only the requested range is
+    decoded instead of everything before it.
+    """
+    command = [get_ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-y']
+    if start:
+        command += ['-ss', f'{start:.3f}']
+    command += ['-i', source_path]
+    if duration is not None:
+        command += ['-t', f'{duration:.3f}']
+    command += ['-vn', '-ac', '1', '-ar', str(sample_rate), '-acodec', 'pcm_s16le', output_path]
+
+    try:
+        # subprocess.run kills ffmpeg when the timeout expires
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise Exception(f"Audio extraction timed out after {timeout} seconds")
+    if result.returncode != 0:
+        error_output = result.stderr.decode('utf-8', errors='replace').strip()
+        if any(marker in error_output for marker in NO_AUDIO_MARKERS):
+            raise Exception("Media file has no audio track. Please upload a file with audio.")
+        raise Exception(f"Failed to extract audio: {error_output[-500:]}")
+    return output_path
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subtitle_app', '0002_videoupload_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='priority',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='media_duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='videoupload',
+            index=models.Index(fields=['status', 'created_at'], name='videoupload_status_created'),
+        ),
+    ]
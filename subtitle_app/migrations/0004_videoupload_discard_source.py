@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subtitle_app', '0003_videoupload_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='discard_source',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='source_discarded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE subtitle_app_transcriptsegment_fts USING fts5(
+        text, content='subtitle_app_transcriptsegment', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER subtitle_app_transcriptsegment_ai AFTER INSERT ON subtitle_app_transcriptsegment BEGIN
+        INSERT INTO subtitle_app_transcriptsegment_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER subtitle_app_transcriptsegment_ad AFTER DELETE ON subtitle_app_transcriptsegment BEGIN
+        INSERT INTO subtitle_app_transcriptsegment_fts(subtitle_app_transcriptsegment_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER subtitle_app_transcriptsegment_au AFTER UPDATE ON subtitle_app_transcriptsegment BEGIN
+        INSERT INTO subtitle_app_transcriptsegment_fts(subtitle_app_transcriptsegment_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO subtitle_app_transcriptsegment_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS subtitle_app_transcriptsegment_au",
+    "DROP TRIGGER IF EXISTS subtitle_app_transcriptsegment_ad",
+    "DROP TRIGGER IF EXISTS subtitle_app_transcriptsegment_ai",
+    "DROP TABLE IF EXISTS subtitle_app_transcriptsegment_fts",
+]
+
+POSTGRES_FORWARD = [
+    """ALTER TABLE subtitle_app_transcriptsegment ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', text)) STORED""",
+    """CREATE INDEX subtitle_app_transcriptsegment_search_gin
+        ON subtitle_app_transcriptsegment USING GIN (search_vector)""",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS subtitle_app_transcriptsegment_search_gin",
+    "ALTER TABLE subtitle_app_transcriptsegment DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_vendor_sql(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subtitle_app', '0004_videoupload_discard_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('start_time', models.FloatField()),
+                ('end_time', models.FloatField()),
+                ('text', models.TextField()),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='subtitle_app.videoupload')),
+            ],
+            options={
+                'ordering': ['upload', 'position'],
+                'indexes': [models.Index(fields=['upload', 'position'], name='segment_upload_position')],
+            },
+        ),
+        migrations.RunPython(
+            run_vendor_sql({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run_vendor_sql({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-19 13:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subtitle_app', '0005_transcriptsegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='content_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='content_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='deduplicated_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='subtitle_app.videoupload'),
+        ),
+        migrations.AddIndex(
+            model_name='videoupload',
+            index=models.Index(fields=['content_sha256', 'content_size'], name='videoupload_content_hash'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subtitle_app', '0006_videoupload_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='cancel_requested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='videoupload',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-19 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subtitle_app', '0007_videoupload_cancellation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='deadline_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='videoupload',
+            index=models.Index(fields=['status', 'heartbeat_at'], name='videoupload_status_heartbeat'),
+        ),
+    ]
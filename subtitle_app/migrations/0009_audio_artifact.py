@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:30
+
+import django.db.models.deletion
+import django.utils.timezone
+import subtitle_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subtitle_app', '0008_videoupload_liveness'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='language',
+            field=models.CharField(default='en-US', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='AudioArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audio_file', models.FileField(upload_to=subtitle_app.models.audio_artifact_path)),
+                ('size', models.BigIntegerField(default=0)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('energy_threshold', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('upload', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='audio_artifact', to='subtitle_app.videoupload')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subtitle_app', '0009_audio_artifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='profile',
+            field=models.CharField(blank=True, choices=[('fast', 'Fast'), ('balanced', 'Balanced'), ('accurate', 'Accurate')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='processing_stats',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audioartifact',
+            name='preprocessing',
+            # Artifacts cached so far went through the full preprocessing chain
+            field=models.CharField(default='normalize+highpass+compress', max_length=64),
+            preserve_default=False,
+        ),
+    ]
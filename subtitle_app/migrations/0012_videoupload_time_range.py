@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subtitle_app', '0011_webhooks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='range_start',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='range_end',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subtitle_app', '0012_videoupload_time_range'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='audioartifact',
+            name='preprocessing',
+            field=models.CharField(default='', max_length=64),
+        ),
+    ]
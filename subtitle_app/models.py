@@ -1,8 +1,17 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 import os
+import secrets
 import uuid
 
+from .profiles import PROFILE_CHOICES
+
+
+# Audio-only uploads skip the video decode stage
+AUDIO_EXTENSIONS = ['wav', 'flac', 'mp3', 'opus', 'ogg']
+VIDEO_EXTENSIONS = ['avi', 'mp4']
+
 
 def video_upload_path(instance, filename):
     """Generate a unique path for uploaded videos."""
@@ -16,6 +25,11 @@ def subtitle_upload_path(instance, filename):
     return os.path.join('subtitles', f"{uuid.uuid4()}.srt")
 
 
+def audio_artifact_path(instance, filename):
+    """Generate a unique path for cached preprocessed audio."""
+    return os.path.join('audio_cache', f"{uuid.uuid4()}.flac")
+
+
 class VideoUpload(models.Model):
     """Model to track uploaded videos and their generated subtitles."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='video_uploads', null=True, blank=True)
@@ -28,27 +42,206 @@ class VideoUpload(models.Model):
             ('processing', 'Processing'),
             ('completed', 'Completed'),
             ('failed', 'Failed'),
+            ('cancelled', 'Cancelled'),
         ],
         default='pending'
     )
     error_message = models.TextField(blank=True, null=True)
+    # Recognition language (BCP-47 tag, e.g. en-US); can be changed when regenerating
+    language = models.CharField(max_length=20, default='en-US')
+    # Processing profile (blank: server default, resolved when the job runs) and the measured cost of the last run
+    profile = models.CharField(max_length=20, choices=PROFILE_CHOICES, blank=True, default='')
+    processing_stats = models.JSONField(blank=True, null=True)
+    # Scheduling: higher priority runs first; duration is probed at upload time for shortest-job-first
+    priority = models.IntegerField(default=0)
+    media_duration = models.FloatField(blank=True, null=True)
+    # Optional time range (seconds into the media) to subtitle instead of the whole file
+    range_start = models.FloatField(blank=True, null=True)
+    range_end = models.FloatField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    # Liveness: the running worker refreshes heartbeat_at; stale jobs are requeued or failed
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    deadline_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # Set by the cancel endpoint; the running pipeline stops at its next check
+    cancel_requested_at = models.DateTimeField(blank=True, null=True)
+    # Delete the uploaded source once its audio has been extracted
+    discard_source = models.BooleanField(default=False)
+    source_discarded_at = models.DateTimeField(blank=True, null=True)
+    # Content fingerprint used to skip re-uploads of files that were already processed
+    content_sha256 = models.CharField(max_length=64, blank=True, default='')
+    content_size = models.BigIntegerField(blank=True, null=True)
+    deduplicated_from = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, related_name='duplicates', null=True, blank=True
+    )
+    # Notified with a signed POST when the job completes or fails (in addition to the user's webhook)
+    callback_url = models.URLField(max_length=500, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='videoupload_status_created'),
+            models.Index(fields=['content_sha256', 'content_size'], name='videoupload_content_hash'),
+            models.Index(fields=['status', 'heartbeat_at'], name='videoupload_status_heartbeat'),
+        ]
+
     def __str__(self):
         return f"Video Upload {self.id} - {self.status}"
 
     def filename(self):
         return os.path.basename(self.video_file.name)
 
+    def is_audio_only(self):
+        """Return True if the upload is an audio file rather than a video."""
+        return self.video_file.name.lower().rsplit('.', 1)[-1] in AUDIO_EXTENSIONS
+
+    def is_partial(self):
+        """Return True if only a time range of the media is subtitled."""
+        return self.range_start is not None or self.range_end is not None
+
+    def time_range(self, duration=None):
+        """
+        Return the (start, end) seconds to process. The end is clamped to
+        `duration` and is None when neither is known.
+        """
+        start = self.range_start or 0.0
+        end = self.range_end
+        if duration is not None and (end is None or end > duration):
+            end = duration
+        return start, end
+
+    def is_file_shared(self, field_name, name):
+        """Return True if another upload references the same stored file (deduplicated uploads)."""
+        return VideoUpload.objects.filter(**{field_name: name}).exclude(pk=self.pk).exists()
+
+    def delete_stored_file(self, field_name):
+        """
+        Delete a file field's stored file unless another upload still references it.
+        Returns True if a file was deleted.
+        """
+        field_file = getattr(self, field_name)
+        if not field_file or self.is_file_shared(field_name, field_file.name):
+            return False
+        if field_file.storage.exists(field_file.name):
+            field_file.storage.delete(field_file.name)
+            return True
+        return False
+
+    def discard_source_file(self):
+        """
+        Delete the uploaded source from storage, keeping its name for reference.
+        Returns True if the stored file was deleted (False if it is shared or already gone).
+        """
+        if not self.video_file or self.source_discarded_at is not None:
+            return False
+        deleted = self.delete_stored_file('video_file')
+        self.source_discarded_at = timezone.now()
+        self.save(update_fields=['source_discarded_at', 'updated_at'])
+        return deleted
+
     def delete(self, *args, **kwargs):
-        # Delete the files when the model instance is deleted
-        if self.video_file:
-            if os.path.isfile(self.video_file.path):
-                os.remove(self.video_file.path)
-        
-        if self.subtitle_file:
-            if os.path.isfile(self.subtitle_file.path):
-                os.remove(self.subtitle_file.path)
+        # Delete the files when the model instance is deleted (works for local and object storage)
+        self.delete_stored_file('video_file')
+        self.delete_stored_file('subtitle_file')
         
-        super().delete(*args, **kwargs)
\ No newline at end of file
+        super().delete(*args, **kwargs)
+
+
+class TranscriptSegment(models.Model):
+    """
+    One timestamped subtitle cue of an upload, indexed for full-text search.
+
+    The full-text index is maintained outside the ORM (see migration 0005):
+    a generated tsvector column with a GIN index on PostgreSQL, an FTS5
+    external-content table kept in sync by triggers on SQLite.
+    """
+    upload = models.ForeignKey(VideoUpload, on_delete=models.CASCADE, related_name='segments')
+    position = models.PositiveIntegerField()
+    start_time = models.FloatField()
+    end_time = models.FloatField()
+    text = models.TextField()
+
+    class Meta:
+        ordering = ['upload', 'position']
+        indexes = [
+            models.Index(fields=['upload', 'position'], name='segment_upload_position'),
+        ]
+
+    def __str__(self):
+        return f"Segment {self.position} of upload {self.upload_id}"
+
+
+class AudioArtifact(models.Model):
+    """
+    Preprocessed 16kHz mono audio of an upload, stored as FLAC so subtitles
+    can be regenerated without decoding and preprocessing the source again.
+
+    Artifacts are evicted least recently used first once their total size
+    exceeds SUBTITLE_AUDIO_CACHE_MAX_BYTES (see audio_cache.py).
+    """
+    upload = models.OneToOneField(VideoUpload, on_delete=models.CASCADE, related_name='audio_artifact')
+    audio_file = models.FileField(upload_to=audio_artifact_path)
+    size = models.BigIntegerField(default=0)
+    duration = models.FloatField(blank=True, null=True)
+    # Recognizer energy threshold calibrated from the audio, reused on regeneration
+    energy_threshold = models.FloatField(blank=True, null=True)
+    # Preprocessing steps applied (see PipelineProfile.preprocessing_key)
+    preprocessing = models.CharField(max_length=64, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Audio artifact of upload {self.upload_id}"
+
+
+def generate_webhook_secret():
+    return secrets.token_hex(32)
+
+
+class UserWebhook(models.Model):
+    """
+    A user's webhook: job notifications for all their uploads go to `url`,
+    and every notification (including per-upload callbacks) is signed with `secret`.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='webhook')
+    url = models.URLField(max_length=500, blank=True, default='')
+    secret = models.CharField(max_length=64, default=generate_webhook_secret)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Webhook of {self.user}"
+
+
+class WebhookDelivery(models.Model):
+    """One notification POSTed to a callback URL, retried with backoff (see webhooks.py)."""
+    upload = models.ForeignKey(VideoUpload, on_delete=models.CASCADE, related_name='webhook_deliveries')
+    url = models.URLField(max_length=500)
+    event = models.CharField(max_length=40)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', 'Pending'),
+            ('delivered', 'Delivered'),
+            ('failed', 'Failed'),
+        ],
+        default='pending'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_attempt_at = models.DateTimeField(blank=True, null=True)
+    response_status = models.PositiveIntegerField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default='')
+    delivered_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_status_next_attempt'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} for upload {self.upload_id} to {self.url}"
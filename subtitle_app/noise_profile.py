@@ -0,0 +1,85 @@
+"""
+Per-file noise floor estimation for the speech recognizer.
+
+Frame energies are measured in a vectorized way and accumulated into a fixed
+histogram of dBFS levels, so the profile is built incrementally from
+windows of an AudioSegment or of a stream with constant memory.
+The quietest frames are taken as the noise floor and the recognizer energy
+threshold is derived from it once per file.
+"""
+import math
+
+import numpy as np
+
+MAX_AMPLITUDE = 32768.0
+MIN_DB = -100.0
+MAX_DB = 0.0
+BIN_DB = 0.5
+
+
+class NoiseProfile:
+    """Histogram of per-frame RMS levels used to find the low-energy (noise) regions."""
+
+    def __init__(self, frame_ms=30, sample_rate=16000):
+        self.frame_samples = max(int(sample_rate * frame_ms / 1000), 1)
+        self.bin_count = int((MAX_DB - MIN_DB) / BIN_DB) + 1
+        self.counts = np.zeros(self.bin_count, dtype=np.int64)
+        self._remainder = np.zeros(0, dtype=np.float64)
+
+    def add(self, samples):
+        """Add a block of mono samples (any integer or float numpy array)."""
+        x = np.concatenate([self._remainder, np.asarray(samples, dtype=np.float64)])
+        usable = len(x) - len(x) % self.frame_samples
+        self._remainder = x[usable:]
+        if not usable:
+            return
+
+        frames = x[:usable].reshape(-1, self.frame_samples)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        levels = 20 * np.log10(np.maximum(rms, 1.0) / MAX_AMPLITUDE)
+        bins = np.clip(((levels - MIN_DB) / BIN_DB).astype(np.int64), 0, self.bin_count - 1)
+        self.counts += np.bincount(bins, minlength=self.bin_count)
+
+    @property
+    def frame_count(self):
+        return int(self.counts.sum())
+
+    def noise_floor_rms(self, percentile=15.0, gain_db=0.0):
+        """
+        Return the mean RMS (in 16-bit sample units) of the quietest `percentile`
+        percent of frames, optionally shifted by a gain applied after profiling.
+        Returns None when no audio was profiled.
+        """
+        total = self.frame_count
+        if total == 0:
+            return None
+
+        cumulative = np.cumsum(self.counts)
+        last_bin = int(np.searchsorted(cumulative, max(total * percentile / 100.0, 1)))
+        counts = self.counts[:last_bin + 1]
+        centers = MIN_DB + (np.arange(len(counts)) + 0.5) * BIN_DB
+        floor_db = float(np.sum(centers * counts) / max(np.sum(counts), 1))
+        return MAX_AMPLITUDE * math.pow(10, (floor_db + gain_db) / 20.0)
+
+    def energy_threshold(self, percentile=15.0, ratio=1.5, minimum=50.0, maximum=4000.0, gain_db=0.0):
+        """Return a SpeechRecognition energy threshold derived from the noise floor."""
+        floor = self.noise_floor_rms(percentile, gain_db)
+        if floor is None:
+            return None
+        return min(max(floor * ratio, minimum), maximum)
+
+
+SAMPLE_DTYPES = {1: np.int8, 2: '<i2', 4: '<i4'}
+
+
+def iter_audio_segment_windows(audio, window_seconds=10.0):
+    """
+    Yield the samples of a pydub AudioSegment in windows of `window_seconds`.
+
+    The windows are views of the segment's raw data, so at most one window is
+    converted to float at a time instead of a copy of the whole file.
+    """
+    samples = np.frombuffer(audio.raw_data, dtype=SAMPLE_DTYPES[audio.sample_width])
+    window = max(int(audio.frame_rate * window_seconds), 1) * audio.channels
+    for offset in range(0, len(samples), window):
+        yield samples[offset:offset + window]
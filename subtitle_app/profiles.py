@@ -0,0 +1,114 @@
+"""
+Named processing profiles that trade recognition accuracy for throughput.
+
+A profile bundles the chunking (length and overlap), the preprocessing
+steps, the retry count and how many chunks are recognized concurrently.
+Uploads choose one (`profile`), otherwise SUBTITLE_DEFAULT_PROFILE applies;
+the profile used and the measured cost of the run are recorded on the job.
+"""
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class PipelineProfile:
+    """Settings for one run of the subtitle pipeline (picklable, passed to shard processes)."""
+
+    def __init__(self, name, chunk_length_ms, overlap_ms, normalize=True, high_pass=True,
+                 compress=True, max_retries=2, recognizer_concurrency=1, min_chunk_ms=1000):
+        self.name = name
+        self.chunk_length_ms = chunk_length_ms
+        self.overlap_ms = overlap_ms
+        self.normalize = normalize
+        self.high_pass = high_pass
+        self.compress = compress
+        self.max_retries = max_retries
+        self.recognizer_concurrency = recognizer_concurrency
+        self.min_chunk_ms = min_chunk_ms
+
+    @property
+    def chunk_step_ms(self):
+        return self.chunk_length_ms - self.overlap_ms
+
+    @property
+    def preprocessing_key(self):
+        """Identify the preprocessing steps (cached audio is only reused for the same steps)."""
+        steps = [name for name, enabled in (
+            ('normalize', self.normalize), ('highpass', self.high_pass), ('compress', self.compress)
+        ) if enabled]
+        return '+'.join(steps) or 'none'
+
+    def __repr__(self):
+        return f"PipelineProfile({self.name!r})"
+
+
+PROFILES = {
+    # Previews: long chunks without overlap, gain only, one attempt, recognized four at a time
+    'fast': PipelineProfile(
+        'fast', chunk_length_ms=15000, overlap_ms=0,
+        normalize=True, high_pass=False, compress=False,
+        max_retries=1, recognizer_concurrency=4,
+    ),
+    'balanced': PipelineProfile(
+        'balanced', chunk_length_ms=12000, overlap_ms=3000,
+        normalize=True, high_pass=True, compress=False,
+        max_retries=2, recognizer_concurrency=2,
+    ),
+    # The full chain: 50% overlap, filtering and compression, sequential recognition
+    'accurate': PipelineProfile(
+        'accurate', chunk_length_ms=12000, overlap_ms=6000,
+        normalize=True, high_pass=True, compress=True,
+        max_retries=2, recognizer_concurrency=1,
+    ),
+}
+
+PROFILE_CHOICES = [(name, name.capitalize()) for name in PROFILES]
+
+
+def default_profile_name():
+    return getattr(settings, 'SUBTITLE_DEFAULT_PROFILE', 'accurate')
+
+
+def get_profile(name=None):
+    """Return the profile called `name`, or the server default."""
+    name = name or default_profile_name()
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown processing profile '{name}'. Choose one of: {', '.join(PROFILES)}")
+
+
+class JobStats:
+    """Measure the cost of one pipeline run (stored as VideoUpload.processing_stats)."""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.started = time.monotonic()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time a pipeline stage; repeated stages add up."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(self.stages.get(name, 0.0) + time.monotonic() - start, 3)
+
+    def as_dict(self, result, audio_seconds=None, from_cache=False):
+        wall_seconds = time.monotonic() - self.started
+        return {
+            'profile': self.profile.name,
+            'wall_seconds': round(wall_seconds, 3),
+            'stages': dict(self.stages),
+            'audio_seconds': round(audio_seconds, 3) if audio_seconds else audio_seconds,
+            # Processing seconds per second of audio (below 1 is faster than real time)
+            'realtime_factor': round(wall_seconds / audio_seconds, 3) if audio_seconds else None,
+            'total_chunks': result.get('total_chunks', 0),
+            'successful_chunks': result.get('successful_chunks', 0),
+            'failed_chunks': result.get('failed_chunks', 0),
+            'recognizer_calls': result.get('recognizer_calls', 0),
+            'recognizer_concurrency': self.profile.recognizer_concurrency,
+            'from_cache': from_cache,
+        }
@@ -0,0 +1,194 @@
+"""
+Retention and storage lifecycle sweeping.
+
+Deletes source files of finished jobs after their retention period, reclaims
+scratch directories left behind by jobs whose process died, and removes media
+files that no upload references any more. Work is done in batches with a
+pause between them so a sweep never saturates the disk or the database.
+"""
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AudioArtifact, VideoUpload
+
+JOB_DIR_PATTERN = re.compile(r'^subtitle-job-(\d+)-')
+MEDIA_DIRECTORIES = ('videos', 'subtitles', 'audio_cache')
+
+
+class SweepReport:
+    """Counts of what a sweep removed and how many bytes it reclaimed."""
+
+    def __init__(self):
+        self.source_files = 0
+        self.temp_dirs = 0
+        self.orphaned_files = 0
+        self.bytes_reclaimed = 0
+
+    def __str__(self):
+        return (
+            f"{self.source_files} source files, {self.temp_dirs} temp dirs, "
+            f"{self.orphaned_files} unreferenced files; "
+            f"{self.bytes_reclaimed / (1024 * 1024):.1f} MB reclaimed"
+        )
+
+
+def directory_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def batched(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def sweep_source_files(report, retention_days, batch_size=100, pause=0.5, dry_run=False, log=print):
+    """Delete source files of uploads whose status-specific retention period has passed."""
+    now = timezone.now()
+    for status, days in retention_days.items():
+        cutoff = now - timedelta(days=days)
+        queryset = (
+            VideoUpload.objects
+            .filter(status=status, updated_at__lt=cutoff, source_discarded_at__isnull=True)
+            .exclude(video_file='')
+            .order_by('pk')
+        )
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for upload in batch:
+                storage = upload.video_file.storage
+                name = upload.video_file.name
+                size = storage.size(name) if storage.exists(name) else 0
+                # A file shared with another upload (deduplication) stays in storage
+                shared = upload.is_file_shared('video_file', name)
+                log(f"{'Would discard' if dry_run else 'Discarding'} source of upload {upload.pk} "
+                    f"({status}, {size} bytes{', shared, kept in storage' if shared else ''}): {name}")
+                if dry_run:
+                    deleted = size > 0 and not shared
+                else:
+                    deleted = upload.discard_source_file()
+                report.source_files += 1
+                if deleted:
+                    report.bytes_reclaimed += size
+            time.sleep(pause)
+
+
+def sweep_temp_dirs(report, min_age_hours, dry_run=False, log=print):
+    """
+    Remove per-job scratch directories whose job is no longer running.
+
+    Directories younger than `min_age_hours` are left alone so a job that was
+    just claimed is never swept from under its worker.
+    """
+    scratch_dir = getattr(settings, 'SUBTITLE_SCRATCH_DIR', None) or tempfile.gettempdir()
+    if not os.path.isdir(scratch_dir):
+        return
+    cutoff = time.time() - min_age_hours * 3600
+
+    candidates = {}
+    for entry in os.scandir(scratch_dir):
+        match = JOB_DIR_PATTERN.match(entry.name)
+        if match and entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+            candidates[entry.path] = int(match.group(1))
+    if not candidates:
+        return
+
+    running = set(
+        VideoUpload.objects
+        .filter(pk__in=set(candidates.values()), status='processing')
+        .values_list('pk', flat=True)
+    )
+    for path, upload_id in candidates.items():
+        if upload_id in running:
+            continue
+        size = directory_size(path)
+        log(f"{'Would remove' if dry_run else 'Removing'} orphaned temp dir of upload {upload_id} ({size} bytes): {path}")
+        if not dry_run:
+            shutil.rmtree(path, ignore_errors=True)
+        report.temp_dirs += 1
+        report.bytes_reclaimed += size
+
+
+def iter_stored_files(directory):
+    """Yield the names of files stored under a media directory."""
+    try:
+        _, files = default_storage.listdir(directory)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    for name in files:
+        yield f'{directory}/{name}'
+
+
+def sweep_unreferenced_files(report, min_age_hours, batch_size=100, pause=0.5, dry_run=False, log=print):
+    """Delete stored media files that no upload or audio artifact references."""
+    cutoff = timezone.now() - timedelta(hours=min_age_hours)
+    for directory in MEDIA_DIRECTORIES:
+        for batch in batched(iter_stored_files(directory), batch_size):
+            referenced = set()
+            for video_name, subtitle_name in VideoUpload.objects.filter(
+                Q(video_file__in=batch) | Q(subtitle_file__in=batch)
+            ).values_list('video_file', 'subtitle_file'):
+                referenced.add(video_name)
+                referenced.add(subtitle_name)
+            # Files under audio_cache/ belong to audio artifacts rather than uploads
+            referenced.update(
+                AudioArtifact.objects.filter(audio_file__in=batch).values_list('audio_file', flat=True)
+            )
+
+            for name in batch:
+                if name in referenced:
+                    continue
+                try:
+                    if default_storage.get_modified_time(name) >= cutoff:
+                        continue
+                    size = default_storage.size(name)
+                except (FileNotFoundError, NotImplementedError):
+                    continue
+                log(f"{'Would delete' if dry_run else 'Deleting'} unreferenced file ({size} bytes): {name}")
+                if not dry_run:
+                    default_storage.delete(name)
+                report.orphaned_files += 1
+                report.bytes_reclaimed += size
+            time.sleep(pause)
+
+
+def sweep(retention_days=None, temp_min_age_hours=None, orphan_min_age_hours=None,
+          batch_size=100, pause=0.5, dry_run=False, log=print):
+    """Run every sweep stage and return a SweepReport."""
+    if retention_days is None:
+        retention_days = getattr(settings, 'SUBTITLE_SOURCE_RETENTION_DAYS', {})
+    if temp_min_age_hours is None:
+        temp_min_age_hours = getattr(settings, 'SUBTITLE_TEMP_DIR_MIN_AGE_HOURS', 6)
+    if orphan_min_age_hours is None:
+        orphan_min_age_hours = getattr(settings, 'SUBTITLE_ORPHAN_FILE_MIN_AGE_HOURS', 24)
+
+    report = SweepReport()
+    sweep_source_files(report, retention_days, batch_size, pause, dry_run, log)
+    sweep_temp_dirs(report, temp_min_age_hours, dry_run, log)
+    sweep_unreferenced_files(report, orphan_min_age_hours, batch_size, pause, dry_run, log)
+    return report
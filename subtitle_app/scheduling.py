@@ -0,0 +1,138 @@
+"""
+Scheduling policies for the subtitle job dispatcher.
+
+A policy receives the pending uploads that are candidates for dispatch and
+returns the one that should run next. Every policy first honours the explicit
+`priority` field and only then applies its own ordering within the highest
+priority tier. Jobs that have waited longer than
+SUBTITLE_SCHEDULER_MAX_WAIT_SECONDS are starved: the longest-waiting one runs
+next regardless of policy, so long jobs are never held back indefinitely
+while the policy's ordering still decides everything else.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+
+def oldest_starved(candidates, now):
+    """Return the longest-waiting upload past the maximum wait, or None."""
+    max_wait = getattr(settings, 'SUBTITLE_SCHEDULER_MAX_WAIT_SECONDS', 3600)
+    if not max_wait or max_wait <= 0:
+        return None
+    starved = [upload for upload in candidates if (now - upload.created_at).total_seconds() >= max_wait]
+    if not starved:
+        return None
+    return min(starved, key=lambda upload: (upload.created_at, upload.pk))
+
+
+def estimated_duration(upload):
+    """
+    Return the length of media the job processes (the probed duration, or its
+    time range), or the configured estimate when it is unknown.
+    """
+    start, end = upload.time_range(upload.media_duration)
+    if end is not None:
+        return max(end - start, 0.0)
+    return getattr(settings, 'SUBTITLE_SCHEDULER_UNKNOWN_DURATION', 600.0)
+
+
+def top_priority_tier(candidates, now):
+    """
+    Return the candidates sharing the highest priority, or only the
+    longest-waiting starved candidate when there is one.
+    """
+    if not candidates:
+        return []
+    starved = oldest_starved(candidates, now)
+    if starved is not None:
+        return [starved]
+    highest = max(upload.priority or 0 for upload in candidates)
+    return [upload for upload in candidates if (upload.priority or 0) == highest]
+
+
+def select_fifo(candidates, now):
+    """First come, first served."""
+    tier = top_priority_tier(candidates, now)
+    if not tier:
+        return None
+    return min(tier, key=lambda upload: (upload.created_at, upload.pk))
+
+
+def select_shortest_job_first(candidates, now):
+    """Shortest probed media duration first; ties are broken by arrival time."""
+    tier = top_priority_tier(candidates, now)
+    if not tier:
+        return None
+    return min(tier, key=lambda upload: (estimated_duration(upload), upload.created_at, upload.pk))
+
+
+def user_weight(user_id, usernames):
+    """Return the fair-share weight configured for a user (defaults to 1)."""
+    weights = getattr(settings, 'SUBTITLE_FAIR_SHARE_WEIGHTS', {})
+    weight = weights.get(usernames.get(user_id), 1.0)
+    return weight if weight > 0 else 1.0
+
+
+def recent_usage_by_user(user_ids, now):
+    """Count jobs each user currently has running or started within the fair-share window."""
+    from .models import VideoUpload
+
+    window_seconds = getattr(settings, 'SUBTITLE_FAIR_SHARE_WINDOW_SECONDS', 3600)
+    window_start = now - timedelta(seconds=window_seconds)
+    rows = (
+        VideoUpload.objects
+        .filter(user_id__in=user_ids)
+        .filter(Q(status='processing') | Q(started_at__gte=window_start))
+        .values('user_id')
+        .annotate(used=Count('id'))
+    )
+    return {row['user_id']: row['used'] for row in rows}
+
+
+def select_fair_share(candidates, now):
+    """
+    Weighted round-robin across users.
+
+    The user with the least recent usage relative to their weight goes next,
+    and that user's own jobs are ordered shortest first.
+    """
+    tier = top_priority_tier(candidates, now)
+    if not tier:
+        return None
+
+    by_user = {}
+    usernames = {}
+    for upload in tier:
+        by_user.setdefault(upload.user_id, []).append(upload)
+        if upload.user_id is not None and upload.user is not None:
+            usernames[upload.user_id] = upload.user.username
+
+    usage = recent_usage_by_user([user_id for user_id in by_user if user_id is not None], now)
+
+    def user_key(user_id):
+        share = usage.get(user_id, 0) / user_weight(user_id, usernames)
+        oldest = min(upload.created_at for upload in by_user[user_id])
+        return (share, oldest)
+
+    next_user = min(by_user, key=user_key)
+    return select_shortest_job_first(by_user[next_user], now)
+
+
+POLICIES = {
+    'fifo': select_fifo,
+    'sjf': select_shortest_job_first,
+    'fair_share': select_fair_share,
+}
+
+
+def get_policy(name=None):
+    """Return the selection function for a policy name (defaults to the configured policy)."""
+    if name is None:
+        name = getattr(settings, 'SUBTITLE_SCHEDULING_POLICY', 'fifo')
+    try:
+        return POLICIES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown scheduling policy '{name}'. Choose one of: {', '.join(sorted(POLICIES))}"
+        )
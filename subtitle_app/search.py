@@ -0,0 +1,127 @@
+"""
+Full-text search across a user's transcripts.
+
+Segments are written to TranscriptSegment when subtitles are generated and
+searched through the database's own full-text index: PostgreSQL tsvector +
+GIN, or SQLite FTS5. Other backends fall back to a (non-indexed) substring
+match.
+"""
+import re
+
+from django.db import connections, router, transaction
+
+from .models import TranscriptSegment
+
+SRT_TIME = r'(\d+):(\d+):(\d+)[,.](\d+)'
+SRT_TIMING_PATTERN = re.compile(SRT_TIME + r'\s*-->\s*' + SRT_TIME)
+FTS_TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def index_transcript(video_upload, cues):
+    """Replace the indexed segments of an upload with (start, end, text) cues."""
+    with transaction.atomic():
+        TranscriptSegment.objects.filter(upload=video_upload).delete()
+        TranscriptSegment.objects.bulk_create([
+            TranscriptSegment(
+                upload=video_upload,
+                position=position,
+                start_time=start_time,
+                end_time=end_time,
+                text=text,
+            )
+            for position, (start_time, end_time, text) in enumerate(cues)
+        ], batch_size=500)
+
+
+def parse_srt(srt_content):
+    """Parse SRT content into (start, end, text) cues (used to backfill the index)."""
+    def seconds(hours, minutes, secs, millis):
+        return int(hours) * 3600 + int(minutes) * 60 + int(secs) + int(millis) / 1000.0
+
+    cues = []
+    for block in re.split(r'\n\s*\n', srt_content.strip()):
+        lines = block.strip().split('\n')
+        for i, line in enumerate(lines):
+            match = SRT_TIMING_PATTERN.search(line)
+            if match:
+                groups = match.groups()
+                text = ' '.join(l.strip() for l in lines[i + 1:] if l.strip())
+                if text:
+                    cues.append((seconds(*groups[:4]), seconds(*groups[4:]), text))
+                break
+    return cues
+
+
+def fts5_query(query):
+    """Turn free text into an FTS5 query that ANDs the quoted terms (no FTS syntax injection)."""
+    terms = FTS_TERM_PATTERN.findall(query)
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def matching_segment_ids(user, query, limit):
+    """Return ids of the best-matching segments of the user's uploads, best first."""
+    # Raw SQL bypasses the router, so pick the connection it would use (a replica for replica_reads())
+    connection = connections[router.db_for_read(TranscriptSegment)]
+    segment_table = TranscriptSegment._meta.db_table
+    upload_table = TranscriptSegment._meta.get_field('upload').related_model._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        sql = (
+            f"SELECT s.id FROM {segment_table} s "
+            f"JOIN {upload_table} u ON u.id = s.upload_id, "
+            f"websearch_to_tsquery('english', %s) q "
+            f"WHERE u.user_id = %s AND s.search_vector @@ q "
+            f"ORDER BY ts_rank(s.search_vector, q) DESC, s.id LIMIT %s"
+        )
+        params = [query, user.pk, limit]
+    elif connection.vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return []
+        sql = (
+            f"SELECT s.id FROM {segment_table}_fts f "
+            f"JOIN {segment_table} s ON s.id = f.rowid "
+            f"JOIN {upload_table} u ON u.id = s.upload_id "
+            f"WHERE {segment_table}_fts MATCH %s AND u.user_id = %s "
+            f"ORDER BY bm25({segment_table}_fts), s.id LIMIT %s"
+        )
+        params = [match, user.pk, limit]
+    else:
+        return list(
+            TranscriptSegment.objects
+            .filter(upload__user=user, text__icontains=query)
+            .values_list('id', flat=True)[:limit]
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_transcripts(user, query, max_segments=200, max_segments_per_upload=5):
+    """
+    Search the user's transcripts.
+
+    Returns a list of (upload, [segments]) pairs ordered by the rank of each
+    upload's best hit, with each upload's hits in time order.
+    """
+    ids = matching_segment_ids(user, query, max_segments)
+    if not ids:
+        return []
+
+    rank = {segment_id: position for position, segment_id in enumerate(ids)}
+    segments = TranscriptSegment.objects.filter(id__in=ids).select_related('upload')
+
+    by_upload = {}
+    for segment in segments:
+        by_upload.setdefault(segment.upload_id, []).append(segment)
+
+    results = []
+    for hits in by_upload.values():
+        hits.sort(key=lambda segment: rank[segment.id])
+        best = rank[hits[0].id]
+        hits = sorted(hits[:max_segments_per_upload], key=lambda segment: segment.start_time)
+        results.append((best, hits[0].upload, hits))
+
+    results.sort(key=lambda result: result[0])
+    return [(upload, hits) for _, upload, hits in results]
@@ -1,37 +1,96 @@
 from rest_framework import serializers
-from .models import VideoUpload
-import os
+from .dedup import UploadSessionError, hash_uploaded_file, normalize_sha256, verify_upload_session
+from .models import AUDIO_EXTENSIONS, VIDEO_EXTENSIONS, TranscriptSegment, UserWebhook, VideoUpload, WebhookDelivery
+from .export import EXPORT_FORMATS
+from .profiles import PROFILE_CHOICES
+from .storage import file_exists, read_text
+from .webhooks import UnsafeWebhookURL, check_webhook_url
 import re
 
 
-class VideoUploadSerializer(serializers.ModelSerializer):
-    """Serializer for the VideoUpload model."""
+LANGUAGE_PATTERN = re.compile(r'^[A-Za-z]{2,3}(-[A-Za-z0-9]{2,8})*$')
+
+
+def validate_language_tag(value):
+    """Check that a recognition language looks like a BCP-47 tag (e.g. en-US, fr, pt-BR)."""
+    if not LANGUAGE_PATTERN.match(value):
+        raise serializers.ValidationError("Must be a language tag such as en-US.")
+    return value
+
+
+# Fields of the default status representation (cached, no transcript); `?fields=` selects others
+STATUS_FIELDS = ['id', 'status', 'language', 'profile', 'media_duration', 'cancel_requested_at', 'error_message', 'created_at', 'subtitle_url']
+
+# Model fields read by computed serializer fields, for .only() queries
+COMPUTED_FIELD_SOURCES = {
+    'subtitle_url': ['status', 'subtitle_file'],
+    'transcript_text': ['status', 'subtitle_file'],
+    'start': ['range_start'],
+    'end': ['range_end'],
+}
+
+
+class SparseFieldsMixin:
+    """Serializer mixin that limits the output to the names passed as `fields`."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def validate_time_range(start, end):
+    """Check that a requested time range is not empty."""
+    if start is not None and end is not None and end <= start:
+        raise serializers.ValidationError({'end': "Must be after start."})
+
+
+def validate_webhook_url(value):
+    """Webhooks are POSTed over HTTP(S) to public hosts only (see webhooks.check_webhook_url)."""
+    if value:
+        try:
+            check_webhook_url(value)
+        except UnsafeWebhookURL as e:
+            raise serializers.ValidationError(str(e))
+    return value
+
+
+class VideoUploadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer for the VideoUpload model (pass `fields` for a sparse representation)."""
     subtitle_url = serializers.SerializerMethodField()
     transcript_text = serializers.SerializerMethodField()
+    # Token from /api/upload/check/; when given, the file must match the announced checksum
+    upload_session = serializers.CharField(write_only=True, required=False)
+    # Optional time range to subtitle, in seconds into the media
+    start = serializers.FloatField(source='range_start', required=False, allow_null=True, min_value=0)
+    end = serializers.FloatField(source='range_end', required=False, allow_null=True, min_value=0)
     
     class Meta:
         model = VideoUpload
-        fields = ['id', 'video_file', 'status', 'error_message', 'created_at', 'subtitle_url', 'transcript_text']
-        read_only_fields = ['id', 'status', 'error_message', 'created_at', 'subtitle_url', 'transcript_text']
+        fields = ['id', 'video_file', 'status', 'priority', 'language', 'profile', 'processing_stats', 'media_duration', 'start', 'end', 'discard_source', 'source_discarded_at', 'deduplicated_from', 'callback_url', 'cancel_requested_at', 'error_message', 'created_at', 'subtitle_url', 'transcript_text', 'upload_session']
+        read_only_fields = ['id', 'status', 'processing_stats', 'media_duration', 'source_discarded_at', 'deduplicated_from', 'cancel_requested_at', 'error_message', 'created_at', 'subtitle_url', 'transcript_text']
     
     def get_subtitle_url(self, obj):
         """Get the URL for downloading the subtitle file if available."""
         if obj.subtitle_file and obj.status == 'completed':
             request = self.context.get('request')
+            # Return the API download endpoint URL instead of direct media URL
+            # This ensures proper download behavior
+            download_path = f'/api/download/{obj.id}/'
             if request:
-                # Return the API download endpoint URL instead of direct media URL
-                # This ensures proper download behavior
-                return request.build_absolute_uri(f'/api/download/{obj.id}/')
+                return request.build_absolute_uri(download_path)
+            # Without a request (e.g. cached payloads) the path is made absolute per response
+            return download_path
         return None
     
     def get_transcript_text(self, obj):
         """Get the transcript text from the subtitle file, converting SRT to plain text."""
         if obj.subtitle_file and obj.status == 'completed':
             try:
-                subtitle_path = obj.subtitle_file.path
-                if os.path.exists(subtitle_path):
-                    with open(subtitle_path, 'r', encoding='utf-8') as f:
-                        srt_content = f.read()
+                if file_exists(obj.subtitle_file):
+                    srt_content = read_text(obj.subtitle_file)
                     
                     # Convert SRT format to plain text
                     # SRT format: index number, timestamp, text lines, empty line
@@ -89,17 +148,50 @@ class VideoUploadSerializer(serializers.ModelSerializer):
         return None
 
     def validate_video_file(self, value):
-        """Validate that the uploaded file is a video file (AVI or MP4)."""
+        """Validate that the uploaded file is a video (AVI, MP4) or audio (WAV, FLAC, MP3, Opus) file."""
         file_ext = value.name.lower().split('.')[-1]
-        if file_ext not in ['avi', 'mp4']:
-            raise serializers.ValidationError("Only AVI and MP4 video files are supported.")
+        if file_ext not in VIDEO_EXTENSIONS + AUDIO_EXTENSIONS:
+            raise serializers.ValidationError(
+                "Only AVI and MP4 video files or WAV, FLAC, MP3 and Opus audio files are supported."
+            )
         
         # Add a file size limit (100MB for example)
         if value.size > 100 * 1024 * 1024:  # 100MB
-            raise serializers.ValidationError("Video file must be less than 100MB.")
+            raise serializers.ValidationError("Uploaded file must be less than 100MB.")
             
         return value
     
+    def validate_language(self, value):
+        return validate_language_tag(value)
+    
+    def validate_callback_url(self, value):
+        return validate_webhook_url(value)
+    
+    def validate_priority(self, value):
+        """Only staff users may override the scheduling priority."""
+        if value:
+            request = self.context.get('request')
+            if not request or not request.user.is_staff:
+                raise serializers.ValidationError("Only staff users can set a job priority.")
+        return value
+    
+    def validate(self, attrs):
+        """Fingerprint the uploaded file and check it against the upload session, if any."""
+        validate_time_range(attrs.get('range_start'), attrs.get('range_end'))
+        video_file = attrs.get('video_file')
+        if video_file is not None:
+            sha256, size = hash_uploaded_file(video_file)
+            upload_session = attrs.pop('upload_session', None)
+            if upload_session:
+                request = self.context.get('request')
+                try:
+                    verify_upload_session(upload_session, request.user, sha256, size)
+                except UploadSessionError as e:
+                    raise serializers.ValidationError({'upload_session': str(e)})
+            attrs['content_sha256'] = sha256
+            attrs['content_size'] = size
+        return attrs
+    
     def create(self, validated_data):
         """Create a new VideoUpload instance with the current user."""
         # Get the user from the request context
@@ -109,4 +201,127 @@ class VideoUploadSerializer(serializers.ModelSerializer):
         else:
             raise serializers.ValidationError("User must be authenticated to upload videos.")
         
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+
+def readable_upload_fields():
+    """Return the fields of VideoUploadSerializer that can be requested with `?fields=`."""
+    return [name for name in VideoUploadSerializer.Meta.fields if name != 'upload_session']
+
+
+def model_fields_for(fields):
+    """Return the VideoUpload model fields needed to serialize `fields` (for .only())."""
+    model_fields = {'id'}
+    for name in fields:
+        model_fields.update(COMPUTED_FIELD_SOURCES.get(name, [name]))
+    return sorted(model_fields)
+
+
+class UploadCheckSerializer(serializers.Serializer):
+    """Checksum a client announces before uploading a file."""
+    sha256 = serializers.CharField()
+    size = serializers.IntegerField(min_value=1)
+    discard_source = serializers.BooleanField(required=False, default=False)
+    language = serializers.CharField(required=False, default='en-US', validators=[validate_language_tag])
+    # Processing profile the client would upload with (blank: server default)
+    profile = serializers.ChoiceField(choices=PROFILE_CHOICES, required=False, allow_blank=True, default='')
+    # Time range the client would upload with (results for other ranges don't match)
+    start = serializers.FloatField(required=False, allow_null=True, min_value=0, default=None)
+    end = serializers.FloatField(required=False, allow_null=True, min_value=0, default=None)
+
+    def validate(self, attrs):
+        validate_time_range(attrs['start'], attrs['end'])
+        return attrs
+
+    def validate_sha256(self, value):
+        digest = normalize_sha256(value)
+        if digest is None:
+            raise serializers.ValidationError("Must be a hex-encoded SHA-256 digest.")
+        return digest
+
+    def validate_size(self, value):
+        if value > 100 * 1024 * 1024:  # Same limit as uploads
+            raise serializers.ValidationError("Uploaded file must be less than 100MB.")
+        return value
+
+
+class RegenerateSerializer(serializers.Serializer):
+    """Options for re-running subtitle generation on an existing upload."""
+    language = serializers.CharField(required=False, validators=[validate_language_tag])
+    profile = serializers.ChoiceField(choices=PROFILE_CHOICES, required=False)
+    callback_url = serializers.URLField(max_length=500, required=False, allow_blank=True, validators=[validate_webhook_url])
+    # New time range in seconds (null clears it: the whole file)
+    start = serializers.FloatField(required=False, allow_null=True, min_value=0)
+    end = serializers.FloatField(required=False, allow_null=True, min_value=0)
+
+
+class ExportRequestSerializer(serializers.Serializer):
+    """Which uploads to export (`ids`, or a created_at range) and in which formats."""
+    ids = serializers.CharField(required=False, help_text='Comma-separated upload ids.')
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    formats = serializers.CharField(required=False, default='srt', help_text='Comma-separated: srt, vtt, txt.')
+
+    def validate_ids(self, value):
+        try:
+            ids = [int(part) for part in value.split(',') if part.strip()]
+        except ValueError:
+            raise serializers.ValidationError("Must be a comma-separated list of upload ids.")
+        if not ids:
+            raise serializers.ValidationError("Must list at least one upload id.")
+        return ids
+
+    def validate_formats(self, value):
+        formats = list(dict.fromkeys(part.strip().lower() for part in value.split(',') if part.strip()))
+        unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+        if unknown or not formats:
+            raise serializers.ValidationError(f"Choose from: {', '.join(EXPORT_FORMATS)}.")
+        return formats
+
+
+class UserWebhookSerializer(serializers.ModelSerializer):
+    """The user's webhook URL and the secret all their notifications are signed with."""
+    # Send true to replace the secret (e.g. after it leaked)
+    rotate_secret = serializers.BooleanField(write_only=True, required=False, default=False)
+
+    class Meta:
+        model = UserWebhook
+        fields = ['url', 'secret', 'rotate_secret', 'updated_at']
+        read_only_fields = ['secret', 'updated_at']
+
+    def validate_url(self, value):
+        return validate_webhook_url(value)
+
+
+class WebhookDeliverySerializer(serializers.ModelSerializer):
+    """One logged webhook delivery of an upload."""
+
+    class Meta:
+        model = WebhookDelivery
+        fields = ['id', 'url', 'event', 'status', 'attempts', 'response_status', 'last_error',
+                  'next_attempt_at', 'last_attempt_at', 'delivered_at', 'created_at']
+
+
+class TranscriptSegmentSerializer(serializers.ModelSerializer):
+    """A timestamped transcript segment that matched a search."""
+    start = serializers.FloatField(source='start_time')
+    end = serializers.FloatField(source='end_time')
+
+    class Meta:
+        model = TranscriptSegment
+        fields = ['start', 'end', 'text']
+
+
+class TranscriptSearchResultSerializer(serializers.Serializer):
+    """An upload matching a transcript search, with its matching segments."""
+    id = serializers.IntegerField(source='upload.id')
+    filename = serializers.CharField(source='upload.filename')
+    status = serializers.CharField(source='upload.status')
+    created_at = serializers.DateTimeField(source='upload.created_at')
+    subtitle_url = serializers.SerializerMethodField()
+    segments = TranscriptSegmentSerializer(many=True)
+
+    def get_subtitle_url(self, obj):
+        request = self.context.get('request')
+        download_path = f"/api/download/{obj['upload'].id}/"
+        return request.build_absolute_uri(download_path) if request else download_path
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .audio_cache import delete_artifact_file
+from .authentication import invalidate_token, invalidate_user_tokens
+from .models import AudioArtifact, VideoUpload
+from .status_cache import invalidate_status_cache, refresh_status_cache
+
+
+@receiver(post_save, sender=VideoUpload)
+def update_cached_status(sender, instance, **kwargs):
+    """Rewrite the cached status payload whenever an upload changes."""
+    try:
+        refresh_status_cache(instance.pk)
+    except Exception as e:
+        # Never fail a save because of the cache; drop the entry instead
+        print(f"Could not refresh status cache for upload {instance.pk}: {str(e)}")
+        invalidate_status_cache(instance.pk)
+
+
+@receiver(post_delete, sender=VideoUpload)
+def delete_cached_status(sender, instance, **kwargs):
+    invalidate_status_cache(instance.pk)
+
+
+@receiver(post_delete, sender=AudioArtifact)
+def delete_artifact_audio(sender, instance, **kwargs):
+    """Remove cached audio from storage when its artifact is evicted or its upload deleted."""
+    delete_artifact_file(instance)
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Logged-out (deleted) tokens must stop authenticating immediately."""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, **kwargs):
+    """Deactivated or edited users must not be served from the token cache."""
+    invalidate_user_tokens(instance)
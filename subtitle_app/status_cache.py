@@ -0,0 +1,112 @@
+"""
+Cache of serialized upload status payloads.
+
+A job's state changes only a handful of times, so the status payload is
+cached per upload in the Django cache and rewritten from the database
+whenever the upload is saved (see signals.py). Payloads are cached without a request, with
+site-relative URLs that are made absolute for each response.
+
+The cached payload is the minimal status representation (STATUS_FIELDS,
+without the transcript). Sparse `?fields=` requests within it are cut from
+the cache; requests for other fields (e.g. `transcript_text`) load only the
+columns they need and are not cached.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .db_router import read_alias
+from .models import VideoUpload
+
+URL_FIELDS = ('video_file', 'subtitle_url')
+
+
+def status_cache_key(pk):
+    return f'subtitle_app:status:{pk}'
+
+
+def status_cache_timeout():
+    return getattr(settings, 'SUBTITLE_STATUS_CACHE_TIMEOUT', 300)
+
+
+def build_status_payload(video_upload, fields=None):
+    """Serialize an upload for the status endpoint (request-independent)."""
+    from .serializers import STATUS_FIELDS, VideoUploadSerializer
+    return dict(VideoUploadSerializer(video_upload, fields=fields or STATUS_FIELDS).data)
+
+
+def refresh_status_cache(pk):
+    """
+    Write the current payload of an upload to the cache.
+
+    The payload is built from the row on the primary, not from an in-memory
+    instance that may predate updates made by the cancel endpoint or the reaper.
+    """
+    video_upload = VideoUpload.objects.using('default').filter(pk=pk).first()
+    if video_upload is None:
+        invalidate_status_cache(pk)
+        return None
+    payload = build_status_payload(video_upload)
+    cache.set(status_cache_key(pk), payload, status_cache_timeout())
+    return payload
+
+
+def invalidate_status_cache(pk):
+    """Drop the cached payload (used after queryset.update(), which sends no signals)."""
+    cache.delete(status_cache_key(pk))
+
+
+def absolutize_payload(payload, request):
+    """Return a copy of a cached payload with absolute URLs for this request."""
+    payload = dict(payload)
+    for field in URL_FIELDS:
+        value = payload.get(field)
+        if value and value.startswith('/'):
+            payload[field] = request.build_absolute_uri(value)
+    return payload
+
+
+async def aget_status_payload(pk, fields=None):
+    """
+    Return the status payload for an upload, limited to `fields` if given.
+
+    The default status fields are served from the cache (loaded and cached on
+    a miss); other fields are serialized from the database. Returns None if
+    the upload does not exist.
+    """
+    from .serializers import STATUS_FIELDS, model_fields_for
+
+    if fields and not set(fields) <= set(STATUS_FIELDS):
+        video_upload = await VideoUpload.objects.only(*model_fields_for(fields)).filter(pk=pk).afirst()
+        if video_upload is None:
+            return None
+        # Serialization may read the subtitle file from storage, so run it off the event loop
+        return await sync_to_async(build_status_payload, thread_sensitive=False)(video_upload, fields)
+
+    payload = await aget_cached_status_payload(pk)
+    if payload is not None and fields:
+        payload = {name: payload[name] for name in fields}
+    return payload
+
+
+async def aget_cached_status_payload(pk):
+    """Return the cached default status payload, loading and caching it on a miss."""
+    from .serializers import STATUS_FIELDS, model_fields_for
+
+    key = status_cache_key(pk)
+    payload = await cache.aget(key)
+    if payload is not None:
+        return payload
+
+    video_upload = await VideoUpload.objects.only(*model_fields_for(STATUS_FIELDS)).filter(pk=pk).afirst()
+    if video_upload is None:
+        return None
+
+    payload = build_status_payload(video_upload)
+    # Only fill an empty slot: a save may have rewritten the entry meanwhile, and a
+    # replica read may lag behind it (replica-built entries also expire sooner)
+    timeout = status_cache_timeout()
+    if read_alias() != 'default':
+        timeout = min(timeout, getattr(settings, 'SUBTITLE_REPLICA_STATUS_CACHE_TIMEOUT', 10))
+    await cache.aadd(key, payload, timeout)
+    return payload
@@ -0,0 +1,111 @@
+"""
+Helpers for working with media files through the Django storage API.
+
+Files may live on the local disk (FileSystemStorage) or in an S3-compatible
+bucket, so nothing here assumes `FieldFile.path` exists.
+"""
+import io
+import os
+import shutil
+
+from django.conf import settings
+
+
+COPY_BUFFER_SIZE = 1024 * 1024  # 1MB
+
+
+def local_path(field_file):
+    """Return the local filesystem path of a stored file, or None for remote storages."""
+    try:
+        return field_file.path
+    except NotImplementedError:
+        return None
+
+
+def file_exists(field_file):
+    """Return True if the stored file exists in its storage."""
+    if not field_file:
+        return False
+    return field_file.storage.exists(field_file.name)
+
+
+def file_size(field_file):
+    """Return the size of a stored file in bytes."""
+    return field_file.storage.size(field_file.name)
+
+
+def delete_file(field_file):
+    """Delete a stored file from its storage if it exists (the field value is kept)."""
+    if field_file and field_file.storage.exists(field_file.name):
+        field_file.storage.delete(field_file.name)
+
+
+def read_text(field_file, encoding='utf-8'):
+    """Read a stored text file."""
+    with field_file.storage.open(field_file.name, 'rb') as f:
+        return f.read().decode(encoding)
+
+
+def iter_text_lines(field_file, encoding='utf-8'):
+    """Yield the lines of a stored text file without reading it all into memory."""
+    with field_file.storage.open(field_file.name, 'rb') as f:
+        yield from io.TextIOWrapper(f, encoding=encoding, errors='replace', newline='')
+
+
+def media_location(field_file):
+    """
+    Return something ffmpeg can read the stored file from without downloading it all:
+    the local path, or a (presigned) URL for remote storages.
+    """
+    path = local_path(field_file)
+    if path is not None:
+        return path
+    return field_file.storage.url(field_file.name)
+
+
+def stage_to_scratch(field_file, scratch_dir):
+    """
+    Make a stored file available on the local filesystem for processing.
+
+    Local files are used in place; remote files are streamed into `scratch_dir`.
+    Returns (path, staged) where `staged` tells whether a copy was made.
+    """
+    path = local_path(field_file)
+    if path is not None:
+        return path, False
+
+    staged_path = os.path.join(scratch_dir, 'source' + os.path.splitext(field_file.name)[1])
+    print(f"Staging {field_file.name} from storage to {staged_path}")
+    with field_file.storage.open(field_file.name, 'rb') as source, open(staged_path, 'wb') as target:
+        shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
+    return staged_path, True
+
+
+def scratch_root():
+    """Return the directory where workers create their per-job scratch directories."""
+    scratch_dir = getattr(settings, 'SUBTITLE_SCRATCH_DIR', None)
+    if scratch_dir:
+        os.makedirs(scratch_dir, exist_ok=True)
+    return scratch_dir
+
+
+def presigned_download_url(field_file, download_name, content_type='text/plain; charset=utf-8'):
+    """
+    Return a presigned URL that downloads the file straight from object storage,
+    or None when the storage cannot sign URLs (e.g. local disk).
+    """
+    if local_path(field_file) is not None:
+        return None
+    storage = field_file.storage
+    try:
+        return storage.url(
+            field_file.name,
+            parameters={
+                'ResponseContentDisposition': f'attachment; filename="{download_name}"',
+                'ResponseContentType': content_type,
+            },
+            expire=getattr(settings, 'SUBTITLE_PRESIGNED_URL_EXPIRE', 300),
+        )
+    except TypeError:
+        # Storage backend without signing parameters
+        return storage.url(field_file.name)
@@ -0,0 +1,289 @@
+"""
+Memory-bounded audio pipeline for very long inputs.
+
+Instead of loading the whole track into an AudioSegment, PCM is read from an
+ffmpeg pipe in fixed-size windows. Preprocessing (gain, high-pass filter,
+dynamic range compression) carries its state from one window to the next and
+chunks are yielded lazily, so peak memory does not grow with video length.
+"""
+import math
+import subprocess
+import threading
+
+import numpy as np
+from pydub import AudioSegment
+
+from .media import get_ffmpeg_binary
+from .noise_profile import NoiseProfile
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+MAX_AMPLITUDE = 32768.0
+WINDOW_SECONDS = 10
+
+
+def iter_pcm_windows(source_path, window_seconds=WINDOW_SECONDS, start=None, duration=None, timeout=None, idle_timeout=None):
+    """
+    Yield the audio track of a media file as int16 numpy arrays of mono 16kHz PCM.
+
+    ffmpeg decodes straight into a pipe, so only one window is held at a time.
+    With `idle_timeout`, ffmpeg is killed if it produces no window for that many seconds.
+    """
+    command = [get_ffmpeg_binary(), '-hide_banner', '-loglevel', 'error']
+    if start:
+        command += ['-ss', f'{start:.3f}']
+    command += ['-i', source_path]
+    if duration is not None:
+        command += ['-t', f'{duration:.3f}']
+    command += ['-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', 'pipe:1']
+
+    window_bytes = int(window_seconds * SAMPLE_RATE) * SAMPLE_WIDTH
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    timed_out = threading.Event()
+    watchdog = None
+
+    def kill_stalled():
+        timed_out.set()
+        process.kill()
+
+    try:
+        while True:
+            if idle_timeout:
+                watchdog = threading.Timer(idle_timeout, kill_stalled)
+                watchdog.daemon = True
+                watchdog.start()
+            data = process.stdout.read(window_bytes)
+            if watchdog:
+                watchdog.cancel()
+            if timed_out.is_set():
+                raise Exception(f"Audio decoding stalled for more than {idle_timeout} seconds")
+            if not data:
+                break
+            if len(data) % SAMPLE_WIDTH:
+                data = data[:-(len(data) % SAMPLE_WIDTH)]
+            yield np.frombuffer(data, dtype=np.int16)
+        error_output = process.stderr.read().decode('utf-8', errors='replace').strip()
+        returncode = process.wait(timeout=timeout)
+        if returncode != 0:
+            raise Exception(f"Failed to decode audio: {error_output[-500:]}")
+    finally:
+        if watchdog:
+            watchdog.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def analyze_levels(source_path, start=None, duration=None, idle_timeout=None, on_window=None):
+    """
+    Measure the peak amplitude and RMS level of a media file's audio in one streaming pass.
+
+    Returns a dict with `peak`, `rms`, `dbfs`, `samples` and a `noise_profile`
+    of the frame levels (used to calibrate the recognizer once per file).
+    `on_window` is called after every window (progress / cancellation checks).
+    """
+    peak = 0
+    sum_squares = 0.0
+    samples = 0
+    noise_profile = NoiseProfile(sample_rate=SAMPLE_RATE)
+    for window in iter_pcm_windows(source_path, start=start, duration=duration, idle_timeout=idle_timeout):
+        if on_window:
+            on_window()
+        if not len(window):
+            continue
+        noise_profile.add(window)
+        window = window.astype(np.float64)
+        peak = max(peak, int(np.max(np.abs(window))))
+        sum_squares += float(np.dot(window, window))
+        samples += len(window)
+
+    if samples == 0:
+        raise Exception("Media file has no audio track. Please upload a video with audio.")
+
+    rms = math.sqrt(sum_squares / samples)
+    dbfs = 20 * math.log10(rms / MAX_AMPLITUDE) if rms > 0 else -float('inf')
+    return {'peak': peak, 'rms': rms, 'dbfs': dbfs, 'samples': samples, 'noise_profile': noise_profile}
+
+
+def normalization_gain_db(levels, headroom=0.1, quiet_dbfs=-30.0, quiet_boost=10.0):
+    """
+    Return the gain that AudioSegment.normalize() (plus the quiet-audio boost) would apply.
+    """
+    if levels['peak'] == 0:
+        return 0.0
+    peak_dbfs = 20 * math.log10(levels['peak'] / MAX_AMPLITUDE)
+    gain_db = -peak_dbfs - headroom
+    if levels['dbfs'] + gain_db < quiet_dbfs:
+        gain_db += quiet_boost
+    return gain_db
+
+
+class HighPassFilter:
+    """
+    First-order RC high-pass filter (same response as AudioSegment.high_pass_filter)
+    whose state carries over between windows.
+
+    The recursion y[n] = a * (y[n-1] + x[n] - x[n-1]) is evaluated in blocks:
+    within a block it is a scaled cumulative sum, so only the block boundaries
+    are handled in Python.
+    """
+
+    BLOCK_SIZE = 256
+
+    def __init__(self, cutoff, sample_rate=SAMPLE_RATE):
+        rc = 1.0 / (cutoff * 2 * math.pi)
+        dt = 1.0 / sample_rate
+        self.alpha = rc / (rc + dt)
+        self.previous_input = None
+        self.previous_output = 0.0
+        n = np.arange(self.BLOCK_SIZE, dtype=np.float64)
+        self._growth = self.alpha ** (n + 1)
+        self._decay = self.alpha ** (-n)
+
+    def process(self, samples):
+        x = samples.astype(np.float64)
+        if not len(x):
+            return x
+        if self.previous_input is None:
+            self.previous_input = x[0]
+
+        diffs = np.empty_like(x)
+        diffs[0] = x[0] - self.previous_input
+        diffs[1:] = x[1:] - x[:-1]
+
+        output = np.empty_like(x)
+        carry = self.previous_output
+        for block_start in range(0, len(x), self.BLOCK_SIZE):
+            block = diffs[block_start:block_start + self.BLOCK_SIZE]
+            size = len(block)
+            growth = self._growth[:size]
+            values = growth * (carry + np.cumsum(block * self._decay[:size]))
+            output[block_start:block_start + size] = values
+            carry = values[-1]
+
+        self.previous_input = x[-1]
+        self.previous_output = carry
+        return output
+
+
+class DynamicRangeCompressor:
+    """
+    Streaming version of AudioSegment.compress_dynamic_range.
+
+    The RMS over the attack window is computed with a running sum of squares
+    (carried across windows). The attack/release envelope is stepped once per
+    `STEP` samples (1 ms) instead of per sample, with the gain ramped linearly
+    within each step; steps are aligned to the absolute sample position, so
+    the output does not depend on how the stream is cut into windows.
+    """
+
+    STEP = 16
+
+    def __init__(self, threshold=-20.0, ratio=4.0, attack=5.0, release=50.0, sample_rate=SAMPLE_RATE):
+        self.threshold_rms = MAX_AMPLITUDE * (10 ** (threshold / 20.0))
+        self.ratio = ratio
+        self.look_frames = max(int(sample_rate * attack / 1000.0), 1)
+        self.attack_steps = sample_rate * attack / 1000.0 / self.STEP
+        self.release_steps = sample_rate * release / 1000.0 / self.STEP
+        self.attenuation = 0.0
+        self._previous_attenuation = 0.0
+        self._position = 0
+        self._history = np.zeros(0, dtype=np.float64)
+
+    def process(self, samples):
+        x = samples.astype(np.float64)
+        if not len(x):
+            return x
+
+        # RMS of the `look_frames` samples preceding the first sample of each step
+        first = (-self._position) % self.STEP
+        squares = np.concatenate([self._history, x]) ** 2
+        cumulative = np.concatenate([[0.0], np.cumsum(squares)])
+        history_length = len(self._history)
+        ends = np.arange(first, len(x), self.STEP) + history_length
+        starts = np.maximum(ends - self.look_frames, 0)
+        counts = np.maximum(ends - starts, 1)
+        rms = np.sqrt(np.maximum(cumulative[ends] - cumulative[starts], 0.0) / counts)
+
+        with np.errstate(divide='ignore'):
+            over_db = 20 * np.log10(np.where(rms > 0, rms / self.threshold_rms, 1.0))
+        max_attenuation = (1 - (1.0 / self.ratio)) * np.maximum(over_db, 0.0)
+        above = rms > self.threshold_rms
+
+        # levels[0] -> levels[1] is the step already in progress, then one level per new step
+        levels = [self._previous_attenuation, self.attenuation]
+        attenuation = self.attenuation
+        for limit, is_above in zip(max_attenuation.tolist(), above.tolist()):
+            if is_above and attenuation <= limit:
+                attenuation = min(attenuation + limit / self.attack_steps, limit)
+            else:
+                attenuation = max(attenuation - limit / self.release_steps, 0.0)
+            levels.append(attenuation)
+        levels = np.array(levels)
+
+        offsets = np.arange(len(x))
+        step = (offsets - first) // self.STEP + 1
+        fraction = ((self._position + offsets) % self.STEP + 1) / self.STEP
+        gains = levels[step] + (levels[step + 1] - levels[step]) * fraction
+
+        self._previous_attenuation, self.attenuation = levels[-2], levels[-1]
+        self._position += len(x)
+        self._history = np.concatenate([self._history, x])[-self.look_frames:]
+        return x * np.power(10.0, -gains / 20.0)
+
+
+def iter_preprocessed_windows(source_path, gain_db, high_pass_cutoff=80, start=None, duration=None, idle_timeout=None, compress=True):
+    """
+    Yield int16 windows with gain, high-pass filter and compression applied.
+
+    A `high_pass_cutoff` of None skips the filter; `compress=False` skips compression.
+    """
+    gain = 10 ** (gain_db / 20.0)
+    high_pass = HighPassFilter(high_pass_cutoff) if high_pass_cutoff else None
+    compressor = DynamicRangeCompressor(threshold=-20.0, ratio=4.0, attack=5.0, release=50.0) if compress else None
+
+    for window in iter_pcm_windows(source_path, start=start, duration=duration, idle_timeout=idle_timeout):
+        samples = np.clip(window.astype(np.float64) * gain, -MAX_AMPLITUDE, MAX_AMPLITUDE - 1)
+        if high_pass is not None:
+            samples = np.clip(high_pass.process(samples), -MAX_AMPLITUDE, MAX_AMPLITUDE - 1)
+        if compressor is not None:
+            samples = compressor.process(samples)
+        yield np.clip(samples, -MAX_AMPLITUDE, MAX_AMPLITUDE - 1).astype(np.int16)
+
+
+def iter_chunks(windows, chunk_length_ms, step_ms, min_chunk_ms):
+    """
+    Re-cut a stream of sample windows into overlapping chunks.
+
+    Yields (start_ms, AudioSegment) pairs with the same boundaries as slicing
+    the whole track every `step_ms`; at most one chunk of audio is buffered.
+    """
+    chunk_samples = int(SAMPLE_RATE * chunk_length_ms / 1000)
+    step_samples = int(SAMPLE_RATE * step_ms / 1000)
+    min_samples = int(SAMPLE_RATE * min_chunk_ms / 1000)
+
+    def to_segment(samples):
+        return AudioSegment(
+            data=samples.tobytes(),
+            sample_width=SAMPLE_WIDTH,
+            frame_rate=SAMPLE_RATE,
+            channels=1,
+        )
+
+    buffer = np.zeros(0, dtype=np.int16)
+    buffer_start = 0  # in samples
+    for window in windows:
+        buffer = np.concatenate([buffer, window])
+        while len(buffer) >= chunk_samples:
+            yield buffer_start * 1000 // SAMPLE_RATE, to_segment(buffer[:chunk_samples])
+            buffer = buffer[step_samples:]
+            buffer_start += step_samples
+
+    # Tail: the remaining partial chunks, skipping ones that are too short
+    while len(buffer) > 0:
+        if len(buffer) > min_samples:
+            yield buffer_start * 1000 // SAMPLE_RATE, to_segment(buffer[:chunk_samples])
+        buffer = buffer[step_samples:]
+        buffer_start += step_samples
@@ -1,304 +1,896 @@
 import os
+import math
+import multiprocessing
+import shutil
+from collections import deque
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import django
+import numpy as np
 import speech_recognition as sr
 import pysrt
-from moviepy.video.io.VideoFileClip import VideoFileClip
 from pydub import AudioSegment
 import tempfile
 import time
 from django.core.files.base import ContentFile
 from django.conf import settings
+from .cancellation import JobCancelled
+from .liveness import JobLost, JobMonitor, finish_attempt
+from .media import extract_audio_segment, probe_media_duration
+from .storage import file_exists, scratch_root, stage_to_scratch
+from .search import index_transcript
+from .noise_profile import NoiseProfile, iter_audio_segment_windows
+from .streaming import SAMPLE_RATE, analyze_levels, iter_chunks, iter_pcm_windows, iter_preprocessed_windows, normalization_gain_db
+from .audio_cache import FlacEncoder, cache_enabled, find_artifact, store_artifact, touch_artifact
+from .profiles import JobStats, get_profile
 
-def generate_subtitles(video_upload):
+# Chunking, preprocessing, retries and recognizer concurrency come from the
+# job's processing profile (see profiles.py)
+
+
+def ffmpeg_timeout():
+    """Seconds an ffmpeg decode stage may take (or stall, when streaming) before it is killed."""
+    return getattr(settings, 'SUBTITLE_FFMPEG_TIMEOUT', 300) or None
+
+
+def load_audio(audio_path):
+    """Load a WAV file as a mono 16kHz AudioSegment."""
+    print(f"Loading audio file: {audio_path}")
+    audio = AudioSegment.from_wav(audio_path)
+    print(f"Audio duration: {len(audio)} ms ({len(audio)/1000} seconds)")
+    print(f"Audio frame rate: {audio.frame_rate} Hz")
+    print(f"Audio channels: {audio.channels}")
+
+    # Convert to mono if stereo (speech recognition works better with mono)
+    if audio.channels > 1:
+        print("Converting stereo to mono for better recognition")
+        audio = audio.set_channels(1)
+
+    # Set sample rate to 16kHz if different (optimal for Google Speech Recognition)
+    if audio.frame_rate != 16000:
+        print(f"Resampling from {audio.frame_rate}Hz to 16000Hz")
+        audio = audio.set_frame_rate(16000)
+
+    return audio
+
+
+def preprocess_audio(audio, profile=None, gain_db=None, cancellation=None):
     """
-    Generate SRT subtitles from an uploaded video file.
-    
-    This function extracts audio from the video, converts speech to text,
-    and creates SRT subtitle file.
-    
-    Args:
-        video_upload: VideoUpload model instance
+    Normalize, filter and compress audio to improve recognition (steps chosen by the profile).
+
+    With `gain_db` (measured over the whole file), that gain replaces the
+    normalization of this piece of audio on its own. `cancellation` is
+    checked between the steps.
     """
-    try:
-        # Extract audio from video
-        video_path = video_upload.video_file.path
-        print(f"Starting subtitle generation for video: {video_path}")
-        
-        if not os.path.exists(video_path):
-            raise Exception(f"Video file not found: {video_path}")
-        
-        temp_dir = tempfile.mkdtemp()
-        temp_audio_path = os.path.join(temp_dir, 'audio.wav')
-        
-        # Update the model status
-        video_upload.status = 'processing'
-        video_upload.save()
-        
-        # Extract audio using moviepy
-        print(f"Extracting audio from video: {video_path}")
-        try:
-            video_clip = VideoFileClip(video_path)
-        except Exception as e:
-            raise Exception(f"Failed to open video file: {str(e)}")
-        
-        try:
-            # Check if video has audio
-            if video_clip.audio is None:
-                video_clip.close()
-                raise Exception("Video file has no audio track. Please upload a video with audio.")
-            
-            print(f"Video duration: {video_clip.duration} seconds")
-            print(f"Video FPS: {video_clip.fps}")
-            print(f"Video size: {video_clip.size}")
-            
-            try:
-                # Extract audio with optimal settings for speech recognition
-                # Use mono channel, 16kHz sample rate (optimal for Google Speech Recognition)
-                video_clip.audio.write_audiofile(
-                    temp_audio_path,
-                    codec='pcm_s16le',
-                    ffmpeg_params=['-ac', '1', '-ar', '16000']  # Mono, 16kHz
-                )
-            except TypeError:
-                # Fallback for older MoviePy versions
-                try:
-                    video_clip.audio.write_audiofile(temp_audio_path, codec='pcm_s16le')
-                except Exception as e2:
-                    video_clip.close()
-                    raise Exception(f"Failed to extract audio from video: {str(e2)}")
-            except Exception as e:
-                video_clip.close()
-                raise Exception(f"Failed to extract audio from video: {str(e)}")
-            
-            video_clip.close()
-            
-            # Verify audio file was created
-            if not os.path.exists(temp_audio_path):
-                raise Exception("Audio extraction failed - output file not created")
-            
-            audio_file_size = os.path.getsize(temp_audio_path)
-            if audio_file_size == 0:
-                raise Exception("Audio extraction failed - output file is empty")
-            
-            print(f"Audio file created: {temp_audio_path} ({audio_file_size} bytes)")
-            
-        except Exception as e:
-            if 'video_clip' in locals():
-                try:
-                    video_clip.close()
-                except:
-                    pass
-            raise
-        
-        # Process audio in chunks for better recognition
-        print(f"Loading audio file: {temp_audio_path}")
-        audio = AudioSegment.from_wav(temp_audio_path)
-        print(f"Audio duration: {len(audio)} ms ({len(audio)/1000} seconds)")
-        print(f"Audio frame rate: {audio.frame_rate} Hz")
-        print(f"Audio channels: {audio.channels}")
-        
-        # Convert to mono if stereo (speech recognition works better with mono)
-        if audio.channels > 1:
-            print("Converting stereo to mono for better recognition")
-            audio = audio.set_channels(1)
-        
-        # Set sample rate to 16kHz if different (optimal for Google Speech Recognition)
-        if audio.frame_rate != 16000:
-            print(f"Resampling from {audio.frame_rate}Hz to 16000Hz")
-            audio = audio.set_frame_rate(16000)
-        
+    profile = profile or get_profile()
+    normalized_audio = audio
+
+    if profile.normalize and gain_db is not None:
+        print(f"Applying file-wide gain of {gain_db:.2f} dB")
+        normalized_audio = audio.apply_gain(gain_db)
+    elif profile.normalize:
         # Normalize audio (increase volume if too quiet)
         # Normalize to -20dBFS which is a good level for speech recognition
         print(f"Original audio dBFS: {audio.dBFS}")
         normalized_audio = audio.normalize()
         print(f"Normalized audio dBFS: {normalized_audio.dBFS}")
-        
+
         # Apply additional processing to improve recognition
         # Increase volume if too quiet (but don't over-amplify)
         if normalized_audio.dBFS < -30:
             print("Audio is very quiet, applying gain")
             normalized_audio = normalized_audio + 10  # Add 10dB gain
             print(f"After gain audio dBFS: {normalized_audio.dBFS}")
-        
+
+    if cancellation:
+        cancellation.check()
+
+    if profile.high_pass:
         # Apply high-pass filter to remove low-frequency noise (below 80Hz)
         # This helps remove background rumble and improves speech clarity
         print("Applying high-pass filter to remove low-frequency noise")
         normalized_audio = normalized_audio.high_pass_filter(80)
-        
+
+    if cancellation:
+        cancellation.check()
+
+    if profile.compress:
         # Apply compression to even out volume levels
         # This helps with inconsistent volume in speech
         print("Applying compression to even out volume levels")
         normalized_audio = normalized_audio.compress_dynamic_range(threshold=-20.0, ratio=4.0, attack=5.0, release=50.0)
-        
-        # Export normalized audio
-        normalized_audio_path = os.path.join(temp_dir, 'audio_normalized.wav')
-        normalized_audio.export(normalized_audio_path, format="wav")
-        
-        # Use optimal chunk size for speech recognition
-        # 10-12 seconds is optimal - long enough for context, short enough for accuracy
-        chunk_length_ms = 12000  # 12 seconds - optimal for Google Speech Recognition
-        # Use overlapping chunks (50% overlap) for better accuracy at boundaries
-        overlap_ms = chunk_length_ms // 2  # 50% overlap
-        chunks = []
-        chunk_starts = []
-        for i in range(0, len(normalized_audio), chunk_length_ms - overlap_ms):
-            chunk = normalized_audio[i:i+chunk_length_ms]
-            if len(chunk) > 1000:  # Only process chunks longer than 1 second
-                chunks.append(chunk)
-                chunk_starts.append(i)
-        print(f"Split audio into {len(chunks)} overlapping chunks of ~{chunk_length_ms/1000} seconds each")
-        
-        # Log audio properties
-        print(f"Audio max possible amplitude: {normalized_audio.max_possible_amplitude}")
-        print(f"Audio max amplitude: {normalized_audio.max}")
-        print(f"Audio dBFS: {normalized_audio.dBFS}")
-        
-        # Recognize speech in chunks
-        recognizer = sr.Recognizer()
-        # Optimize recognizer settings for better accuracy
+
+    return normalized_audio
+
+
+def split_into_chunks(audio, first_start_ms=0, stop_ms=None, profile=None):
+    """
+    Split audio into (possibly overlapping) chunks.
+
+    Chunks start every `profile.chunk_step_ms` from `first_start_ms` up to (not
+    including) `stop_ms`. Returns the chunks and their start offsets within
+    `audio` in ms.
+    """
+    profile = profile or get_profile()
+    if stop_ms is None:
+        stop_ms = len(audio)
+    chunks = []
+    chunk_starts = []
+    for i in range(first_start_ms, stop_ms, profile.chunk_step_ms):
+        chunk = audio[i:i+profile.chunk_length_ms]
+        if len(chunk) > profile.min_chunk_ms:  # Only process chunks longer than the minimum
+            chunks.append(chunk)
+            chunk_starts.append(i)
+    print(f"Split audio into {len(chunks)} chunks of ~{profile.chunk_length_ms/1000} seconds each "
+          f"({profile.overlap_ms/1000} seconds overlap)")
+    return chunks, chunk_starts
+
+
+def calibrated_energy_threshold(noise_profile, gain_db=0.0):
+    """
+    Derive the recognizer energy threshold from a file's noise profile.
+
+    Returns None when the profile is empty (the recognizer default is kept).
+    """
+    threshold = noise_profile.energy_threshold(
+        percentile=getattr(settings, 'SUBTITLE_NOISE_FLOOR_PERCENTILE', 15.0),
+        ratio=getattr(settings, 'SUBTITLE_ENERGY_THRESHOLD_RATIO', 1.5),
+        gain_db=gain_db,
+    )
+    if threshold is not None:
+        print(f"Calibrated energy threshold from {noise_profile.frame_count} frames: {threshold:.1f}")
+    return threshold
+
+
+def profile_audio(audio):
+    """Build a noise profile for a whole AudioSegment and return its energy threshold."""
+    noise_profile = NoiseProfile(sample_rate=audio.frame_rate)
+    for samples in iter_audio_segment_windows(audio):
+        noise_profile.add(samples)
+    return calibrated_energy_threshold(noise_profile)
+
+
+def create_recognizer(energy_threshold=None):
+    """
+    Create a speech recognizer tuned for chunked recognition.
+
+    `energy_threshold` is calibrated once per file from its noise profile, so
+    chunks no longer spend their first second on ambient noise adjustment.
+    """
+    recognizer = sr.Recognizer()
+    # Optimize recognizer settings for better accuracy
+    if energy_threshold is not None:
+        recognizer.energy_threshold = energy_threshold
+        recognizer.dynamic_energy_threshold = False
+    else:
         recognizer.energy_threshold = 400  # Balanced threshold
         recognizer.dynamic_energy_threshold = True
-        recognizer.pause_threshold = 1.0  # Optimal pause detection
-        recognizer.phrase_threshold = 0.3  # Lower threshold for phrase detection
-        recognizer.non_speaking_duration = 0.8  # Shorter non-speaking duration
-        
-        subtitles = pysrt.SubRipFile()
-        successful_chunks = 0
-        failed_chunks = 0
-        
-        for i, chunk in enumerate(chunks):
-            # Save chunk to temporary file
-            chunk_file = os.path.join(temp_dir, f'chunk_{i}.wav')
-            # Export with optimal settings for speech recognition
-            # Mono, 16kHz, 16-bit PCM
-            chunk.export(
-                chunk_file, 
-                format="wav",
-                parameters=["-ac", "1", "-ar", "16000", "-sample_fmt", "s16"]
-            )
-            
-            chunk_start_time = chunk_starts[i] / 1000.0  # in seconds
-            chunk_end_time = chunk_start_time + (len(chunk) / 1000)
-            print(f"Processing chunk {i+1}/{len(chunks)} (time: {chunk_start_time:.2f}s - {chunk_end_time:.2f}s, duration: {len(chunk)/1000:.2f}s)")
-            
-            # Recognize speech with retry logic
-            max_retries = 2
-            text = None
-            
-            for retry in range(max_retries):
-                try:
-                    with sr.AudioFile(chunk_file) as source:
-                        # Adjust for ambient noise in this chunk (longer duration for better accuracy)
-                        recognizer.adjust_for_ambient_noise(source, duration=1.0)
-                        # Record with better settings
-                        audio_data = recognizer.record(source)
-                
-                    # Try Google Speech Recognition with optimized settings
-                    # Use English language
-                    try:
-                        text = recognizer.recognize_google(
-                            audio_data, 
-                            language="en-US",  # English (US)
-                            show_all=False
-                        )
-                        
-                        if text and len(text.strip()) >= 3:
-                            print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s): SUCCESS - Recognized text: '{text}'")
-                            break  # Success, exit retry loop
-                        else:
-                            if retry < max_retries - 1:
-                                print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s) retry {retry+1}: Got empty/short text, retrying...")
-                                continue
-                            else:
-                                print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s): NOT DETECTED - Text too short or empty after {max_retries} attempts")
-                                failed_chunks += 1
-                                text = None
-                                break  # Exit retry loop
-                            
-                    except sr.UnknownValueError:
-                        if retry < max_retries - 1:
-                            print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s) retry {retry+1}: Could not understand, retrying...")
-                            continue
-                        else:
-                            print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s): NOT DETECTED - Could not understand audio after {max_retries} attempts (no speech detected or unclear)")
-                            failed_chunks += 1
-                            text = None
-                            break  # Exit retry loop
-                    except sr.RequestError as e:
-                        if retry < max_retries - 1:
-                            print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s) retry {retry+1}: Service error, retrying...")
-                            time.sleep(1)  # Wait before retry
-                            continue
-                        else:
-                            print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s): ERROR - Google Speech Recognition service error: {str(e)}")
-                            failed_chunks += 1
-                            text = None
-                            break  # Exit retry loop
-                    except Exception as e:
-                        if retry < max_retries - 1:
-                            print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s) retry {retry+1}: Error, retrying...")
-                            continue
-                        else:
-                            print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s): ERROR - Unexpected error during recognition: {str(e)}")
-                            failed_chunks += 1
-                            text = None
-                            break  # Exit retry loop
-                    
-                except Exception as e:
+    recognizer.pause_threshold = 1.0  # Optimal pause detection
+    recognizer.phrase_threshold = 0.3  # Lower threshold for phrase detection
+    recognizer.non_speaking_duration = 0.8  # Shorter non-speaking duration
+    # Bound each recognition HTTP call so a hung request cannot stall the job
+    recognizer.operation_timeout = getattr(settings, 'SUBTITLE_RECOGNIZER_TIMEOUT', 30) or None
+    return recognizer
+
+
+def recognize_fake(recognizer, audio_data):
+    """
+    Offline stand-in for the recognition service (SUBTITLE_RECOGNIZER_BACKEND=fake).
+
+    Describes the audio instead of transcribing it, so runs are deterministic and
+    need no network; audio below the energy threshold counts as no speech.
+    """
+    samples = np.frombuffer(audio_data.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2), dtype=np.int16)
+    if not len(samples):
+        raise sr.UnknownValueError()
+    rms = math.sqrt(float(np.mean(samples.astype(np.float64) ** 2)))
+    if rms < recognizer.energy_threshold:
+        raise sr.UnknownValueError()
+    return f"speech for {len(samples) / SAMPLE_RATE:.1f} seconds at {20 * math.log10(rms / 32768.0):.0f} dBFS"
+
+
+def recognize_audio(recognizer, audio_data, language='en-US'):
+    """Recognize recorded audio with the configured backend ('google' or 'fake')."""
+    if getattr(settings, 'SUBTITLE_RECOGNIZER_BACKEND', 'google') == 'fake':
+        return recognize_fake(recognizer, audio_data)
+    return recognizer.recognize_google(audio_data, language=language, show_all=False)
+
+
+def recognize_chunk(recognizer, chunk_file, label, max_retries=2, language='en-US'):
+    """
+    Recognize speech in a chunk WAV file with retry logic.
+
+    Returns (text, attempts): the recognized text, or None when nothing usable
+    was recognized, and the number of recognition attempts made.
+    """
+    text = None
+    attempts = 0
+
+    for retry in range(max_retries):
+        attempts = retry + 1
+        try:
+            with sr.AudioFile(chunk_file) as source:
+                # Record the whole chunk; the energy threshold was calibrated once per file
+                audio_data = recognizer.record(source)
+
+            # Try Google Speech Recognition with optimized settings
+            # in the upload's language (BCP-47 tag, en-US by default)
+            try:
+                text = recognize_audio(recognizer, audio_data, language)
+
+                if text and len(text.strip()) >= 3:
+                    print(f"{label}: SUCCESS - Recognized text: '{text}'")
+                    break  # Success, exit retry loop
+                else:
                     if retry < max_retries - 1:
-                        print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s) retry {retry+1}: Processing error, retrying...")
+                        print(f"{label} retry {retry+1}: Got empty/short text, retrying...")
                         continue
                     else:
-                        print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s): ERROR - Error processing chunk: {str(e)}")
-                        failed_chunks += 1
+                        print(f"{label}: NOT DETECTED - Text too short or empty after {max_retries} attempts")
                         text = None
-                        break  # Exit retry loop on final failure
-            
-            # After retry loop, check if we got text and add it to subtitles
-            if text and len(text.strip()) >= 3:
-                # Calculate timing based on actual chunk start
-                start_time = chunk_start_time
-                end_time = min(chunk_start_time + (len(chunk) / 1000), len(normalized_audio) / 1000)
-                
-                subtitle = pysrt.SubRipItem(
-                    index=len(subtitles) + 1,
-                    start=pysrt.SubRipTime(seconds=start_time),
-                    end=pysrt.SubRipTime(seconds=end_time),
-                    text=text
-                )
-                subtitles.append(subtitle)
-                successful_chunks += 1
-                print(f"Chunk {i+1} (time {start_time:.2f}s - {end_time:.2f}s): ADDED TO SUBTITLES - '{text}'")
-            elif text is None:
-                # Text is None means it failed
-                print(f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s): NOT ADDED - No text recognized")
-            
-            # Clean up the chunk file
+                        break  # Exit retry loop
+
+            except sr.UnknownValueError:
+                if retry < max_retries - 1:
+                    print(f"{label} retry {retry+1}: Could not understand, retrying...")
+                    continue
+                else:
+                    print(f"{label}: NOT DETECTED - Could not understand audio after {max_retries} attempts (no speech detected or unclear)")
+                    text = None
+                    break  # Exit retry loop
+            except sr.RequestError as e:
+                if retry < max_retries - 1:
+                    print(f"{label} retry {retry+1}: Service error, retrying...")
+                    time.sleep(1)  # Wait before retry
+                    continue
+                else:
+                    print(f"{label}: ERROR - Google Speech Recognition service error: {str(e)}")
+                    text = None
+                    break  # Exit retry loop
+            except Exception as e:
+                if retry < max_retries - 1:
+                    print(f"{label} retry {retry+1}: Error, retrying...")
+                    continue
+                else:
+                    print(f"{label}: ERROR - Unexpected error during recognition: {str(e)}")
+                    text = None
+                    break  # Exit retry loop
+
+        except Exception as e:
+            if retry < max_retries - 1:
+                print(f"{label} retry {retry+1}: Processing error, retrying...")
+                continue
+            else:
+                print(f"{label}: ERROR - Error processing chunk: {str(e)}")
+                text = None
+                break  # Exit retry loop on final failure
+
+    return text, attempts
+
+
+def transcribe_chunks(chunk_items, temp_dir, offset_seconds=0.0, audio_end_seconds=None, file_prefix='chunk', total_chunks=None, energy_threshold=None, cancellation=None, language='en-US', profile=None):
+    """
+    Recognize every chunk and return the subtitle cues.
+
+    `chunk_items` is an iterable (possibly a lazy generator) of
+    (start_ms, AudioSegment) pairs, where start_ms is the offset within the
+    audio the chunks were cut from; `offset_seconds` is where that audio starts
+    in the original media, so cue times are always relative to the original
+    video. Returns a dict with the cues as (start, end, text) tuples and the
+    success/failure counts. `cancellation` is checked before every chunk.
+
+    Up to `profile.recognizer_concurrency` chunks are recognized at once; only
+    that many chunks are held in memory, and cues keep the chunk order.
+    """
+    profile = profile or get_profile()
+    concurrency = max(profile.recognizer_concurrency, 1)
+    cues = []
+    counts = {'successful_chunks': 0, 'failed_chunks': 0, 'total_chunks': 0, 'recognizer_calls': 0}
+
+    def recognize(i, chunk_start_ms, chunk):
+        # Save chunk to temporary file
+        chunk_file = os.path.join(temp_dir, f'{file_prefix}_{i}.wav')
+        # Export with optimal settings for speech recognition
+        # Mono, 16kHz, 16-bit PCM
+        chunk.export(
+            chunk_file,
+            format="wav",
+            parameters=["-ac", "1", "-ar", "16000", "-sample_fmt", "s16"]
+        )
+
+        chunk_start_time = offset_seconds + chunk_start_ms / 1000.0  # in seconds
+        chunk_end_time = chunk_start_time + (len(chunk) / 1000)
+        print(f"Processing chunk {i+1}/{total_chunks or '?'} (time: {chunk_start_time:.2f}s - {chunk_end_time:.2f}s, duration: {len(chunk)/1000:.2f}s)")
+        label = f"Chunk {i+1} (time {chunk_start_time:.2f}s - {chunk_end_time:.2f}s)"
+
+        # Recognize speech with retry logic (recognizers are not shared between threads)
+        recognizer = create_recognizer(energy_threshold)
+        text, calls = recognize_chunk(recognizer, chunk_file, label, max_retries=profile.max_retries, language=language)
+
+        # Clean up the chunk file
+        try:
+            os.remove(chunk_file)
+        except:
+            pass
+        return i, chunk_start_time, chunk_end_time, label, text, calls
+
+    def collect(outcome):
+        i, start_time, end_time, label, text, calls = outcome
+        counts['total_chunks'] += 1
+        counts['recognizer_calls'] += calls
+        # After retry loop, check if we got text and add it to subtitles
+        if text and len(text.strip()) >= 3:
+            # Calculate timing based on actual chunk start
+            if audio_end_seconds is not None:
+                end_time = min(end_time, audio_end_seconds)
+
+            cues.append((start_time, end_time, text))
+            counts['successful_chunks'] += 1
+            print(f"Chunk {i+1} (time {start_time:.2f}s - {end_time:.2f}s): ADDED TO SUBTITLES - '{text}'")
+        else:
+            # Text is None means it failed
+            counts['failed_chunks'] += 1
+            print(f"{label}: NOT ADDED - No text recognized")
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='recognizer') as executor:
+        in_flight = deque()
+        for i, (chunk_start_ms, chunk) in enumerate(chunk_items):
+            if cancellation:
+                cancellation.check()
+            in_flight.append(executor.submit(recognize, i, chunk_start_ms, chunk))
+            del chunk
+            while len(in_flight) >= concurrency:
+                collect(in_flight.popleft().result())
+        while in_flight:
+            collect(in_flight.popleft().result())
+
+    counts['cues'] = cues
+    return counts
+
+
+def plan_shards(duration, shard_seconds, guard_seconds, profile=None, range_start=0.0, range_end=None):
+    """
+    Split [range_start, range_end) (default [0, duration)) into shards aligned
+    to the chunk grid.
+
+    Each shard owns the chunks starting in [start, end). The audio it decodes
+    is widened by a leading guard band (filter warm-up) and a trailing band of
+    one chunk plus the guard, so every owned chunk is complete; nothing past
+    the range end is decoded. Because shard boundaries are multiples of the
+    chunk step from the range start, every chunk start belongs to exactly one
+    shard and no cue is produced twice.
+    """
+    profile = profile or get_profile()
+    if range_end is None:
+        range_end = duration
+    step_seconds = profile.chunk_step_ms / 1000.0
+    shard_seconds = max(int(shard_seconds // step_seconds), 1) * step_seconds
+    shards = []
+    start = range_start
+    while start < range_end:
+        end = min(start + shard_seconds, range_end)
+        decode_start = max(start - guard_seconds, 0.0)
+        decode_end = min(end + profile.chunk_length_ms / 1000.0 + guard_seconds, range_end)
+        shards.append({
+            'index': len(shards),
+            'start': start,
+            'end': end,
+            'decode_start': decode_start,
+            'decode_end': decode_end,
+        })
+        start = end
+    return shards
+
+
+def process_shard(source_path, shard, media_duration, scratch_dir, cancellation=None, language='en-US', profile=None, gain_db=None, energy_threshold=None):
+    """
+    Decode, preprocess and recognize one shard of a long video.
+
+    Runs in a worker process, so it only receives plain values and never
+    touches the database; `cancellation` is a marker-file check. `gain_db`
+    and `energy_threshold` are measured once for the whole file, so every
+    shard is leveled and gated the same way.
+    """
+    shard_dir = tempfile.mkdtemp(prefix=f"shard-{shard['index']}-", dir=scratch_dir)
+    try:
+        if cancellation:
+            cancellation.check()
+        print(f"Shard {shard['index']}: decoding {shard['decode_start']:.2f}s - {shard['decode_end']:.2f}s "
+              f"(owns {shard['start']:.2f}s - {shard['end']:.2f}s)")
+        shard_audio_path = os.path.join(shard_dir, 'audio.wav')
+        extract_audio_segment(
+            source_path,
+            shard_audio_path,
+            start=shard['decode_start'],
+            duration=shard['decode_end'] - shard['decode_start'],
+            timeout=ffmpeg_timeout(),
+        )
+        audio = preprocess_audio(load_audio(shard_audio_path), profile, gain_db, cancellation)
+        os.remove(shard_audio_path)
+        if cancellation:
+            cancellation.check()
+
+        # Only cut the chunks this shard owns; the guard bands just provide context
+        first_start_ms = int(round((shard['start'] - shard['decode_start']) * 1000))
+        stop_ms = int(round((shard['end'] - shard['decode_start']) * 1000))
+        chunks, chunk_starts = split_into_chunks(audio, first_start_ms=first_start_ms, stop_ms=stop_ms, profile=profile)
+        del audio
+
+        result = transcribe_chunks(
+            zip(chunk_starts, chunks),
+            shard_dir,
+            offset_seconds=shard['decode_start'],
+            audio_end_seconds=media_duration,
+            file_prefix=f"shard_{shard['index']}_chunk",
+            total_chunks=len(chunks),
+            energy_threshold=energy_threshold,
+            cancellation=cancellation,
+            language=language,
+            profile=profile,
+        )
+        result['index'] = shard['index']
+        return result
+    finally:
+        for file in os.listdir(shard_dir):
             try:
-                os.remove(chunk_file)
+                os.remove(os.path.join(shard_dir, file))
             except:
                 pass
-        
-        print(f"Recognition complete: {successful_chunks} successful, {failed_chunks} failed chunks")
-        print(f"Total segments processed: {len(chunks)}")
-        print(f"Success rate: {(successful_chunks/len(chunks)*100):.1f}%")
-        
-        # Clean up normalized audio
         try:
-            os.remove(normalized_audio_path)
+            os.rmdir(shard_dir)
         except:
             pass
-        
-        # Save the subtitles to a file
-        srt_content = '\n'.join([str(sub) for sub in subtitles])
-        
+
+
+def merge_shard_results(shard_results):
+    """
+    Merge per-shard cues into one ordered list.
+
+    Cues are sorted by start time and duplicates at shard boundaries (same
+    start time, or the same text repeated back to back) are dropped.
+    """
+    cues = []
+    totals = {'successful_chunks': 0, 'failed_chunks': 0, 'total_chunks': 0, 'recognizer_calls': 0}
+    for result in sorted(shard_results, key=lambda r: r['index']):
+        cues.extend(result['cues'])
+        for key in totals:
+            totals[key] += result[key]
+
+    cues.sort(key=lambda cue: (cue[0], cue[1]))
+    merged = []
+    for cue in cues:
+        if merged:
+            previous = merged[-1]
+            same_start = abs(cue[0] - previous[0]) < 0.001
+            repeated_text = cue[2].strip().lower() == previous[2].strip().lower() and cue[0] < previous[1]
+            if same_start or repeated_text:
+                print(f"Dropping duplicate cue at {cue[0]:.2f}s: '{cue[2]}'")
+                continue
+        merged.append(cue)
+
+    totals['cues'] = merged
+    return totals
+
+
+def terminate_shard_workers(executor):
+    """
+    Cancel the queued shards of a pool and terminate its worker processes.
+
+    Python 3.14+ has ProcessPoolExecutor.terminate_workers(). Before that the
+    workers are only reachable through the private `_processes` dict, which
+    CPython 3.9-3.13 keeps as {pid: Process} until shutdown() clears it, so it
+    is read first; if it is missing, running shards still stop at their next
+    cancellation check.
+    """
+    terminate = getattr(executor, 'terminate_workers', None)
+    if terminate is not None:
+        terminate()
+        return
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        try:
+            process.terminate()
+        except Exception:
+            pass
+
+
+def transcribe_sharded(video_path, media_duration, temp_dir, cancellation=None, language='en-US', profile=None, start=0.0, end=None):
+    """Process a long video (or its [start, end) range) as parallel time-range shards and merge the results."""
+    shard_seconds = getattr(settings, 'SUBTITLE_SHARD_SECONDS', 300)
+    guard_seconds = getattr(settings, 'SUBTITLE_SHARD_GUARD_SECONDS', 2)
+    max_workers = getattr(settings, 'SUBTITLE_SHARD_WORKERS', None) or os.cpu_count() or 1
+    profile = profile or get_profile()
+    end = end if end is not None else media_duration
+    shards = plan_shards(media_duration, shard_seconds, guard_seconds, profile, start, end)
+    max_workers = min(max_workers, len(shards))
+    print(f"Processing {start:.2f}s - {end:.2f}s of media as {len(shards)} shards with {max_workers} worker processes")
+
+    # Measure levels and noise once over the whole range, like the streaming mode
+    levels = analyze_levels(
+        video_path,
+        start=start,
+        duration=end - start,
+        idle_timeout=ffmpeg_timeout(),
+        on_window=cancellation.check if cancellation else None,
+    )
+    gain_db = normalization_gain_db(levels) if profile.normalize else 0.0
+    energy_threshold = calibrated_energy_threshold(levels['noise_profile'], gain_db=gain_db)
+    print(f"Original audio dBFS: {levels['dbfs']}, peak: {levels['peak']}, applying {gain_db:.2f} dB gain to every shard")
+
+    shard_cancellation = cancellation.shard_check() if cancellation else None
+    poll_interval = cancellation.interval if cancellation else None
+
+    # Spawn (not fork) so workers don't inherit the dispatcher threads and DB connections;
+    # spawned workers import the app modules, so they set Django up first
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    ) as executor:
+        futures = [
+            executor.submit(
+                process_shard, video_path, shard, end, temp_dir, shard_cancellation, language, profile,
+                gain_db, energy_threshold,
+            )
+            for shard in shards
+        ]
+        try:
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=poll_interval, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    future.result()
+                if cancellation:
+                    # Writes the marker that running shards stop at
+                    cancellation.check()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            # Don't let shutdown wait for shards that may be hung
+            terminate_shard_workers(executor)
+            raise
+        shard_results = [future.result() for future in futures]
+
+    return merge_shard_results(shard_results)
+
+
+def transcribe_whole_file(video_path, temp_dir, audio_only=False, cancellation=None, language='en-US', on_audio_preprocessed=None, profile=None, start=0.0, end=None):
+    """
+    Process the whole video, or its [start, end) range, in this process (used for short inputs).
+
+    `on_audio_preprocessed(flac_path, duration, energy_threshold)` receives the
+    preprocessed audio as FLAC before recognition starts (audio cache).
+    """
+    temp_audio_path = os.path.join(temp_dir, 'audio.wav')
+
+    # ffmpeg decodes only the audio stream (audio uploads have no video stage at all) and
+    # seeks to the range start before decoding; the timeout kills a hung decode
+    print(f"{'Converting audio upload' if audio_only else 'Extracting audio from video'}: {video_path}")
+    extract_audio_segment(
+        video_path,
+        temp_audio_path,
+        start=start,
+        duration=end - start if end is not None else None,
+        timeout=ffmpeg_timeout(),
+    )
+
+    if cancellation:
+        cancellation.check()
+
+    # Process audio in chunks for better recognition; loading and each preprocessing
+    # step can take minutes on long audio, so the job beats between them
+    audio = load_audio(temp_audio_path)
+    if cancellation:
+        cancellation.check()
+    normalized_audio = preprocess_audio(audio, profile, cancellation=cancellation)
+    del audio
+    if cancellation:
+        cancellation.check()
+
+    chunks, chunk_starts = split_into_chunks(normalized_audio, profile=profile)
+    energy_threshold = profile_audio(normalized_audio)
+
+    # Keep the preprocessed audio so the job can be re-run without decoding again
+    normalized_audio_path = os.path.join(temp_dir, 'audio_normalized.flac')
+    if on_audio_preprocessed:
+        normalized_audio.export(normalized_audio_path, format="flac")
+        on_audio_preprocessed(normalized_audio_path, len(normalized_audio) / 1000, energy_threshold)
+
+    # Log audio properties
+    print(f"Audio max possible amplitude: {normalized_audio.max_possible_amplitude}")
+    print(f"Audio max amplitude: {normalized_audio.max}")
+    print(f"Audio dBFS: {normalized_audio.dBFS}")
+
+    # Recognize speech in chunks (cue times are relative to the original media)
+    result = transcribe_chunks(
+        zip(chunk_starts, chunks),
+        temp_dir,
+        offset_seconds=start,
+        audio_end_seconds=start + len(normalized_audio) / 1000,
+        total_chunks=len(chunks),
+        energy_threshold=energy_threshold,
+        cancellation=cancellation,
+        language=language,
+        profile=profile,
+    )
+
+    # Clean up extracted and normalized audio
+    for path in (temp_audio_path, normalized_audio_path):
+        try:
+            os.remove(path)
+        except:
+            pass
+
+    return result
+
+
+def transcribe_streaming(video_path, temp_dir, media_duration=None, cancellation=None, language='en-US', on_audio_preprocessed=None, profile=None, start=0.0, end=None):
+    """
+    Process a very long video (or its [start, end) range) with constant memory.
+
+    A first streaming pass measures the levels needed for normalization; the
+    second pass decodes PCM in windows, preprocesses it with filter state
+    carried across windows and feeds chunks to recognition lazily. With
+    `on_audio_preprocessed` (audio cache), the second pass is encoded to FLAC
+    first and recognition then streams from that file.
+    """
+    profile = profile or get_profile()
+    end = end if end is not None else media_duration
+    range_duration = end - start if end is not None else None
+    print(f"Streaming audio from {video_path} (memory-bounded mode)")
+    levels = analyze_levels(
+        video_path,
+        start=start,
+        duration=range_duration,
+        idle_timeout=ffmpeg_timeout(),
+        on_window=cancellation.check if cancellation else None,
+    )
+    gain_db = normalization_gain_db(levels) if profile.normalize else 0.0
+    print(f"Original audio dBFS: {levels['dbfs']}, peak: {levels['peak']}, applying {gain_db:.2f} dB gain")
+    if cancellation:
+        cancellation.check()
+
+    # The profile was measured before gain, so shift it by the gain applied in the second pass
+    energy_threshold = calibrated_energy_threshold(levels['noise_profile'], gain_db=gain_db)
+
+    windows = iter_preprocessed_windows(
+        video_path,
+        gain_db,
+        high_pass_cutoff=80 if profile.high_pass else None,
+        start=start,
+        duration=range_duration,
+        idle_timeout=ffmpeg_timeout(),
+        compress=profile.compress,
+    )
+    if on_audio_preprocessed:
+        flac_path = os.path.join(temp_dir, 'audio_preprocessed.flac')
+        encode_flac(windows, flac_path, cancellation)
+        on_audio_preprocessed(flac_path, levels['samples'] / SAMPLE_RATE, energy_threshold)
+        result = transcribe_preprocessed_audio(
+            flac_path, temp_dir, range_duration, energy_threshold, cancellation, language, profile
+        )
+        # The FLAC starts at the range start, so shift cues back to media time
+        if start:
+            result['cues'] = [(cue_start + start, cue_end + start, text) for cue_start, cue_end, text in result['cues']]
+        os.remove(flac_path)
+        return result
+
+    chunk_items = iter_chunks(windows, profile.chunk_length_ms, profile.chunk_step_ms, profile.min_chunk_ms)
+    return transcribe_chunks(
+        chunk_items,
+        temp_dir,
+        offset_seconds=start,
+        audio_end_seconds=end,
+        total_chunks=estimated_chunk_count(range_duration, profile),
+        energy_threshold=energy_threshold,
+        cancellation=cancellation,
+        language=language,
+        profile=profile,
+    )
+
+
+def estimated_chunk_count(duration, profile=None):
+    """Return the number of chunks audio of `duration` seconds is cut into (None if unknown)."""
+    if not duration:
+        return None
+    profile = profile or get_profile()
+    return int(math.ceil(duration * 1000 / profile.chunk_step_ms))
+
+
+def encode_flac(windows, flac_path, cancellation=None):
+    """Write a stream of int16 windows to a FLAC file."""
+    encoder = FlacEncoder(flac_path, timeout=ffmpeg_timeout())
+    try:
+        for window in windows:
+            if cancellation:
+                cancellation.check()
+            encoder.write(window)
+    except BaseException:
+        encoder.abort()
+        raise
+    return encoder.close()
+
+
+def transcribe_preprocessed_audio(audio_path, temp_dir, duration=None, energy_threshold=None, cancellation=None, language='en-US', profile=None, start=0.0, end=None):
+    """
+    Recognize already preprocessed audio (a cached FLAC artifact), skipping
+    extraction, preprocessing and calibration. Streams with constant memory;
+    with a [start, end) range, ffmpeg seeks to it and decodes nothing else.
+    """
+    profile = profile or get_profile()
+    end = end if end is not None else duration
+    range_duration = end - start if end is not None else None
+    print(f"Transcribing preprocessed audio: {audio_path}")
+    windows = iter_pcm_windows(audio_path, start=start, duration=range_duration, idle_timeout=ffmpeg_timeout())
+    chunk_items = iter_chunks(windows, profile.chunk_length_ms, profile.chunk_step_ms, profile.min_chunk_ms)
+    return transcribe_chunks(
+        chunk_items,
+        temp_dir,
+        offset_seconds=start,
+        audio_end_seconds=end,
+        total_chunks=estimated_chunk_count(range_duration, profile),
+        energy_threshold=energy_threshold,
+        cancellation=cancellation,
+        language=language,
+        profile=profile,
+    )
+
+
+def build_srt(cues):
+    """Return the SubRipFile and SRT text for (start, end, text) cues."""
+    subtitles = pysrt.SubRipFile()
+    for start_time, end_time, text in cues:
+        subtitles.append(pysrt.SubRipItem(
+            index=len(subtitles) + 1,
+            start=pysrt.SubRipTime(seconds=start_time),
+            end=pysrt.SubRipTime(seconds=end_time),
+            text=text
+        ))
+    return subtitles, '\n'.join([str(sub) for sub in subtitles])
+
+
+def remove_temp_dir(temp_dir):
+    """Remove a job's scratch directory, including shard subdirectories."""
+    try:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    except Exception as cleanup_error:
+        print(f"Error during cleanup: {str(cleanup_error)}")
+
+
+def should_stream(media_duration):
+    """Return True when a video is long enough to use the memory-bounded streaming pipeline."""
+    threshold = getattr(settings, 'SUBTITLE_STREAMING_THRESHOLD_SECONDS', 1800)
+    return bool(media_duration) and threshold > 0 and media_duration > threshold
+
+
+def should_shard(media_duration):
+    """Return True when a video is long enough to be split across worker processes."""
+    threshold = getattr(settings, 'SUBTITLE_SHARD_THRESHOLD_SECONDS', 600)
+    workers = getattr(settings, 'SUBTITLE_SHARD_WORKERS', None) or os.cpu_count() or 1
+    return bool(media_duration) and threshold > 0 and workers > 1 and media_duration > threshold
+
+
+def generate_subtitles(video_upload):
+    """
+    Generate SRT subtitles from an uploaded video file.
+
+    This function extracts audio from the video, converts speech to text,
+    and creates SRT subtitle file. Long videos are split into time-range
+    shards that are processed in parallel worker processes; very long videos
+    that are not sharded are streamed with constant memory. When the job's
+    preprocessed audio is cached (an earlier run), recognition starts from it
+    and the source is not touched. Uploads with a time range only decode and
+    recognize that range. A cancelled job stops at its next check and
+    is marked `cancelled`.
+
+    Args:
+        video_upload: VideoUpload model instance
+    """
+    try:
+        print(f"Starting subtitle generation for video: {video_upload.video_file.name}")
+
+        profile = get_profile(video_upload.profile)
+        stats = JobStats(profile)
+        print(f"Using processing profile '{profile.name}'")
+
+        artifact = find_artifact(video_upload, preprocessing=profile.preprocessing_key)
+        if artifact is None and not file_exists(video_upload.video_file):
+            raise Exception(f"Video file not found: {video_upload.video_file.name}")
+
+        temp_dir = tempfile.mkdtemp(prefix=f'subtitle-job-{video_upload.id}-', dir=scratch_root())
+        # Checked between stages and chunks: cancel requests, heartbeats and the job deadline
+        cancellation = JobMonitor(video_upload, temp_dir)
+
+        # Workers process a local copy, so media may live in object storage
+        with stats.stage('staging'):
+            if artifact is not None:
+                print(f"Using cached preprocessed audio of upload {artifact.upload_id}")
+                touch_artifact(artifact)
+                video_path, staged = stage_to_scratch(artifact.audio_file, temp_dir)
+            else:
+                video_path, staged = stage_to_scratch(video_upload.video_file, temp_dir)
+        cancellation.check()
+
+        # Record the profile used (the claim already set the status; only these fields, so a
+        # cancel request made meanwhile is kept)
+        video_upload.profile = profile.name
+        video_upload.save(update_fields=['profile', 'updated_at'])
+
+        media_duration = video_upload.media_duration
+        if media_duration is None:
+            media_duration = artifact.duration if artifact is not None else probe_media_duration(video_path)
+
+        # Only the requested time range is decoded and recognized; cue times stay relative to the media
+        start, end = video_upload.time_range(media_duration)
+        if end is not None and start >= end:
+            raise Exception(f"The requested range starts at {start:.2f}s, past the end of the media ({end:.2f}s).")
+        range_duration = end - start if end is not None else None
+        if video_upload.is_partial():
+            print(f"Processing the range {start:.2f}s - {end if end is not None else '?'}s")
+
+        def release_source():
+            # Only once the job has completed: until then a retry or requeue needs the source
+            if video_upload.discard_source:
+                print(f"Discarding source file {video_upload.video_file.name}")
+                video_upload.discard_source_file()
+
+        def cache_audio(flac_path, duration, energy_threshold):
+            store_artifact(video_upload, flac_path, duration, energy_threshold, profile.preprocessing_key)
+
+        # Only whole-file audio is cached; a range run can still seek into a cached artifact
+        on_audio_preprocessed = cache_audio if cache_enabled() and not video_upload.is_partial() else None
+        language = video_upload.language
+
+        with stats.stage('transcription'):
+            if artifact is not None:
+                result = transcribe_preprocessed_audio(
+                    video_path, temp_dir, artifact.duration, artifact.energy_threshold, cancellation, language, profile,
+                    start=start, end=end,
+                )
+            elif should_shard(range_duration):
+                # Shards preprocess their own ranges, so there is no whole-file artifact to cache
+                result = transcribe_sharded(
+                    video_path, media_duration, temp_dir, cancellation, language, profile, start=start, end=end
+                )
+            elif should_stream(range_duration):
+                result = transcribe_streaming(
+                    video_path, temp_dir, media_duration, cancellation, language, on_audio_preprocessed, profile,
+                    start=start, end=end,
+                )
+            else:
+                result = transcribe_whole_file(
+                    video_path,
+                    temp_dir,
+                    audio_only=video_upload.is_audio_only(),
+                    cancellation=cancellation,
+                    language=language,
+                    on_audio_preprocessed=on_audio_preprocessed,
+                    profile=profile,
+                    start=start,
+                    end=end,
+                )
+        cancellation.check()
+
+        cues = result['cues']
+        successful_chunks = result['successful_chunks']
+        failed_chunks = result['failed_chunks']
+        total_chunks = result['total_chunks']
+
+        print(f"Recognition complete: {successful_chunks} successful, {failed_chunks} failed chunks")
+        print(f"Total segments processed: {total_chunks}")
+        if total_chunks:
+            print(f"Success rate: {(successful_chunks/total_chunks*100):.1f}%")
+
+        subtitles, srt_content = build_srt(cues)
+
         # Check if we have any subtitles
         if not srt_content or len(srt_content.strip()) == 0:
             print("WARNING: No subtitles were generated - srt_content is empty!")
-            print(f"Total chunks processed: {len(chunks)}, Successful: {successful_chunks}, Failed: {failed_chunks}")
-            
+            print(f"Total chunks processed: {total_chunks}, Successful: {successful_chunks}, Failed: {failed_chunks}")
+
             # Don't create a subtitle file with error message
             # Instead, mark as failed with detailed error message
-            if failed_chunks == len(chunks):
+            if failed_chunks == total_chunks:
                 error_msg = (
                     "No speech detected in video. Please check: "
                     "Video has audio track, Audio is clear and audible, "
@@ -306,72 +898,85 @@ def generate_subtitles(video_upload):
                 )
             else:
                 error_msg = "Partial recognition failed. Some audio chunks could not be processed."
-            
-            # Set status to failed instead of creating fake subtitle file
-            video_upload.status = 'failed'
-            video_upload.error_message = error_msg
-            video_upload.save()
+
+            # The job is marked failed by the error handler below instead of creating a fake subtitle file
             raise Exception(error_msg)
-        
+
         print(f"Generated subtitle content length: {len(srt_content)} characters")
         print(f"Number of subtitle entries: {len(subtitles)}")
-        
+
         # Create a temporary SRT file
         temp_srt_path = os.path.join(temp_dir, 'subtitles.srt')
         with open(temp_srt_path, 'w', encoding='utf-8') as srt_file:
             srt_file.write(srt_content)
-        
+
         # Verify the file was written correctly
         if os.path.getsize(temp_srt_path) == 0:
             raise Exception("Failed to write subtitle file - file is empty after writing")
-        
-        # Save the SRT file to the model
+
+        # Save the SRT file to the model (a regenerated job replaces its previous file)
+        previous_subtitle = video_upload.subtitle_file.name if video_upload.subtitle_file else None
         with open(temp_srt_path, 'rb') as srt_file:
             # Get the original video filename without extension
             video_filename = os.path.basename(video_upload.video_file.name)
             base_filename = os.path.splitext(video_filename)[0]
-            
-            # Save the subtitle file
+
+            # Save the subtitle file (recorded on the upload together with the completed status)
             subtitle_filename = f"{base_filename}.srt"
-            video_upload.subtitle_file.save(subtitle_filename, ContentFile(srt_file.read()))
-        
-        # Update the model status
-        video_upload.status = 'completed'
-        video_upload.save()
-        
+            video_upload.subtitle_file.save(subtitle_filename, ContentFile(srt_file.read()), save=False)
+        subtitle_name = video_upload.subtitle_file.name
+
+        # Index the cues for transcript search
+        with stats.stage('indexing'):
+            index_transcript(video_upload, cues)
+
+        # Update the model status and record what the run cost
+        processing_stats = stats.as_dict(result, range_duration, from_cache=artifact is not None)
+        print(f"Processing stats: {processing_stats}")
+        completed = finish_attempt(
+            video_upload, status='completed', subtitle_file=subtitle_name, processing_stats=processing_stats
+        )
+        if not completed:
+            video_upload.subtitle_file.storage.delete(subtitle_name)
+            raise JobLost(f"Upload {video_upload.id} is no longer assigned to this worker.")
+
+        if previous_subtitle and not video_upload.is_file_shared('subtitle_file', previous_subtitle):
+            video_upload.subtitle_file.storage.delete(previous_subtitle)
+        release_source()
+
         # Clean up temporary files
-        os.remove(temp_audio_path)
         os.remove(temp_srt_path)
+        if staged:
+            os.remove(video_path)
         os.rmdir(temp_dir)
-        
+
+    except JobLost as e:
+        # The reaper requeued or failed this job; its new state belongs to someone else
+        print(f"Stopping subtitle generation for video {video_upload.id}: {str(e)}")
+        if 'temp_dir' in locals() and os.path.exists(temp_dir):
+            remove_temp_dir(temp_dir)
+
+    except JobCancelled:
+        print(f"Subtitle generation for video {video_upload.id} was cancelled")
+        finish_attempt(video_upload, status='cancelled', error_message=None)
+        if 'temp_dir' in locals() and os.path.exists(temp_dir):
+            remove_temp_dir(temp_dir)
+
     except Exception as e:
         # Handle errors
         import traceback
         error_traceback = traceback.format_exc()
         error_message = str(e)
-        
+
         print(f"ERROR in generate_subtitles:")
         print(f"Error message: {error_message}")
         print(f"Traceback:\n{error_traceback}")
-        
-        video_upload.status = 'failed'
-        video_upload.error_message = error_message
-        video_upload.save()
-        
+
+        finish_attempt(video_upload, status='failed', error_message=error_message)
+
         # Clean up any temporary files that might have been created
         if 'temp_dir' in locals() and os.path.exists(temp_dir):
-            try:
-                for file in os.listdir(temp_dir):
-                    try:
-                        os.remove(os.path.join(temp_dir, file))
-                    except:
-                        pass
-                try:
-                    os.rmdir(temp_dir)
-                except:
-                    pass
-            except Exception as cleanup_error:
-                print(f"Error during cleanup: {str(cleanup_error)}")
-        
+            remove_temp_dir(temp_dir)
+
         # Re-raise the exception for handling at the view level
-        raise
\ No newline at end of file
+        raise
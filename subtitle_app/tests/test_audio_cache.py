@@ -0,0 +1,146 @@
+"""
+The preprocessed audio cache: LRU eviction that spares artifacts of queued or
+running jobs, sweeping of unreferenced cache files, and the conditional
+requeue of the regenerate endpoint.
+"""
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from subtitle_app import views
+from subtitle_app.audio_cache import enforce_budget, find_artifact
+from subtitle_app.models import AudioArtifact, VideoUpload
+from subtitle_app.profiles import get_profile
+from subtitle_app.retention import SweepReport, sweep_unreferenced_files
+
+
+class MediaMixin:
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = User.objects.create_user('owner', password='secret')
+
+    def artifact(self, status='completed', age=0, size=100, **fields):
+        """An upload in `status` with a cached artifact last used `age` hours ago."""
+        upload = VideoUpload.objects.create(user=self.user, video_file='videos/talk.mp4', status=status, **fields)
+        artifact = AudioArtifact(
+            upload=upload, size=size, preprocessing=get_profile(upload.profile).preprocessing_key, last_used_at=timezone.now() - timedelta(hours=age),
+        )
+        artifact.audio_file.save('audio.flac', ContentFile(b'f' * size), save=False)
+        artifact.save()
+        return artifact
+
+    def age_file(self, name, hours):
+        path = default_storage.path(name)
+        then = time.time() - hours * 3600
+        os.utime(path, (then, then))
+
+
+class EvictionTests(MediaMixin, TestCase):
+    def test_least_recently_used_artifacts_are_evicted_first(self):
+        oldest = self.artifact(age=30)
+        older = self.artifact(age=20)
+        recent = self.artifact(age=1)
+
+        self.assertEqual(enforce_budget(max_bytes=150), 2)
+
+        self.assertEqual(list(AudioArtifact.objects.all()), [recent])
+        for evicted in (oldest, older):
+            self.assertFalse(default_storage.exists(evicted.audio_file.name))
+        self.assertTrue(default_storage.exists(recent.audio_file.name))
+
+    def test_artifacts_of_queued_or_running_jobs_are_kept(self):
+        queued = self.artifact(status='pending', age=40)
+        running = self.artifact(status='processing', age=30)
+        shared = self.artifact(age=20)
+        # A running job deduplicated from `shared` reads its artifact
+        VideoUpload.objects.create(
+            user=self.user, video_file='videos/talk.mp4', status='processing', deduplicated_from=shared.upload,
+        )
+        idle = self.artifact(age=10)
+
+        self.assertEqual(enforce_budget(max_bytes=0), 1)
+        self.assertCountEqual(AudioArtifact.objects.all(), [queued, running, shared])
+        self.assertFalse(AudioArtifact.objects.filter(pk=idle.pk).exists())
+
+    def test_nothing_is_evicted_within_the_budget(self):
+        self.artifact(age=10)
+        self.assertEqual(enforce_budget(max_bytes=100), 0)
+        self.assertEqual(AudioArtifact.objects.count(), 1)
+
+
+class UnreferencedFileSweepTests(MediaMixin, TestCase):
+    def test_only_old_unreferenced_cache_files_are_deleted(self):
+        artifact = self.artifact()
+        self.age_file(artifact.audio_file.name, 48)
+        # Left behind by a store_artifact that failed after saving the file
+        orphan = default_storage.save('audio_cache/orphan.flac', ContentFile(b'o' * 50))
+        self.age_file(orphan, 48)
+        # May belong to an artifact that is being saved right now
+        fresh = default_storage.save('audio_cache/fresh.flac', ContentFile(b'n' * 50))
+
+        report = SweepReport()
+        sweep_unreferenced_files(report, min_age_hours=24, pause=0, log=lambda message: None)
+
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(fresh))
+        self.assertTrue(default_storage.exists(artifact.audio_file.name))
+        self.assertEqual((report.orphaned_files, report.bytes_reclaimed), (1, 50))
+
+
+@override_settings(SUBTITLE_INLINE_WORKERS=False, SUBTITLE_AUDIO_CACHE_MAX_BYTES=10 ** 9)
+class RegenerateTests(MediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def regenerate(self, upload, **data):
+        return self.client.post(f'/api/upload/{upload.pk}/regenerate/', data, format='json')
+
+    def test_finished_upload_is_requeued_from_its_artifact(self):
+        upload = self.artifact(status='failed', attempts=2, error_message='Recognition failed').upload
+        response = self.regenerate(upload, language='fr-FR')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.json()['from_cache'])
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.attempts, upload.language), ('pending', 0, 'fr-FR'))
+        self.assertIsNone(upload.error_message)
+
+    def test_unfinished_upload_is_refused(self):
+        for status in ('pending', 'processing'):
+            with self.subTest(status=status):
+                upload = self.artifact(status=status, attempts=1).upload
+                self.assertEqual(self.regenerate(upload).status_code, 409)
+                upload.refresh_from_db()
+                self.assertEqual((upload.status, upload.attempts), (status, 1))
+
+    def test_upload_claimed_during_the_request_is_not_reset(self):
+        upload = self.artifact(status='completed', attempts=1).upload
+
+        def claimed_meanwhile(*args, **kwargs):
+            # Another request requeued it and a worker claimed it after this request read the status
+            VideoUpload.objects.filter(pk=upload.pk).update(status='processing', attempts=2)
+            return find_artifact(*args, **kwargs)
+
+        with mock.patch.object(views, 'find_artifact', side_effect=claimed_meanwhile):
+            response = self.regenerate(upload, language='fr-FR')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('processing', response.json()['error'])
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.attempts, upload.language), ('processing', 2, 'en-US'))
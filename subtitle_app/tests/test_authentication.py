@@ -0,0 +1,65 @@
+"""
+Cached token authentication: a deleted token or a deactivated user is
+rejected on the next request, even when this process still holds a warm
+in-process entry for the token.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from subtitle_app.authentication import local_token_cache, revocation_key
+from subtitle_app.models import VideoUpload
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_token_cache.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(local_token_cache.clear)
+
+        self.user = User.objects.create_user('owner', password='secret')
+        self.token = Token.objects.create(user=self.user)
+        self.upload = VideoUpload.objects.create(user=self.user, video_file='videos/talk.mp4')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def request_statuses(self):
+        """Status codes of a DRF view and of an async view, both authenticated by the token."""
+        return (
+            self.client.get('/api/webhook/').status_code,
+            self.client.get(f'/api/upload/{self.upload.pk}/?fields=transcript_text').status_code,
+        )
+
+    def warm(self):
+        self.assertEqual(self.request_statuses(), (200, 200))
+        self.assertIsNotNone(local_token_cache.get(self.token.key))
+
+    def test_deleted_token_is_rejected_at_once(self):
+        self.warm()
+        self.token.delete()
+        self.assertEqual(self.request_statuses(), (401, 401))
+
+    def test_logout_rejects_the_token_at_once(self):
+        self.warm()
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.assertEqual(self.request_statuses(), (401, 401))
+
+    def test_deactivated_user_is_rejected_at_once(self):
+        self.warm()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.request_statuses(), (401, 401))
+
+    def test_revocation_from_another_process_beats_a_warm_entry(self):
+        self.warm()
+        # Another process deleted the token: the marker is shared, this process's LRU is not
+        user = local_token_cache.get(self.token.key)
+        Token.objects.filter(pk=self.token.pk).delete()
+        local_token_cache.set(self.token.key, user)
+        self.assertTrue(cache.get(revocation_key(self.token.key)))
+
+        self.assertEqual(self.request_statuses(), (401, 401))
+        self.assertIsNone(local_token_cache.get(self.token.key))
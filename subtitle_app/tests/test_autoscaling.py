@@ -0,0 +1,81 @@
+"""
+The supervisor's scaling policy: scale up for aged jobs in one step, wait out
+the cooldown before adding more, hold back on a saturated host, and retire
+one worker per idle period.
+"""
+from django.test import SimpleTestCase
+
+from subtitle_app.autoscaling import AutoscalePolicy
+
+IDLE_HOST = {'cpu_load': 0.2, 'available_memory_mb': 8192}
+
+
+def queue(pending, oldest_age=0.0):
+    return {'pending': pending, 'oldest_age': oldest_age}
+
+
+class AutoscalePolicyTests(SimpleTestCase):
+    def policy(self, **options):
+        defaults = dict(
+            min_workers=1, max_workers=8, worker_concurrency=2, scale_up_age=30.0, scale_up_cooldown=60.0,
+            scale_down_delay=120.0, max_cpu_load=0.9, min_free_memory_mb=1024,
+        )
+        return AutoscalePolicy(**{**defaults, **options})
+
+    def test_aged_backlog_is_covered_in_one_step(self):
+        policy = self.policy()
+        self.assertEqual(policy.desired_workers(1, queue(5, oldest_age=10), IDLE_HOST, now=0)[0], 1)
+        self.assertEqual(policy.desired_workers(1, queue(5, oldest_age=40), IDLE_HOST, now=10)[0], 4)
+        # Never beyond the maximum
+        self.assertEqual(self.policy().desired_workers(1, queue(50, oldest_age=40), IDLE_HOST, now=0)[0], 8)
+
+    def test_no_workers_start_at_once(self):
+        policy = self.policy(min_workers=0)
+        self.assertEqual(policy.desired_workers(0, queue(1), IDLE_HOST, now=0)[0], 1)
+
+    def test_cooldown_holds_further_scale_up(self):
+        policy = self.policy()
+        self.assertEqual(policy.desired_workers(1, queue(4, oldest_age=40), IDLE_HOST, now=0)[0], 3)
+
+        # The new workers have not claimed the jobs yet, so they still look pending
+        desired, reason = policy.desired_workers(3, queue(4, oldest_age=70), IDLE_HOST, now=30)
+        self.assertEqual(desired, 3)
+        self.assertIn('still starting', reason)
+
+        self.assertEqual(policy.desired_workers(3, queue(4, oldest_age=100), IDLE_HOST, now=60)[0], 5)
+
+    def test_saturated_host_holds_scale_up(self):
+        for host, expected in (
+            ({'cpu_load': 0.95, 'available_memory_mb': 8192}, 'CPU load 0.95'),
+            ({'cpu_load': 0.2, 'available_memory_mb': 512}, '512 MB memory'),
+        ):
+            with self.subTest(host=host):
+                desired, reason = self.policy().desired_workers(2, queue(6, oldest_age=40), host, now=0)
+                self.assertEqual(desired, 2)
+                self.assertIn(expected, reason)
+
+        # Missing host metrics (non-Linux) do not block scaling
+        unknown = {'cpu_load': None, 'available_memory_mb': None}
+        self.assertEqual(self.policy().desired_workers(2, queue(6, oldest_age=40), unknown, now=0)[0], 5)
+
+    def test_saturated_host_still_gets_the_minimum(self):
+        busy = {'cpu_load': 2.0, 'available_memory_mb': 100}
+        self.assertEqual(self.policy(min_workers=2).desired_workers(0, queue(3), busy, now=0)[0], 2)
+
+    def test_workers_are_retired_one_per_idle_period(self):
+        policy = self.policy()
+        self.assertEqual(policy.desired_workers(4, queue(0), IDLE_HOST, now=0), (4, None))
+        self.assertEqual(policy.desired_workers(4, queue(0), IDLE_HOST, now=119)[0], 4)
+        self.assertEqual(policy.desired_workers(4, queue(0), IDLE_HOST, now=120)[0], 3)
+        # The delay restarts after each retirement
+        self.assertEqual(policy.desired_workers(3, queue(0), IDLE_HOST, now=180)[0], 3)
+        self.assertEqual(policy.desired_workers(3, queue(0), IDLE_HOST, now=240)[0], 2)
+        self.assertEqual(policy.desired_workers(2, queue(0), IDLE_HOST, now=360)[0], 1)
+        self.assertEqual(policy.desired_workers(1, queue(0), IDLE_HOST, now=1000)[0], 1)
+
+    def test_new_jobs_reset_the_idle_period(self):
+        policy = self.policy()
+        policy.desired_workers(4, queue(0), IDLE_HOST, now=0)
+        policy.desired_workers(4, queue(1, oldest_age=5), IDLE_HOST, now=100)
+        self.assertEqual(policy.desired_workers(4, queue(0), IDLE_HOST, now=150)[0], 4)
+        self.assertEqual(policy.desired_workers(4, queue(0), IDLE_HOST, now=270)[0], 3)
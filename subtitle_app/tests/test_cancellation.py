@@ -0,0 +1,139 @@
+"""
+Cancelling uploads: pending jobs at once, running jobs through the database
+flag and the marker file their chunk loop checks, finished jobs not at all.
+"""
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from pydub import AudioSegment
+from rest_framework.test import APIClient
+
+from subtitle_app import subtitle_generator
+from subtitle_app.cancellation import JobCancellation, JobCancelled, MarkerCancellation, request_cancellation
+from subtitle_app.dispatcher import claim_next_job
+from subtitle_app.models import VideoUpload
+from subtitle_app.profiles import get_profile
+from subtitle_app.subtitle_generator import generate_subtitles, transcribe_chunks
+
+
+@override_settings(SUBTITLE_INLINE_WORKERS=False)
+class CancelUploadTests(TestCase):
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.scratch_dir, ignore_errors=True)
+        self.user = User.objects.create_user('owner', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, **fields):
+        return VideoUpload.objects.create(user=self.user, video_file='videos/talk.mp4', **fields)
+
+    def test_pending_job_is_cancelled_at_once(self):
+        upload = self.upload()
+        response = self.client.post(f'/api/upload/{upload.pk}/cancel/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'cancelled')
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'cancelled')
+        self.assertIsNotNone(upload.cancel_requested_at)
+        self.assertIsNone(claim_next_job('fifo'))
+
+    def test_processing_job_is_flagged_and_its_worker_stops(self):
+        upload = self.upload(status='processing', attempts=1)
+        check = JobCancellation(upload.pk, self.scratch_dir, interval=0)
+        check.check()
+
+        response = self.client.post(f'/api/upload/{upload.pk}/cancel/')
+        self.assertEqual(response.status_code, 202)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'processing')
+        self.assertIsNotNone(upload.cancel_requested_at)
+
+        # The worker sees the flag at its next check and mirrors it for its shard processes
+        with self.assertRaises(JobCancelled):
+            check.check()
+        self.assertTrue(os.path.exists(check.marker_path))
+        with self.assertRaises(JobCancelled):
+            check.shard_check().check()
+
+    def test_finished_jobs_cannot_be_cancelled(self):
+        for status in ('completed', 'failed', 'cancelled'):
+            with self.subTest(status=status):
+                upload = self.upload(status=status)
+                response = self.client.post(f'/api/upload/{upload.pk}/cancel/')
+                self.assertEqual(response.status_code, 409)
+                self.assertIn(status, response.json()['error'])
+                upload.refresh_from_db()
+                self.assertEqual(upload.status, status)
+                self.assertIsNone(upload.cancel_requested_at)
+
+    def test_other_users_cannot_cancel(self):
+        upload = VideoUpload.objects.create(user=User.objects.create_user('other'), video_file='videos/talk.mp4')
+        self.assertEqual(self.client.post(f'/api/upload/{upload.pk}/cancel/').status_code, 404)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'pending')
+
+    def test_flagged_job_ends_cancelled(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root, SUBTITLE_SCRATCH_DIR=self.scratch_dir, SUBTITLE_AUDIO_CACHE_MAX_BYTES=0):
+            upload = VideoUpload(user=self.user, media_duration=1.0)
+            upload.video_file.save('clip.wav', ContentFile(b'RIFF'), save=False)
+            upload.save()
+            job = claim_next_job('fifo')
+            request_cancellation(job)
+
+            generate_subtitles(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'cancelled')
+        self.assertIsNone(job.error_message)
+
+
+class ChunkLoopCancellationTests(TransactionTestCase):
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.scratch_dir, ignore_errors=True)
+        self.chunks = [(i * 12000, AudioSegment.silent(12000, frame_rate=16000)) for i in range(4)]
+
+    def run_chunks(self, cancellation, cancel):
+        """Recognize the chunks, cancelling while the first one is being recognized."""
+        recognized = []
+
+        def recognize_chunk(recognizer, chunk_file, label, max_retries, language):
+            if not recognized:
+                cancel()
+            recognized.append(label)
+            return 'some words', 1
+
+        with mock.patch.object(AudioSegment, 'export'), \
+                mock.patch.object(subtitle_generator, 'recognize_chunk', side_effect=recognize_chunk):
+            with self.assertRaises(JobCancelled):
+                transcribe_chunks(
+                    iter(self.chunks), self.scratch_dir, cancellation=cancellation, profile=get_profile('accurate'),
+                )
+        return recognized
+
+    def test_marker_file_stops_the_chunk_loop(self):
+        marker_path = os.path.join(self.scratch_dir, 'CANCELLED')
+
+        def write_marker():
+            with open(marker_path, 'w') as marker:
+                marker.write('cancelled\n')
+
+        self.assertEqual(len(self.run_chunks(MarkerCancellation(marker_path), write_marker)), 1)
+
+    def test_database_flag_stops_the_chunk_loop(self):
+        upload = VideoUpload.objects.create(
+            user=User.objects.create_user('owner'), video_file='videos/talk.mp4', status='processing', attempts=1,
+        )
+        cancellation = JobCancellation(upload.pk, self.scratch_dir, interval=0)
+        recognized = self.run_chunks(cancellation, lambda: request_cancellation(upload))
+        self.assertEqual(len(recognized), 1)
+        self.assertTrue(os.path.exists(cancellation.marker_path))
@@ -0,0 +1,115 @@
+"""
+Pre-upload deduplication: a checksum only matches the user's own completed
+upload with the same language, profile and time range, duplicates share the
+original's files and transcript, and upload sessions bind the announced file
+to the user.
+"""
+import hashlib
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from subtitle_app.dedup import find_processed_upload
+from subtitle_app.models import VideoUpload
+from subtitle_app.profiles import default_profile_name
+from subtitle_app.search import index_transcript
+
+CONTENT = b'the same video bytes'
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+SIZE = len(CONTENT)
+
+
+@override_settings(SUBTITLE_INLINE_WORKERS=False)
+class DeduplicationTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.user = User.objects.create_user('owner', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def processed(self, user=None, **fields):
+        """A completed upload of CONTENT with its subtitles in storage."""
+        fields.setdefault('profile', default_profile_name())
+        fields.setdefault('status', 'completed')
+        upload = VideoUpload(
+            user=user or self.user, video_file='videos/talk.mp4', content_sha256=SHA256, content_size=SIZE, **fields,
+        )
+        upload.subtitle_file.save('talk.srt', ContentFile("1\n00:00:00,000 --> 00:00:02,000\nHello\n\n"), save=False)
+        upload.save()
+        return upload
+
+    def check(self, **data):
+        return self.client.post('/api/upload/check/', {'sha256': SHA256, 'size': SIZE, **data}, format='json')
+
+    def test_own_processed_upload_is_shared(self):
+        original = self.processed()
+        index_transcript(original, [(0.0, 2.0, 'Hello')])
+
+        response = self.check()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['duplicate'])
+        duplicate = VideoUpload.objects.get(pk=response.json()['upload']['id'])
+        self.assertEqual(duplicate.deduplicated_from, original)
+        self.assertEqual((duplicate.status, duplicate.subtitle_file.name), ('completed', original.subtitle_file.name))
+        self.assertEqual([segment.text for segment in duplicate.segments.all()], ['Hello'])
+
+    def test_other_users_uploads_are_never_matched(self):
+        stranger = User.objects.create_user('stranger')
+        self.processed(user=stranger)
+
+        self.assertIsNone(find_processed_upload(self.user, SHA256, SIZE))
+        response = self.check()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['duplicate'])
+        self.assertIn('upload_session', response.json())
+        self.assertFalse(VideoUpload.objects.filter(user=self.user).exists())
+
+    def test_different_settings_or_content_do_not_match(self):
+        self.processed(language='fr-FR')
+        self.processed(profile='fast' if default_profile_name() != 'fast' else 'accurate')
+        self.processed(range_start=10.0, range_end=20.0)
+        self.processed(status='failed')
+
+        self.assertIsNone(find_processed_upload(self.user, SHA256, SIZE))
+        self.assertIsNone(find_processed_upload(self.user, SHA256, SIZE + 1, language='fr-FR'))
+        self.assertIsNone(find_processed_upload(self.user, SHA256, SIZE, range_start=10.0))
+        self.assertIsNotNone(find_processed_upload(self.user, SHA256, SIZE, range_start=10.0, range_end=20.0))
+
+    def test_missing_subtitle_file_is_not_matched(self):
+        original = self.processed()
+        original.subtitle_file.storage.delete(original.subtitle_file.name)
+        self.assertIsNone(find_processed_upload(self.user, SHA256, SIZE))
+
+    def test_upload_session_binds_the_file_to_the_user(self):
+        session = self.check().json()['upload_session']
+
+        def upload(client, content):
+            return client.post('/api/upload/', {
+                'video_file': SimpleUploadedFile('talk.mp4', content, content_type='video/mp4'),
+                'upload_session': session,
+            }, format='multipart')
+
+        response = upload(self.client, b'different bytes')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('does not match', response.json()['upload_session'][0])
+
+        stranger = APIClient()
+        stranger.force_authenticate(User.objects.create_user('stranger'))
+        response = upload(stranger, CONTENT)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('another user', response.json()['upload_session'][0])
+
+        self.assertEqual(upload(self.client, CONTENT).status_code, 202)
+        self.assertEqual(VideoUpload.objects.get().content_sha256, SHA256)
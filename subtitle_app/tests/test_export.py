@@ -0,0 +1,100 @@
+"""
+The streamed ZIP export: the archive opens with zipfile, holds one entry per
+requested upload and format, and never includes other users' uploads.
+"""
+import io
+import shutil
+import tempfile
+import zipfile
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from subtitle_app.models import VideoUpload
+
+SRT = (
+    "1\n00:00:00,000 --> 00:00:04,500\nHello there\n\n"
+    "2\n00:00:05,000 --> 00:00:09,000\nGeneral Kenobi\nyou are a bold one\n\n"
+)
+
+
+async def read_streamed(response):
+    return b''.join([chunk async for chunk in response])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.user = User.objects.create_user('owner', password='secret')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def completed(self, name, user=None, srt=SRT):
+        upload = VideoUpload(user=user or self.user, video_file=f'videos/{name}.mp4', status='completed')
+        upload.subtitle_file.save(f'{name}.srt', ContentFile(srt), save=False)
+        upload.save()
+        return upload
+
+    def export(self, query):
+        response = self.client.get('/api/export/' + query)
+        if response.status_code != 200:
+            return response, None
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return response, zipfile.ZipFile(io.BytesIO(async_to_sync(read_streamed)(response)))
+
+    def test_archive_has_one_entry_per_upload_and_format(self):
+        first = self.completed('first')
+        second = self.completed('second')
+        self.completed('not-requested')
+        others = self.completed('private', user=User.objects.create_user('other'))
+
+        ids = f'{first.pk},{second.pk},{others.pk}'
+        response, archive = self.export(f'?ids={ids}&formats=srt,vtt,txt')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(archive.testzip())
+        self.assertCountEqual(archive.namelist(), [
+            f'{upload.pk}-{name}.{fmt}'
+            for upload, name in ((first, 'first'), (second, 'second'))
+            for fmt in ('srt', 'vtt', 'txt')
+        ])
+        self.assertEqual(archive.read(f'{first.pk}-first.srt').decode(), SRT)
+        self.assertEqual(archive.read(f'{first.pk}-first.vtt').decode(), (
+            "WEBVTT\n\n"
+            "00:00:00.000 --> 00:00:04.500\nHello there\n\n"
+            "00:00:05.000 --> 00:00:09.000\nGeneral Kenobi\nyou are a bold one\n\n"
+        ))
+        self.assertEqual(archive.read(f'{first.pk}-first.txt').decode(), (
+            "[00:00:00 - 00:00:04] Hello there\n\n"
+            "[00:00:05 - 00:00:09] General Kenobi you are a bold one\n\n"
+        ))
+
+    def test_only_other_users_uploads_is_not_found(self):
+        others = self.completed('private', user=User.objects.create_user('other'))
+        response, _ = self.export(f'?ids={others.pk}')
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_subtitle_files_are_listed_as_skipped(self):
+        kept = self.completed('kept')
+        lost = self.completed('lost')
+        lost.subtitle_file.storage.delete(lost.subtitle_file.name)
+
+        _, archive = self.export(f'?ids={kept.pk},{lost.pk}')
+        self.assertCountEqual(archive.namelist(), [f'{kept.pk}-kept.srt', 'skipped.txt'])
+        self.assertIn(f'{lost.pk}\tlost.mp4', archive.read('skipped.txt').decode())
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.export('?formats=srt')[0].status_code, 400)
+        self.assertEqual(self.export('?ids=1,x')[0].status_code, 400)
+        self.assertEqual(self.export('?ids=1&formats=srt,docx')[0].status_code, 400)
+        self.client.credentials()
+        self.assertEqual(self.export('?ids=1')[0].status_code, 401)
@@ -0,0 +1,136 @@
+"""
+The live transcription WebSocket end to end: a recorded file is streamed to
+live_application the way stream_live_audio sends it, recognized with the
+offline fake backend and saved as an upload.
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import wave
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from subtitle_app.live import live_application
+from subtitle_app.management.commands.stream_live_audio import Command as StreamCommand
+from subtitle_app.models import VideoUpload
+from subtitle_app.storage import read_text
+from subtitle_app.streaming import SAMPLE_RATE
+
+# Three 1.5s bursts separated by pauses, like three short sentences
+BURSTS = [(0.5, 2.0), (3.0, 4.5), (5.5, 7.0)]
+RECORDING_SECONDS = 8.0
+
+
+def write_recording(path):
+    rng = np.random.default_rng(0)
+    samples = rng.normal(0, 30, int(RECORDING_SECONDS * SAMPLE_RATE))
+    for start, end in BURSTS:
+        t = np.arange(int((end - start) * SAMPLE_RATE)) / SAMPLE_RATE
+        offset = int(start * SAMPLE_RATE)
+        samples[offset:offset + len(t)] += 8000 * np.sin(2 * np.pi * 220 * t)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(samples.astype('<i2').tobytes())
+
+
+class LiveClient:
+    """Feeds ASGI messages to live_application and collects what it sends."""
+
+    def __init__(self, query_string):
+        self.scope = {'type': 'websocket', 'path': '/ws/live/', 'query_string': query_string.encode(), 'headers': []}
+        self.incoming = asyncio.Queue()
+        self.sent = []
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    def messages(self):
+        return [json.loads(m['text']) for m in self.sent if m['type'] == 'websocket.send']
+
+    def close_code(self):
+        closes = [m for m in self.sent if m['type'] == 'websocket.close']
+        return closes[-1].get('code') if closes else None
+
+
+@override_settings(
+    SUBTITLE_RECOGNIZER_BACKEND='fake',
+    SUBTITLE_LIVE_MIN_SEGMENT_SECONDS=1.0,
+    SUBTITLE_LIVE_PAUSE_SECONDS=0.5,
+)
+class LiveTranscriptionTests(TransactionTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.scratch_dir = tempfile.mkdtemp()
+        media_settings = override_settings(MEDIA_ROOT=self.media_root, SUBTITLE_SCRATCH_DIR=self.scratch_dir)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.scratch_dir, ignore_errors=True)
+
+        self.user = User.objects.create_user('speaker', password='secret')
+        self.token = Token.objects.create(user=self.user)
+        self.recording = os.path.join(self.scratch_dir, 'recording.wav')
+        write_recording(self.recording)
+
+    async def test_streamed_recording_is_transcribed_and_saved(self):
+        client = LiveClient(f'token={self.token.key}&format=pcm&language=en-GB')
+        for data, _ in StreamCommand().iter_frames(self.recording, 'pcm'):
+            client.incoming.put_nowait({'type': 'websocket.receive', 'bytes': data})
+        client.incoming.put_nowait({'type': 'websocket.receive', 'text': json.dumps({'type': 'stop'})})
+
+        await asyncio.wait_for(live_application(client.scope, client.receive, client.send), timeout=60)
+
+        self.assertEqual(client.sent[0], {'type': 'websocket.accept'})
+        messages = client.messages()
+        self.assertEqual(messages[0]['type'], 'ready')
+        self.assertEqual(messages[0]['language'], 'en-GB')
+
+        cues = [m for m in messages if m['type'] == 'cue']
+        self.assertEqual(len(cues), len(BURSTS))
+        for cue, (start, end) in zip(cues, BURSTS):
+            # Each cue covers its burst, cut in the pause around it
+            self.assertLessEqual(cue['start'], start)
+            self.assertGreaterEqual(cue['end'], end)
+            self.assertTrue(cue['text'].startswith('speech for '))
+
+        completed = messages[-1]
+        self.assertEqual(completed['type'], 'completed')
+        self.assertEqual(completed['status'], 'completed')
+        self.assertEqual(completed['cues'], len(BURSTS))
+        self.assertAlmostEqual(completed['duration'], RECORDING_SECONDS, places=1)
+        self.assertEqual(client.close_code(), 1000)
+
+        video_upload = await VideoUpload.objects.aget(pk=completed['upload_id'])
+        self.assertEqual(video_upload.user_id, self.user.pk)
+        self.assertEqual(video_upload.language, 'en-GB')
+        self.assertTrue(video_upload.video_file.name.endswith('.flac'))
+        srt = read_text(video_upload.subtitle_file)
+        for cue in cues:
+            self.assertIn(cue['text'], srt)
+
+    async def test_invalid_language_is_rejected(self):
+        client = LiveClient(f'token={self.token.key}&language=en_US;drop')
+
+        await live_application(client.scope, client.receive, client.send)
+
+        self.assertEqual(client.messages()[0]['type'], 'error')
+        self.assertEqual(client.close_code(), 4400)
+        self.assertFalse(await VideoUpload.objects.aexists())
+
+    async def test_invalid_token_is_rejected(self):
+        client = LiveClient('token=not-a-token')
+
+        await live_application(client.scope, client.receive, client.send)
+
+        self.assertEqual(client.close_code(), 4401)
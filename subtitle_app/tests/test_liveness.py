@@ -0,0 +1,167 @@
+"""
+Heartbeats, deadlines and the reaper: stale jobs are requeued or failed only
+if nobody touched them meanwhile, and a worker that lost its job stops.
+"""
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from pydub.generators import Sine
+
+from subtitle_app import subtitle_generator
+from subtitle_app.dispatcher import claim_next_job
+from subtitle_app.liveness import JobDeadlineExceeded, JobLost, JobMonitor, finish_attempt, job_deadline, reap_stale_jobs
+from subtitle_app.models import VideoUpload
+from subtitle_app.profiles import get_profile
+from subtitle_app.subtitle_generator import generate_subtitles, preprocess_audio, transcribe_whole_file
+
+
+class ScratchMixin:
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.scratch_dir, ignore_errors=True)
+        self.user = User.objects.create_user('owner')
+
+    def processing(self, heartbeat_age=None, attempts=1, **fields):
+        """A claimed job whose last heartbeat was `heartbeat_age` seconds ago."""
+        now = timezone.now()
+        heartbeat_at = now - timedelta(seconds=heartbeat_age) if heartbeat_age is not None else None
+        return VideoUpload.objects.create(
+            user=self.user, video_file='videos/talk.mp4', status='processing', attempts=attempts,
+            started_at=now, heartbeat_at=heartbeat_at, deadline_at=now + timedelta(hours=1), **fields,
+        )
+
+
+@override_settings(SUBTITLE_HEARTBEAT_STALE_SECONDS=600, SUBTITLE_JOB_MAX_ATTEMPTS=2)
+class ReaperTests(ScratchMixin, TestCase):
+    def test_stale_jobs_are_requeued_then_failed(self):
+        stale = self.processing(heartbeat_age=900)
+        exhausted = self.processing(heartbeat_age=900, attempts=2)
+        cancelled = self.processing(heartbeat_age=900, cancel_requested_at=timezone.now())
+        fresh = self.processing(heartbeat_age=60)
+
+        self.assertEqual(reap_stale_jobs(log=lambda message: None), (1, 2))
+
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.heartbeat_at, stale.deadline_at), ('pending', None, None))
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, 'failed')
+        self.assertIn('after 2 attempts', exhausted.error_message)
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, 'cancelled')
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, 'processing')
+
+    def test_job_that_beats_after_the_read_is_left_alone(self):
+        first = self.processing(heartbeat_age=900)
+        second = self.processing(heartbeat_age=900)
+
+        def worker_beats(message):
+            # The second job's worker writes a heartbeat after the reaper read the stale jobs
+            VideoUpload.objects.filter(pk=second.pk).update(heartbeat_at=timezone.now())
+
+        self.assertEqual(reap_stale_jobs(log=worker_beats), (1, 0))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, 'pending')
+        self.assertEqual(second.status, 'processing')
+
+    def test_old_worker_stops_and_cannot_record_a_result(self):
+        job = self.processing(heartbeat_age=900)
+        monitor = JobMonitor(job, self.scratch_dir, heartbeat_interval=0)
+        reap_stale_jobs(log=lambda message: None)
+
+        with self.assertRaises(JobLost):
+            monitor.check()
+        claim_next_job('fifo')
+        self.assertFalse(finish_attempt(job, status='completed'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('processing', 2))
+
+    def test_heartbeat_keeps_the_job(self):
+        job = self.processing(heartbeat_age=900)
+        JobMonitor(job, self.scratch_dir, heartbeat_interval=0).check()
+        self.assertEqual(reap_stale_jobs(log=lambda message: None), (0, 0))
+
+
+@override_settings(SUBTITLE_JOB_DEADLINE_BASE_SECONDS=900, SUBTITLE_JOB_DEADLINE_PER_MEDIA_SECOND=2.0)
+class DeadlineTests(ScratchMixin, TestCase):
+    def test_deadline_scales_with_the_processed_duration(self):
+        now = timezone.now()
+        upload = VideoUpload(user=self.user, media_duration=3600)
+        self.assertEqual(job_deadline(upload, now), now + timedelta(seconds=900 + 7200))
+        upload.range_start, upload.range_end = 60, 660
+        self.assertEqual(job_deadline(upload, now), now + timedelta(seconds=900 + 1200))
+
+    def test_check_stops_a_job_past_its_deadline(self):
+        job = self.processing(heartbeat_age=0)
+        monitor = JobMonitor(job, self.scratch_dir, heartbeat_interval=0)
+        monitor.check()
+
+        monitor.deadline_at = timezone.now() - timedelta(seconds=1)
+        with self.assertRaises(JobDeadlineExceeded):
+            monitor.check()
+
+    def test_expired_job_is_failed(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root, SUBTITLE_SCRATCH_DIR=self.scratch_dir, SUBTITLE_AUDIO_CACHE_MAX_BYTES=0):
+            upload = VideoUpload(user=self.user, media_duration=1.0)
+            upload.video_file.save('clip.wav', ContentFile(b'RIFF'), save=False)
+            upload.save()
+            job = claim_next_job('fifo')
+            VideoUpload.objects.filter(pk=job.pk).update(deadline_at=timezone.now() - timedelta(seconds=1))
+            job.refresh_from_db()
+
+            with self.assertRaises(JobDeadlineExceeded):
+                generate_subtitles(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('deadline', job.error_message)
+
+
+class PipelineHeartbeatTests(ScratchMixin, TestCase):
+    def test_preprocessing_steps_are_checked(self):
+        calls = []
+
+        class Recorder:
+            def check(self):
+                calls.append('check')
+
+        audio = Sine(440).to_audio_segment(duration=200, volume=-20.0).set_frame_rate(16000)
+        with mock.patch.object(type(audio), 'compress_dynamic_range', autospec=True,
+                               side_effect=lambda segment, **kwargs: calls.append('compress') or segment):
+            preprocess_audio(audio, get_profile('accurate'), cancellation=Recorder())
+        # Before the high-pass filter and before compression
+        self.assertEqual(calls, ['check', 'check', 'compress'])
+
+    def test_reaped_job_stops_before_preprocessing(self):
+        job = self.processing(heartbeat_age=0)
+        monitor = JobMonitor(job, self.scratch_dir, heartbeat_interval=0)
+
+        def extract(source_path, output_path, start, duration, timeout):
+            Sine(440).to_audio_segment(duration=2000, volume=-20.0).set_frame_rate(16000).export(output_path, format='wav')
+
+        load_audio = subtitle_generator.load_audio
+
+        def load_then_reaped(path):
+            audio = load_audio(path)
+            # Loading took longer than the stale timeout and the reaper requeued the job
+            VideoUpload.objects.filter(pk=job.pk).update(status='pending')
+            return audio
+
+        with mock.patch.object(subtitle_generator, 'extract_audio_segment', side_effect=extract), \
+                mock.patch.object(subtitle_generator, 'load_audio', side_effect=load_then_reaped), \
+                mock.patch.object(subtitle_generator, 'preprocess_audio') as preprocess, \
+                mock.patch.object(subtitle_generator, 'transcribe_chunks') as transcribe:
+            with self.assertRaises(JobLost):
+                transcribe_whole_file('video.mp4', self.scratch_dir, cancellation=monitor)
+
+        preprocess.assert_not_called()
+        transcribe.assert_not_called()
@@ -0,0 +1,124 @@
+"""
+Retention sweeping: source files are discarded per status once their
+retention period has passed (files shared by deduplicated uploads stay in
+storage), and only old scratch directories of jobs that are not running are
+removed.
+"""
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from subtitle_app.models import VideoUpload
+from subtitle_app.retention import SweepReport, sweep_source_files, sweep_temp_dirs
+
+
+def quiet(message):
+    pass
+
+
+class SourceRetentionTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = User.objects.create_user('owner', password='secret')
+
+    def upload(self, status, age_days, name='talk.mp4', size=100):
+        upload = VideoUpload(user=self.user, status=status)
+        upload.video_file.save(name, ContentFile(b'v' * size), save=False)
+        upload.save()
+        # updated_at is auto_now, so age the row with an update
+        VideoUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now() - timedelta(days=age_days))
+        return upload
+
+    def test_sources_are_discarded_after_their_status_retention(self):
+        expired_completed = self.upload('completed', age_days=8)
+        recent_completed = self.upload('completed', age_days=2)
+        expired_failed = self.upload('failed', age_days=31)
+        recent_failed = self.upload('failed', age_days=8)
+        unlisted = self.upload('processing', age_days=90)
+
+        report = SweepReport()
+        sweep_source_files(report, {'completed': 7, 'failed': 30}, pause=0, log=quiet)
+
+        self.assertEqual((report.source_files, report.bytes_reclaimed), (2, 200))
+        for upload in (expired_completed, expired_failed):
+            upload.refresh_from_db()
+            self.assertIsNotNone(upload.source_discarded_at)
+            self.assertFalse(default_storage.exists(upload.video_file.name))
+        for upload in (recent_completed, recent_failed, unlisted):
+            upload.refresh_from_db()
+            self.assertIsNone(upload.source_discarded_at)
+            self.assertTrue(default_storage.exists(upload.video_file.name))
+
+    def test_shared_source_is_kept_in_storage(self):
+        original = self.upload('completed', age_days=8)
+        VideoUpload.objects.create(
+            user=self.user, video_file=original.video_file.name, status='completed', deduplicated_from=original,
+        )
+
+        report = SweepReport()
+        sweep_source_files(report, {'completed': 7}, pause=0, log=quiet)
+
+        original.refresh_from_db()
+        self.assertIsNotNone(original.source_discarded_at)
+        self.assertTrue(default_storage.exists(original.video_file.name))
+        self.assertEqual(report.bytes_reclaimed, 0)
+
+    def test_dry_run_changes_nothing(self):
+        upload = self.upload('completed', age_days=8)
+
+        report = SweepReport()
+        sweep_source_files(report, {'completed': 7}, pause=0, dry_run=True, log=quiet)
+
+        upload.refresh_from_db()
+        self.assertIsNone(upload.source_discarded_at)
+        self.assertTrue(default_storage.exists(upload.video_file.name))
+        self.assertEqual((report.source_files, report.bytes_reclaimed), (1, 100))
+
+
+class TempDirSweepTests(TestCase):
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.scratch_dir, ignore_errors=True)
+        scratch_settings = override_settings(SUBTITLE_SCRATCH_DIR=self.scratch_dir)
+        scratch_settings.enable()
+        self.addCleanup(scratch_settings.disable)
+        self.user = User.objects.create_user('owner', password='secret')
+
+    def job_dir(self, upload, age_hours):
+        path = tempfile.mkdtemp(prefix=f'subtitle-job-{upload.pk}-', dir=self.scratch_dir)
+        with open(os.path.join(path, 'chunk.wav'), 'wb') as chunk:
+            chunk.write(b'c' * 10)
+        then = time.time() - age_hours * 3600
+        os.utime(path, (then, then))
+        return path
+
+    def test_only_old_dirs_of_jobs_that_are_not_running_are_removed(self):
+        dead = VideoUpload.objects.create(user=self.user, video_file='videos/a.mp4', status='failed')
+        running = VideoUpload.objects.create(user=self.user, video_file='videos/b.mp4', status='processing')
+        just_claimed = VideoUpload.objects.create(user=self.user, video_file='videos/c.mp4', status='pending')
+
+        dead_dir = self.job_dir(dead, age_hours=12)
+        running_dir = self.job_dir(running, age_hours=12)
+        young_dir = self.job_dir(just_claimed, age_hours=0)
+        unrelated_dir = tempfile.mkdtemp(prefix='something-else-', dir=self.scratch_dir)
+        os.utime(unrelated_dir, (0, 0))
+
+        report = SweepReport()
+        sweep_temp_dirs(report, min_age_hours=6, log=quiet)
+
+        self.assertFalse(os.path.exists(dead_dir))
+        for path in (running_dir, young_dir, unrelated_dir):
+            self.assertTrue(os.path.exists(path))
+        self.assertEqual((report.temp_dirs, report.bytes_reclaimed), (1, 10))
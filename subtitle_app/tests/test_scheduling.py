@@ -0,0 +1,173 @@
+"""
+Scheduling policies, the max-wait starvation override and the conditional
+claim in dispatcher.claim_next_job.
+"""
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, close_old_connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from subtitle_app import scheduling
+from subtitle_app.dispatcher import claim_next_job
+from subtitle_app.models import VideoUpload
+from subtitle_app.scheduling import select_fair_share, select_fifo, select_shortest_job_first
+
+
+class QueueMixin:
+    def setUp(self):
+        self.now = timezone.now()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def queue(self, age, user=None, duration=None, priority=0, **fields):
+        """Create a pending upload queued `age` seconds ago."""
+        upload = VideoUpload.objects.create(
+            user=user or self.alice, video_file='videos/clip.mp4', media_duration=duration, priority=priority, **fields,
+        )
+        created_at = self.now - timedelta(seconds=age)
+        VideoUpload.objects.filter(pk=upload.pk).update(created_at=created_at)
+        upload.created_at = created_at
+        return upload
+
+    def pending(self):
+        return list(VideoUpload.objects.filter(status='pending').select_related('user'))
+
+
+@override_settings(SUBTITLE_SCHEDULER_MAX_WAIT_SECONDS=3600, SUBTITLE_FAIR_SHARE_WEIGHTS={})
+class SchedulingPolicyTests(QueueMixin, TestCase):
+    def test_fifo_takes_the_oldest_job(self):
+        self.queue(10)
+        oldest = self.queue(30)
+        self.queue(20)
+        self.assertEqual(select_fifo(self.pending(), self.now), oldest)
+
+    def test_sjf_takes_the_shortest_job(self):
+        self.queue(30, duration=900)
+        self.queue(20)  # unknown duration counts as SUBTITLE_SCHEDULER_UNKNOWN_DURATION
+        shortest = self.queue(10, duration=60)
+        # A range of a long file is as short as the range
+        self.queue(5, duration=900, range_start=100, range_end=190)
+        self.assertEqual(select_shortest_job_first(self.pending(), self.now), shortest)
+
+    def test_fair_share_takes_the_least_served_user_first(self):
+        VideoUpload.objects.create(user=self.alice, video_file='videos/running.mp4', status='processing')
+        self.queue(60, user=self.alice)
+        self.queue(10, user=self.bob, duration=900)
+        bobs_short = self.queue(5, user=self.bob, duration=30)
+        # Bob has nothing running, so his (shortest) job goes before Alice's older one
+        self.assertEqual(select_fair_share(self.pending(), self.now), bobs_short)
+
+        VideoUpload.objects.create(user=self.bob, video_file='videos/running.mp4', status='processing')
+        VideoUpload.objects.create(user=self.bob, video_file='videos/running.mp4', status='processing')
+        # Now Bob has used more than Alice
+        self.assertEqual(select_fair_share(self.pending(), self.now).user, self.alice)
+
+    def test_fair_share_weights(self):
+        VideoUpload.objects.create(user=self.alice, video_file='videos/running.mp4', status='processing')
+        VideoUpload.objects.create(user=self.bob, video_file='videos/running.mp4', status='processing')
+        self.queue(60, user=self.bob)
+        alices = self.queue(10, user=self.alice)
+        with override_settings(SUBTITLE_FAIR_SHARE_WEIGHTS={'alice': 3.0}):
+            self.assertEqual(select_fair_share(self.pending(), self.now), alices)
+
+    def test_priority_comes_before_the_policy(self):
+        self.queue(30, duration=10)
+        urgent = self.queue(10, duration=900, priority=5)
+        for select in (select_fifo, select_shortest_job_first, select_fair_share):
+            self.assertEqual(select(self.pending(), self.now), urgent)
+
+    def test_starved_job_beats_newer_high_priority_jobs(self):
+        self.queue(600, duration=60, priority=10)
+        self.queue(300, duration=30, priority=10)
+        starved = self.queue(3601, duration=5000)
+        for select in (select_fifo, select_shortest_job_first, select_fair_share):
+            self.assertEqual(select(self.pending(), self.now), starved)
+
+    def test_jobs_under_the_max_wait_follow_priority(self):
+        urgent = self.queue(600, priority=10)
+        self.queue(3500)
+        self.assertEqual(select_fifo(self.pending(), self.now), urgent)
+        with override_settings(SUBTITLE_SCHEDULER_MAX_WAIT_SECONDS=0):
+            # 0 disables the override
+            self.queue(100000)
+            self.assertEqual(select_fifo(self.pending(), self.now), urgent)
+
+    def test_longest_waiting_starved_job_goes_first(self):
+        self.queue(4000)
+        oldest = self.queue(9000, duration=99999)
+        self.assertEqual(select_shortest_job_first(self.pending(), self.now), oldest)
+
+
+class ClaimTests(QueueMixin, TestCase):
+    def test_claim_marks_the_job_processing(self):
+        upload = self.queue(10)
+        claimed = claim_next_job('fifo')
+        self.assertEqual(claimed, upload)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'processing')
+        self.assertEqual(upload.attempts, 1)
+        self.assertIsNotNone(upload.heartbeat_at)
+        self.assertIsNone(claim_next_job('fifo'))
+
+    def test_job_claimed_between_select_and_update_is_skipped(self):
+        first = self.queue(20)
+        second = self.queue(10)
+        stolen = []
+
+        def racing_select(candidates, now):
+            choice = select_fifo(candidates, now)
+            if not stolen:
+                # Another worker claims the same job after this one read the queue
+                stolen.append(claim_next_job('fifo'))
+            return choice
+
+        with mock.patch.dict(scheduling.POLICIES, {'racing': racing_select}):
+            claimed = claim_next_job('racing')
+
+        self.assertEqual(stolen, [first])
+        self.assertEqual(claimed, second)
+        first.refresh_from_db()
+        self.assertEqual(first.attempts, 1)
+
+
+class ConcurrentClaimTests(QueueMixin, TransactionTestCase):
+    def test_concurrent_workers_never_claim_the_same_job(self):
+        jobs = [self.queue(100 - i) for i in range(6)]
+        start = threading.Barrier(4)
+        claims = []
+        errors = []
+
+        def worker():
+            try:
+                start.wait()
+                while True:
+                    try:
+                        upload = claim_next_job('fifo')
+                    except OperationalError as e:
+                        # SQLite's in-memory test database locks whole tables; PostgreSQL never gets here
+                        if 'locked' not in str(e):
+                            raise
+                        continue
+                    if upload is None:
+                        return
+                    claims.append(upload.pk)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        self.assertEqual(errors, [])
+        self.assertCountEqual(claims, [job.pk for job in jobs])
+        self.assertEqual(
+            set(VideoUpload.objects.values_list('status', 'attempts')), {('processing', 1)}
+        )
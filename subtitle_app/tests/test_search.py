@@ -0,0 +1,66 @@
+"""
+Full-text transcript search: results are ranked by relevance, every term of
+the query must match, FTS syntax in queries is treated as plain words, and
+users only ever find their own transcripts.
+"""
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from subtitle_app.models import VideoUpload
+from subtitle_app.search import index_transcript, parse_srt, search_transcripts
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='secret')
+        self.other = User.objects.create_user('other', password='secret')
+
+    def transcript(self, cues, user=None):
+        upload = VideoUpload.objects.create(user=user or self.user, video_file='videos/talk.mp4', status='completed')
+        index_transcript(upload, [(i * 5.0, i * 5.0 + 4.0, text) for i, text in enumerate(cues)])
+        return upload
+
+    def test_best_matching_upload_comes_first(self):
+        passing = self.transcript([
+            'we talked about many things and the weather came up once near the end of a very long meeting',
+        ])
+        focused = self.transcript(['weather forecast', 'the weather is turning, weather warnings everywhere'])
+
+        results = search_transcripts(self.user, 'weather')
+
+        self.assertEqual([upload for upload, _ in results], [focused, passing])
+        # Each upload's hits are listed in time order
+        self.assertEqual([segment.position for segment in results[0][1]], [0, 1])
+
+    def test_all_terms_must_match(self):
+        self.transcript(['rain tomorrow', 'sunny tomorrow'])
+        results = search_transcripts(self.user, 'sunny tomorrow')
+        self.assertEqual([segment.text for segment in results[0][1]], ['sunny tomorrow'])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.transcript(['rain tomorrow'])
+        for query in ('rain OR "', 'text:rain*', 'NEAR(rain', '"'):
+            with self.subTest(query=query):
+                search_transcripts(self.user, query)
+        self.assertEqual(search_transcripts(self.user, '"'), [])
+
+    def test_other_users_transcripts_are_never_found(self):
+        own = self.transcript(['secret launch plans'])
+        theirs = self.transcript(['secret launch plans', 'more secret plans'], user=self.other)
+
+        results = search_transcripts(self.user, 'secret plans')
+        self.assertEqual([upload for upload, _ in results], [own])
+
+        client = APIClient()
+        client.force_authenticate(self.other)
+        payload = client.get('/api/search/', {'q': 'secret'}).json()
+        self.assertEqual([result['id'] for result in payload['results']], [theirs.pk])
+
+    def test_reindexing_replaces_the_segments(self):
+        upload = self.transcript(['old words'])
+        index_transcript(upload, parse_srt("1\n00:00:01,000 --> 00:00:02,500\nnew\nwords\n\n"))
+
+        self.assertEqual(search_transcripts(self.user, 'old'), [])
+        [(found, [segment])] = search_transcripts(self.user, 'new')
+        self.assertEqual((found, segment.text, segment.start_time, segment.end_time), (upload, 'new words', 1.0, 2.5))
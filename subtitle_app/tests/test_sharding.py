@@ -0,0 +1,133 @@
+"""
+Shard planning and merging for long videos: chunk ownership, the decode
+windows and duplicate cues at shard boundaries.
+"""
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+from subtitle_app import subtitle_generator
+from subtitle_app.profiles import get_profile
+from subtitle_app.subtitle_generator import merge_shard_results, plan_shards, preprocess_audio, process_shard, split_into_chunks
+
+
+def sharded_chunk_starts(shards, profile):
+    """Absolute chunk starts (ms) the shards cut, the way process_shard cuts them."""
+    starts = []
+    for shard in shards:
+        audio = AudioSegment.silent(int(round((shard['decode_end'] - shard['decode_start']) * 1000)), frame_rate=1000)
+        first_start_ms = int(round((shard['start'] - shard['decode_start']) * 1000))
+        stop_ms = int(round((shard['end'] - shard['decode_start']) * 1000))
+        _, chunk_starts = split_into_chunks(audio, first_start_ms=first_start_ms, stop_ms=stop_ms, profile=profile)
+        starts.extend(int(round(shard['decode_start'] * 1000)) + start for start in chunk_starts)
+    return starts
+
+
+class PlanShardsTests(SimpleTestCase):
+    def test_every_chunk_of_the_range_is_owned_by_exactly_one_shard(self):
+        for name in ('fast', 'balanced', 'accurate'):
+            profile = get_profile(name)
+            for range_start, range_end in ((0.0, 400.0), (37.5, 400.0), (125.0, 181.0)):
+                with self.subTest(profile=name, range_start=range_start, range_end=range_end):
+                    shards = plan_shards(1000.0, 60, 2, profile, range_start, range_end)
+                    self.assertEqual(shards[0]['start'], range_start)
+                    self.assertEqual(shards[-1]['end'], range_end)
+                    for previous, shard in zip(shards, shards[1:]):
+                        self.assertEqual(shard['start'], previous['end'])
+
+                    # Same chunks as cutting the whole range in one piece
+                    whole = AudioSegment.silent(int((range_end - range_start) * 1000), frame_rate=1000)
+                    _, expected = split_into_chunks(whole, profile=profile)
+                    expected = [int(range_start * 1000) + start for start in expected]
+                    self.assertEqual(sorted(sharded_chunk_starts(shards, profile)), expected)
+
+    def test_nothing_past_the_range_end_is_decoded(self):
+        profile = get_profile('balanced')
+        shards = plan_shards(1000.0, 60, 2, profile, range_start=37.5, range_end=300.0)
+        for shard in shards:
+            self.assertLessEqual(shard['decode_end'], 300.0)
+            # Leading guard band, clamped to the start of the media only
+            self.assertEqual(shard['decode_start'], shard['start'] - 2)
+            # Every owned chunk is decoded in full unless the range ends first
+            self.assertEqual(shard['decode_end'], min(shard['end'] + 12 + 2, 300.0))
+
+        first = plan_shards(1000.0, 60, 2, profile, range_start=1.0, range_end=300.0)[0]
+        self.assertEqual(first['decode_start'], 0.0)
+
+    def test_shard_length_is_a_multiple_of_the_chunk_step(self):
+        profile = get_profile('balanced')  # 9s step
+        shards = plan_shards(1000.0, 100, 2, profile, range_start=10.0, range_end=200.0)
+        for shard in shards[:-1]:
+            self.assertEqual(shard['end'] - shard['start'], 99.0)
+
+
+class ShardPreprocessingTests(SimpleTestCase):
+    def test_shards_use_the_file_wide_gain(self):
+        profile = get_profile('fast')
+        quiet = Sine(440).to_audio_segment(duration=1000, volume=-30.0).set_frame_rate(16000)
+        loud = Sine(440).to_audio_segment(duration=1000, volume=-6.0).set_frame_rate(16000)
+        # Normalized on their own, both would end up at the same level
+        self.assertAlmostEqual(preprocess_audio(quiet, profile).max_dBFS, preprocess_audio(loud, profile).max_dBFS, places=0)
+
+        quiet_shard = preprocess_audio(quiet, profile, gain_db=5.0)
+        loud_shard = preprocess_audio(loud, profile, gain_db=5.0)
+        self.assertAlmostEqual(quiet_shard.dBFS - quiet.dBFS, 5.0, places=1)
+        self.assertAlmostEqual(loud_shard.dBFS - quiet_shard.dBFS, 24.0, places=0)
+
+    def test_process_shard_recognizes_with_the_file_wide_threshold(self):
+        def extract(source_path, output_path, start, duration, timeout):
+            Sine(440).to_audio_segment(duration=duration * 1000, volume=-20.0).set_frame_rate(16000).export(output_path, format='wav')
+
+        shard = {'index': 1, 'start': 18.0, 'end': 36.0, 'decode_start': 16.0, 'decode_end': 50.0}
+        with mock.patch.object(subtitle_generator, 'extract_audio_segment', side_effect=extract), \
+                mock.patch.object(subtitle_generator, 'transcribe_chunks', return_value={'cues': []}) as transcribe:
+            result = process_shard('video.mp4', shard, 60.0, self.enterContext(tempfile.TemporaryDirectory()),
+                                   profile=get_profile('balanced'), gain_db=3.0, energy_threshold=321.0)
+
+        self.assertEqual(result['index'], 1)
+        kwargs = transcribe.call_args.kwargs
+        self.assertEqual(kwargs['energy_threshold'], 321.0)
+        self.assertEqual(kwargs['offset_seconds'], 16.0)
+        # Chunks at 18s and 27s (shard time), offsets relative to the decode start
+        self.assertEqual([start for start, _ in transcribe.call_args.args[0]], [2000, 11000])
+
+
+class MergeShardResultsTests(SimpleTestCase):
+    def result(self, index, cues):
+        return {'index': index, 'cues': cues, 'successful_chunks': len(cues), 'failed_chunks': 1,
+                'total_chunks': len(cues) + 1, 'recognizer_calls': len(cues) + 2}
+
+    def test_boundary_duplicates_are_dropped(self):
+        # Shards of a range starting at 37.5s; the boundary is at 127.5s
+        first = self.result(0, [
+            (37.5, 49.5, 'opening words'),
+            (118.5, 130.5, 'across the boundary'),
+        ])
+        second = self.result(1, [
+            # The same chunk recognized again by the next shard
+            (118.5, 130.5, 'Across the boundary'),
+            # The same sentence heard again by an overlapping chunk
+            (127.5, 139.5, 'across the boundary '),
+            (136.5, 148.5, 'next sentence'),
+        ])
+        merged = merge_shard_results([second, first])
+
+        self.assertEqual(merged['cues'], [
+            (37.5, 49.5, 'opening words'),
+            (118.5, 130.5, 'across the boundary'),
+            (136.5, 148.5, 'next sentence'),
+        ])
+        self.assertEqual(merged['successful_chunks'], 5)
+        self.assertEqual(merged['failed_chunks'], 2)
+        self.assertEqual(merged['total_chunks'], 7)
+        self.assertEqual(merged['recognizer_calls'], 9)
+
+    def test_repeated_text_after_the_previous_cue_is_kept(self):
+        merged = merge_shard_results([
+            self.result(0, [(40.0, 52.0, 'yes')]),
+            self.result(1, [(130.0, 142.0, 'yes')]),
+        ])
+        self.assertEqual([cue[0] for cue in merged['cues']], [40.0, 130.0])
@@ -0,0 +1,100 @@
+"""
+The cached status payload is never served stale after a state change made
+with a conditional update (finish_attempt, cancel, regenerate, the reaper).
+"""
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from subtitle_app.liveness import finish_attempt, reap_stale_jobs
+from subtitle_app.models import VideoUpload
+from subtitle_app.status_cache import status_cache_key
+
+
+@override_settings(SUBTITLE_INLINE_WORKERS=False, SUBTITLE_AUDIO_CACHE_MAX_BYTES=0)
+class StatusCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.user = User.objects.create_user('owner', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, **fields):
+        upload = VideoUpload(user=self.user, **fields)
+        upload.video_file.save('talk.mp4', ContentFile(b'video'), save=False)
+        upload.save()
+        return upload
+
+    def status(self, upload):
+        """Poll the status endpoint and check the payload came from (or went into) the cache."""
+        payload = self.client.get(f'/api/upload/{upload.pk}/').json()
+        self.assertEqual(cache.get(status_cache_key(upload.pk))['status'], payload['status'])
+        return payload
+
+    def test_finished_attempt_is_visible_at_once(self):
+        upload = self.upload(status='processing', attempts=1)
+        self.assertEqual(self.status(upload)['status'], 'processing')
+
+        self.assertTrue(finish_attempt(upload, status='failed', error_message='Recognition failed'))
+
+        payload = self.status(upload)
+        self.assertEqual(payload['status'], 'failed')
+        self.assertEqual(payload['error_message'], 'Recognition failed')
+
+    def test_cancel_is_visible_at_once(self):
+        pending = self.upload()
+        self.assertEqual(self.status(pending)['status'], 'pending')
+        self.assertEqual(self.client.post(f'/api/upload/{pending.pk}/cancel/').status_code, 200)
+        self.assertEqual(self.status(pending)['status'], 'cancelled')
+
+        running = self.upload(status='processing', attempts=1)
+        self.assertIsNone(self.status(running)['cancel_requested_at'])
+        self.assertEqual(self.client.post(f'/api/upload/{running.pk}/cancel/').status_code, 202)
+        payload = self.status(running)
+        self.assertEqual(payload['status'], 'processing')
+        self.assertIsNotNone(payload['cancel_requested_at'])
+
+        # The worker stops at its next check
+        finish_attempt(running, status='cancelled', error_message=None)
+        self.assertEqual(self.status(running)['status'], 'cancelled')
+
+    def test_regenerate_is_visible_at_once(self):
+        upload = self.upload(status='failed', attempts=2, error_message='Recognition failed', language='en-US')
+        self.assertEqual(self.status(upload)['status'], 'failed')
+
+        response = self.client.post(f'/api/upload/{upload.pk}/regenerate/', {'language': 'de-DE'}, format='json')
+        self.assertEqual(response.status_code, 202)
+
+        payload = self.status(upload)
+        self.assertEqual(payload['status'], 'pending')
+        self.assertEqual(payload['language'], 'de-DE')
+        self.assertIsNone(payload['error_message'])
+
+    def test_reaped_job_is_visible_at_once(self):
+        upload = self.upload(status='processing', attempts=1, heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.status(upload)['status'], 'processing')
+
+        reap_stale_jobs(log=lambda message: None)
+        self.assertEqual(self.status(upload)['status'], 'pending')
+
+    def test_sparse_fields_are_cut_from_a_fresh_payload(self):
+        upload = self.upload(status='processing', attempts=1)
+        self.status(upload)
+        finish_attempt(upload, status='failed', error_message='Recognition failed')
+
+        payload = self.client.get(f'/api/upload/{upload.pk}/?fields=status,error_message').json()
+        self.assertEqual(payload, {'status': 'failed', 'error_message': 'Recognition failed'})
@@ -0,0 +1,80 @@
+"""
+Sparse `?fields=` on the status endpoint: unknown fields are rejected and
+fields beyond the status representation are only served to the owner.
+"""
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from subtitle_app.models import VideoUpload
+from subtitle_app.serializers import STATUS_FIELDS
+
+SRT = "1\n00:00:00,000 --> 00:00:04,000\nHello there\n\n"
+
+
+class StatusFieldsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.owner = User.objects.create_user('owner', password='secret')
+        self.upload = VideoUpload(
+            user=self.owner, video_file='videos/talk.mp4', status='completed', callback_url='https://example.com/hook',
+        )
+        self.upload.subtitle_file.save('talk.srt', ContentFile(SRT), save=False)
+        self.upload.save()
+        self.url = f'/api/upload/{self.upload.pk}/'
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+        return client
+
+    def test_default_payload_is_the_status_representation(self):
+        payload = self.client_for().get(self.url).json()
+        self.assertEqual(sorted(payload), sorted(STATUS_FIELDS))
+        self.assertNotIn('transcript_text', payload)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client_for(self.owner).get(self.url + '?fields=status,password,user')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Unknown fields: password, user', response.json()['fields'])
+        # upload_session is write-only
+        self.assertEqual(self.client_for(self.owner).get(self.url + '?fields=upload_session').status_code, 400)
+
+    def test_anyone_may_poll_status_fields(self):
+        response = self.client_for().get(self.url + '?fields=status,error_message')
+        self.assertEqual(response.json(), {'status': 'completed', 'error_message': None})
+
+    def test_private_fields_need_the_owner(self):
+        fields = '?fields=status,transcript_text,callback_url'
+
+        self.assertEqual(self.client_for().get(self.url + fields).status_code, 401)
+        stranger = User.objects.create_user('stranger')
+        response = self.client_for(stranger).get(self.url + fields)
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('Hello there', response.content.decode())
+
+        payload = self.client_for(self.owner).get(self.url + fields).json()
+        self.assertEqual(payload['callback_url'], 'https://example.com/hook')
+        self.assertIn('Hello there', payload['transcript_text'])
+
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.assertEqual(self.client_for(staff).get(self.url + fields).status_code, 200)
+
+    def test_invalid_token_is_rejected_for_private_fields(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token not-a-token')
+        self.assertEqual(client.get(self.url + '?fields=transcript_text').status_code, 401)
@@ -0,0 +1,114 @@
+"""
+storage.py against an S3-compatible service: a moto server on localhost
+stands in for S3/MinIO, so files go through real HTTP requests.
+"""
+import os
+import socket
+import tempfile
+import urllib.parse
+import urllib.request
+
+import boto3
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+from django.test import SimpleTestCase
+from moto.server import ThreadedMotoServer
+from storages.backends.s3 import S3Storage
+
+from subtitle_app.models import VideoUpload
+from subtitle_app.storage import (
+    delete_file, file_exists, file_size, iter_text_lines, local_path, media_location, presigned_download_url,
+    read_text, stage_to_scratch,
+)
+
+BUCKET = 'subtitles'
+SRT = b"1\n00:00:00,000 --> 00:00:02,000\nHello\n\n2\n00:00:02,000 --> 00:00:04,000\nWorld\n"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class S3StorageTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        port = free_port()
+        cls.server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+        cls.server.start()
+        cls.endpoint_url = f'http://127.0.0.1:{port}'
+        credentials = {'aws_access_key_id': 'testing', 'aws_secret_access_key': 'testing', 'region_name': 'us-east-1'}
+        boto3.client('s3', endpoint_url=cls.endpoint_url, **credentials).create_bucket(Bucket=BUCKET)
+        # The same options as MEDIA_STORAGE_BACKEND=s3 in settings.py
+        cls.storage = S3Storage(
+            bucket_name=BUCKET,
+            access_key='testing',
+            secret_key='testing',
+            region_name='us-east-1',
+            endpoint_url=cls.endpoint_url,
+            addressing_style='path',
+            location='media',
+            querystring_auth=True,
+            signature_version='s3v4',
+            querystring_expire=300,
+            file_overwrite=False,
+            default_acl=None,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def stored_file(self, name, content):
+        name = self.storage.save(name, ContentFile(content))
+        field_file = FieldFile(None, VideoUpload._meta.get_field('subtitle_file'), name)
+        field_file.storage = self.storage
+        return field_file
+
+    def test_upload_and_read(self):
+        field_file = self.stored_file('subtitles/upload.srt', SRT)
+
+        self.assertIsNone(local_path(field_file))
+        self.assertTrue(file_exists(field_file))
+        self.assertEqual(file_size(field_file), len(SRT))
+        self.assertEqual(read_text(field_file), SRT.decode('utf-8'))
+        self.assertEqual(''.join(iter_text_lines(field_file)), SRT.decode('utf-8'))
+
+    def test_stage_to_scratch_copies_remote_file(self):
+        field_file = self.stored_file('videos/source.wav', b'RIFF' + b'\0' * 4096)
+
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            path, staged = stage_to_scratch(field_file, scratch_dir)
+            self.assertTrue(staged)
+            self.assertEqual(os.path.dirname(path), scratch_dir)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'RIFF' + b'\0' * 4096)
+
+    def test_presigned_download(self):
+        field_file = self.stored_file('subtitles/download.srt', SRT)
+
+        url = presigned_download_url(field_file, 'lecture.srt')
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+        self.assertTrue(url.startswith(f'{self.endpoint_url}/{BUCKET}/media/subtitles/'))
+        self.assertIn('X-Amz-Signature', query)
+        self.assertEqual(query['X-Amz-Expires'], ['300'])
+        self.assertEqual(query['response-content-disposition'], ['attachment; filename="lecture.srt"'])
+
+        # The URL works without credentials, like a client following the download redirect
+        with urllib.request.urlopen(url, timeout=10) as response:
+            self.assertEqual(response.read(), SRT)
+
+        # ffmpeg reads remote media from a signed URL too
+        with urllib.request.urlopen(media_location(field_file), timeout=10) as response:
+            self.assertEqual(response.read(), SRT)
+
+    def test_delete(self):
+        field_file = self.stored_file('subtitles/delete.srt', SRT)
+
+        delete_file(field_file)
+        self.assertFalse(file_exists(field_file))
+        # Deleting a file that is already gone is a no-op
+        delete_file(field_file)
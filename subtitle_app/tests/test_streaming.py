@@ -0,0 +1,90 @@
+"""
+The memory-bounded pipeline: chunks re-cut from windows match slicing the
+whole track, and filter state carries over between windows.
+"""
+import numpy as np
+from django.test import SimpleTestCase
+from pydub import AudioSegment
+
+from subtitle_app.profiles import get_profile
+from subtitle_app.streaming import SAMPLE_RATE, DynamicRangeCompressor, HighPassFilter, iter_chunks
+from subtitle_app.subtitle_generator import split_into_chunks
+
+
+def speech_like(seconds, seed=0):
+    """Noise with loud 220Hz bursts that swell and fade, as int16 samples."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = (np.sin(2 * np.pi * 0.7 * t) > 0) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    samples = rng.normal(0, 300, len(t)) + 20000 * envelope * np.sin(2 * np.pi * 220 * t)
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def uneven_windows(samples, seed=1):
+    """Cut samples into windows of random sizes, including tiny ones."""
+    rng = np.random.default_rng(seed)
+    windows = []
+    position = 0
+    while position < len(samples):
+        size = int(rng.choice([1, 7, 15, 16, 17, 79, 1000, 4093, 16000]))
+        windows.append(samples[position:position + size])
+        position += size
+    return windows
+
+
+def to_segment(samples):
+    return AudioSegment(data=samples.astype(np.int16).tobytes(), sample_width=2, frame_rate=SAMPLE_RATE, channels=1)
+
+
+class IterChunksTests(SimpleTestCase):
+    def test_chunks_match_slicing_the_whole_track(self):
+        samples = speech_like(47.3)
+        for name in ('fast', 'balanced', 'accurate'):
+            profile = get_profile(name)
+            with self.subTest(profile=name):
+                expected_chunks, expected_starts = split_into_chunks(to_segment(samples), profile=profile)
+                chunks = list(iter_chunks(
+                    uneven_windows(samples), profile.chunk_length_ms, profile.chunk_step_ms, profile.min_chunk_ms
+                ))
+                self.assertEqual([start for start, _ in chunks], expected_starts)
+                for (_, chunk), expected in zip(chunks, expected_chunks):
+                    self.assertEqual(chunk.raw_data, expected.raw_data)
+
+    def test_short_tail_is_dropped(self):
+        profile = get_profile('fast')  # 15s chunks, no overlap, 1s minimum
+        samples = np.zeros(int(30.5 * SAMPLE_RATE), dtype=np.int16)
+        starts = [start for start, _ in iter_chunks([samples], 15000, 15000, profile.min_chunk_ms)]
+        self.assertEqual(starts, [0, 15000])
+
+
+class FilterContinuityTests(SimpleTestCase):
+    def process_in_windows(self, processor, samples):
+        return np.concatenate([processor.process(window.astype(np.float64)) for window in uneven_windows(samples)])
+
+    def test_high_pass_state_carries_across_windows(self):
+        samples = speech_like(6.0)
+        whole = HighPassFilter(80).process(samples.astype(np.float64))
+        np.testing.assert_allclose(self.process_in_windows(HighPassFilter(80), samples), whole, atol=1e-6)
+
+        reference = np.frombuffer(to_segment(samples).high_pass_filter(80).raw_data, dtype=np.int16)
+        # pydub starts from the first sample instead of 0 and truncates to int16
+        settled = SAMPLE_RATE // 10
+        self.assertLessEqual(np.max(np.abs(whole[settled:] - reference[settled:])), 1.0)
+
+    def test_compressor_state_carries_across_windows(self):
+        samples = speech_like(6.0)
+        whole = DynamicRangeCompressor().process(samples)
+        np.testing.assert_allclose(self.process_in_windows(DynamicRangeCompressor(), samples), whole, atol=1e-6)
+
+    def test_compressor_matches_pydub_levels(self):
+        samples = speech_like(4.0)
+        compressed = DynamicRangeCompressor().process(samples)
+        reference = np.frombuffer(to_segment(samples).compress_dynamic_range().raw_data, dtype=np.int16).astype(np.float64)
+
+        def dbfs(values):
+            return 20 * np.log10(np.sqrt(np.mean(values ** 2)) / 32768.0)
+
+        self.assertLess(dbfs(compressed), dbfs(samples.astype(np.float64)) - 1.0)
+        for start in range(0, len(samples), SAMPLE_RATE // 2):
+            window = slice(start, start + SAMPLE_RATE // 2)
+            self.assertAlmostEqual(dbfs(compressed[window]), dbfs(reference[window]), delta=0.25)
@@ -0,0 +1,76 @@
+"""
+Subtitling a start/end range of the media: empty or inverted ranges are
+rejected by every endpoint that accepts one.
+"""
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from subtitle_app.models import VideoUpload
+
+
+class TimeRangeTests(SimpleTestCase):
+    def test_end_is_clamped_to_the_media(self):
+        self.assertEqual(VideoUpload(range_start=30, range_end=90).time_range(60.0), (30, 60.0))
+        self.assertEqual(VideoUpload(range_start=30).time_range(60.0), (30, 60.0))
+        self.assertEqual(VideoUpload(range_end=45).time_range(60.0), (0.0, 45))
+        self.assertEqual(VideoUpload(range_start=30).time_range(), (30, None))
+
+
+@override_settings(SUBTITLE_INLINE_WORKERS=False, SUBTITLE_AUDIO_CACHE_MAX_BYTES=0)
+class TimeRangeValidationTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.user = User.objects.create_user('owner', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_upload_with_end_not_after_start_is_rejected(self):
+        for start, end in ((30, 30), (30, 10)):
+            with self.subTest(start=start, end=end):
+                response = self.client.post('/api/upload/', {
+                    'video_file': SimpleUploadedFile('talk.mp4', b'video', content_type='video/mp4'),
+                    'start': start,
+                    'end': end,
+                }, format='multipart')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['end'], ['Must be after start.'])
+        self.assertFalse(VideoUpload.objects.exists())
+
+    def test_upload_check_with_end_not_after_start_is_rejected(self):
+        response = self.client.post('/api/upload/check/', {
+            'sha256': 'a' * 64, 'size': 100, 'start': 12.5, 'end': 12.5,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['end'], ['Must be after start.'])
+
+    def test_regenerate_with_an_empty_range_is_rejected(self):
+        upload = VideoUpload(user=self.user, status='completed', media_duration=60.0)
+        upload.video_file.save('talk.mp4', ContentFile(b'video'), save=False)
+        upload.save()
+        url = f'/api/upload/{upload.pk}/regenerate/'
+
+        response = self.client.post(url, {'start': 40, 'end': 20}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['start'], ['start must be before end.'])
+
+        response = self.client.post(url, {'start': 75}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('past the end of the media', response.json()['start'][0])
+
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.range_start, upload.range_end), ('completed', None, None))
+
+        response = self.client.post(url, {'start': 20, 'end': 40}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.json()['start'], response.json()['end']), (20.0, 40.0))
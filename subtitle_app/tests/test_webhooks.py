@@ -0,0 +1,145 @@
+"""
+Webhook deliveries against a local HTTP receiver: signatures, the public
+address check, leased claims and retries with backoff.
+"""
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from subtitle_app.models import UserWebhook, VideoUpload, WebhookDelivery
+from subtitle_app.webhooks import (
+    UnsafeWebhookURL, check_webhook_url, deliver, deliver_due, queue_job_webhooks, verify_signature,
+)
+
+
+class Receiver:
+    """A local HTTP server that records requests and answers with queued status codes."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                receiver.requests.append((dict(self.headers), body))
+                self.send_response(receiver.statuses.pop(0) if receiver.statuses else 204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/hook'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(SUBTITLE_WEBHOOK_ALLOWED_HOSTS=['127.0.0.1'], SUBTITLE_WEBHOOK_BACKOFF_SECONDS=10.0)
+class WebhookDeliveryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', password='secret')
+        self.secret = UserWebhook.objects.create(user=self.user).secret
+
+    def completed_upload(self, callback_url):
+        return VideoUpload.objects.create(
+            user=self.user, video_file='videos/talk.mp4', status='completed', callback_url=callback_url,
+        )
+
+    def test_signature_verifies_and_tampered_body_fails(self):
+        with Receiver() as receiver:
+            upload = self.completed_upload(receiver.url)
+            self.assertEqual(queue_job_webhooks(upload.pk), 1)
+            self.assertEqual(deliver_due(), 1)
+
+        self.assertEqual(len(receiver.requests), 1)
+        headers, body = receiver.requests[0]
+        self.assertEqual(headers['X-Subtitle-Event'], 'upload.completed')
+        signature = headers['X-Subtitle-Signature']
+        self.assertTrue(verify_signature(self.secret, signature, body))
+        self.assertFalse(verify_signature(self.secret, signature, body.replace(b'completed', b'failed')))
+        self.assertFalse(verify_signature('another secret', signature, body))
+
+        delivery = WebhookDelivery.objects.get(upload=upload)
+        self.assertEqual(delivery.status, 'delivered')
+        self.assertEqual(delivery.response_status, 204)
+
+    def test_non_public_hosts_are_refused_unless_allowed(self):
+        with override_settings(SUBTITLE_WEBHOOK_ALLOWED_HOSTS=[]):
+            for url in ('http://127.0.0.1/hook', 'http://10.0.0.5/hook', 'http://169.254.169.254/latest', 'http://[::1]/'):
+                with self.assertRaises(UnsafeWebhookURL):
+                    check_webhook_url(url)
+
+            # Delivery checks the connected peer too, and does not retry a refused URL
+            with Receiver() as receiver:
+                upload = self.completed_upload(receiver.url)
+                queue_job_webhooks(upload.pk)
+                deliver_due()
+            self.assertEqual(receiver.requests, [])
+            delivery = WebhookDelivery.objects.get(upload=upload)
+            self.assertEqual(delivery.status, 'failed')
+            self.assertIn('non-public', delivery.last_error)
+
+        check_webhook_url('http://127.0.0.1:8081/hook')
+
+    def test_server_errors_are_retried_with_growing_delays(self):
+        with Receiver(statuses=[500, 500]) as receiver:
+            upload = self.completed_upload(receiver.url)
+            queue_job_webhooks(upload.pk)
+
+            delays = []
+            for _ in range(2):
+                self.assertEqual(deliver_due(), 1)
+                delivery = WebhookDelivery.objects.get(upload=upload)
+                self.assertEqual(delivery.status, 'pending')
+                self.assertEqual(delivery.response_status, 500)
+                self.assertEqual(delivery.last_error, 'HTTP 500')
+                delays.append((delivery.next_attempt_at - delivery.last_attempt_at).total_seconds())
+                # Not due yet
+                self.assertEqual(deliver_due(), 0)
+                WebhookDelivery.objects.filter(pk=delivery.pk).update(next_attempt_at=timezone.now())
+
+            self.assertEqual(deliver_due(), 1)
+
+        self.assertEqual(len(receiver.requests), 3)
+        # Exponential backoff (10s, then 20s) with +-20% jitter
+        self.assertTrue(8 <= delays[0] <= 12, delays)
+        self.assertTrue(16 <= delays[1] <= 24, delays)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        log = client.get(f'/api/upload/{upload.pk}/webhooks/').json()
+        self.assertEqual(len(log), 1)
+        self.assertEqual(log[0]['status'], 'delivered')
+        self.assertEqual(log[0]['attempts'], 3)
+        self.assertEqual(log[0]['response_status'], 204)
+
+    def test_outcome_is_not_recorded_after_the_claim_is_lost(self):
+        with Receiver() as receiver:
+            upload = self.completed_upload(receiver.url)
+            queue_job_webhooks(upload.pk)
+            delivery = WebhookDelivery.objects.get(upload=upload)
+            # Another process claimed it after this one read it
+            leased_until = timezone.now() + timedelta(seconds=40)
+            WebhookDelivery.objects.filter(pk=delivery.pk).update(next_attempt_at=leased_until)
+
+            self.assertEqual(deliver_due(), 0)
+            self.assertFalse(deliver(delivery))
+
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, 'pending')
+        self.assertEqual(delivery.attempts, 0)
+        self.assertEqual(delivery.next_attempt_at, leased_until)
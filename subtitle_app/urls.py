@@ -1,11 +1,18 @@
 from django.urls import path
-from .views import VideoUploadView, SubtitleDownloadView, VideoStatusView
+from .views import VideoUploadView, UploadCheckView, CancelUploadView, RegenerateUploadView, SubtitleDownloadView, SubtitleExportView, VideoStatusView, TranscriptSearchView, WebhookView, WebhookDeliveryListView
 from .auth_views import register, login_view, logout_view, current_user, csrf_token
 
 urlpatterns = [
     path('upload/', VideoUploadView.as_view(), name='upload_video'),
+    path('upload/check/', UploadCheckView.as_view(), name='upload_check'),
     path('upload/<int:pk>/', VideoStatusView.as_view(), name='video_status'),
+    path('upload/<int:pk>/cancel/', CancelUploadView.as_view(), name='cancel_upload'),
+    path('upload/<int:pk>/regenerate/', RegenerateUploadView.as_view(), name='regenerate_upload'),
+    path('upload/<int:pk>/webhooks/', WebhookDeliveryListView.as_view(), name='upload_webhook_deliveries'),
+    path('webhook/', WebhookView.as_view(), name='webhook'),
     path('download/<int:pk>/', SubtitleDownloadView.as_view(), name='download_subtitle'),
+    path('export/', SubtitleExportView.as_view(), name='export_subtitles'),
+    path('search/', TranscriptSearchView.as_view(), name='search_transcripts'),
     # Authentication endpoints
     path('auth/register/', register, name='register'),
     path('auth/login/', login_view, name='login'),
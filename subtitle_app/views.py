@@ -1,28 +1,46 @@
 from rest_framework import status, generics
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
-from django.http import FileResponse, HttpResponseNotFound, HttpResponse
+from django.http import HttpResponseNotFound, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.views import View
 from django.conf import settings
+from django.utils import timezone
+from asgiref.sync import sync_to_async
 import os
-import threading
-from .models import VideoUpload
-from .serializers import VideoUploadSerializer
-from .subtitle_generator import generate_subtitles
+from .models import UserWebhook, VideoUpload, generate_webhook_secret
+from .profiles import get_profile
+from .serializers import (
+    ExportRequestSerializer, RegenerateSerializer, TranscriptSearchResultSerializer, UploadCheckSerializer, UserWebhookSerializer,
+    STATUS_FIELDS, VideoUploadSerializer, WebhookDeliverySerializer, readable_upload_fields,
+)
+from .audio_cache import find_artifact
+from .authentication import InvalidToken, aauthenticate_request
+from .export import aiter_zip_export
+from .dedup import create_duplicate_upload, create_upload_session, find_processed_upload
+from .db_router import has_replica, replica_reads
+from .cancellation import request_cancellation
+from .search import search_transcripts
+from .dispatcher import enqueue
+from .media import probe_media_duration
+from .status_cache import absolutize_payload, aget_status_payload, refresh_status_cache
+from .storage import file_exists, file_size, media_location, presigned_download_url
 
 
-def run_subtitle_generation(video_upload):
-    """Run subtitle generation in background; set status failed on uncaught exception."""
-    try:
-        generate_subtitles(video_upload)
-    except Exception as e:
-        import traceback
-        error_message = str(e)
-        error_traceback = traceback.format_exc()
-        print(f"ERROR processing video {video_upload.id}: {error_message}\n{error_traceback}")
-        video_upload.status = 'failed'
-        video_upload.error_message = error_message
-        video_upload.save()
+STREAM_CHUNK_SIZE = 64 * 1024
+# Upload states a job can be regenerated from
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+def time_range_error(video_upload):
+    """Return why an upload's time range cannot be processed, or None."""
+    start, end = video_upload.time_range(video_upload.media_duration)
+    if end is not None and start >= end:
+        if video_upload.range_end is not None and video_upload.range_end <= start:
+            return "start must be before end."
+        return f"start is past the end of the media ({video_upload.media_duration:.2f}s)."
+    return None
 
 
 class VideoUploadView(generics.CreateAPIView):
@@ -38,15 +56,17 @@ class VideoUploadView(generics.CreateAPIView):
         if serializer.is_valid():
             # Save the uploaded video
             video_upload = serializer.save()
-            video_upload.status = 'processing'
+            
+            # Probe the duration so the scheduler can order jobs by length
+            video_upload.media_duration = probe_media_duration(media_location(video_upload.video_file))
+            range_error = time_range_error(video_upload)
+            if range_error:
+                video_upload.delete()
+                return Response({'start': [range_error]}, status=status.HTTP_400_BAD_REQUEST)
             video_upload.save()
             
-            thread = threading.Thread(
-                target=run_subtitle_generation,
-                args=(video_upload,),
-                daemon=True,
-            )
-            thread.start()
+            # Queue the job; a dispatcher worker picks it according to the scheduling policy
+            enqueue(video_upload)
             
             response_serializer = VideoUploadSerializer(
                 video_upload,
@@ -63,92 +83,417 @@ class VideoUploadView(generics.CreateAPIView):
         )
 
 
-class VideoStatusView(generics.RetrieveAPIView):
-    """API endpoint for checking video processing status."""
-    queryset = VideoUpload.objects.all()
-    serializer_class = VideoUploadSerializer
+class UploadCheckView(APIView):
+    """
+    API endpoint for checking a file's checksum before uploading it.
+
+    If the same content was already processed, a completed upload sharing its
+    subtitles is created and no transfer is needed; otherwise an upload
+    session is returned to send along with the file to /api/upload/.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = UploadCheckSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        sha256 = serializer.validated_data['sha256']
+        size = serializer.validated_data['size']
+        original = find_processed_upload(
+            request.user,
+            sha256,
+            size,
+            language=serializer.validated_data['language'],
+            profile=serializer.validated_data['profile'],
+            range_start=serializer.validated_data['start'],
+            range_end=serializer.validated_data['end'],
+        )
+        if original is not None:
+            video_upload = create_duplicate_upload(
+                request.user, original, discard_source=serializer.validated_data['discard_source']
+            )
+            response_serializer = VideoUploadSerializer(video_upload, context={'request': request})
+            return Response(
+                {'duplicate': True, 'upload': response_serializer.data},
+                status=status.HTTP_201_CREATED
+            )
+
+        return Response({
+            'duplicate': False,
+            'upload_session': create_upload_session(request.user, sha256, size),
+            'upload_url': request.build_absolute_uri('/api/upload/'),
+        })
+
+
+class CancelUploadView(APIView):
+    """
+    API endpoint for cancelling an upload.
+
+    Pending jobs are cancelled at once (200); running jobs are flagged and
+    stopped by their worker within seconds (202, status becomes `cancelled`).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk, *args, **kwargs):
+        video_upload = VideoUpload.objects.filter(pk=pk, user=request.user).first()
+        if video_upload is None:
+            return Response(
+                {'detail': 'No VideoUpload matches the given query.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        new_status = request_cancellation(video_upload)
+        if new_status is None:
+            return Response(
+                {'error': f'Upload is already {video_upload.status} and cannot be cancelled'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        video_upload.refresh_from_db()
+        response_serializer = VideoUploadSerializer(video_upload, context={'request': request})
+        return Response(
+            response_serializer.data,
+            status=status.HTTP_200_OK if new_status == 'cancelled' else status.HTTP_202_ACCEPTED
+        )
+
 
+class RegenerateUploadView(APIView):
+    """
+    API endpoint for re-running subtitle generation on a finished upload,
+    optionally with a different `language` or processing `profile`.
 
-class SubtitleDownloadView(generics.RetrieveAPIView):
-    """API endpoint for downloading generated subtitle files."""
-    queryset = VideoUpload.objects.all()
-    
-    def retrieve(self, request, *args, **kwargs):
+    The job starts from the cached preprocessed audio when available, so
+    extraction and preprocessing are skipped; otherwise the source is
+    processed again if it is still stored.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk, *args, **kwargs):
+        video_upload = VideoUpload.objects.filter(pk=pk, user=request.user).first()
+        if video_upload is None:
+            return Response(
+                {'detail': 'No VideoUpload matches the given query.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = RegenerateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if video_upload.status not in FINISHED_STATUSES:
+            return Response(
+                {'error': f'Upload is {video_upload.status}; wait for it to finish before regenerating'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        profile = get_profile(serializer.validated_data.get('profile') or video_upload.profile)
+        from_cache = find_artifact(video_upload, preprocessing=profile.preprocessing_key) is not None
+        if not from_cache and (video_upload.source_discarded_at or not file_exists(video_upload.video_file)):
+            return Response(
+                {'error': 'Neither cached audio nor the source file is available; please upload the file again'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        video_upload.language = serializer.validated_data.get('language', video_upload.language)
+        video_upload.profile = profile.name
+        video_upload.callback_url = serializer.validated_data.get('callback_url', video_upload.callback_url)
+        video_upload.range_start = serializer.validated_data.get('start', video_upload.range_start)
+        video_upload.range_end = serializer.validated_data.get('end', video_upload.range_end)
+        range_error = time_range_error(video_upload)
+        if range_error:
+            return Response({'start': [range_error]}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Conditional on the upload still being finished: of two concurrent requests only one
+        # requeues it, and a job that was claimed meanwhile is not reset under its worker
+        values = {
+            'language': video_upload.language,
+            'profile': video_upload.profile,
+            'callback_url': video_upload.callback_url,
+            'range_start': video_upload.range_start,
+            'range_end': video_upload.range_end,
+            'status': 'pending',
+            'error_message': None,
+            'cancel_requested_at': None,
+            'started_at': None,
+            'attempts': 0,
+            'updated_at': timezone.now(),
+        }
+        if not VideoUpload.objects.filter(pk=pk, status__in=FINISHED_STATUSES).update(**values):
+            video_upload.refresh_from_db(fields=['status'])
+            return Response(
+                {'error': f'Upload is {video_upload.status}; wait for it to finish before regenerating'},
+                status=status.HTTP_409_CONFLICT
+            )
+        for name, value in values.items():
+            setattr(video_upload, name, value)
+        # update() sends no signals
+        refresh_status_cache(video_upload.pk)
+        enqueue(video_upload)
+
+        response_serializer = VideoUploadSerializer(video_upload, context={'request': request})
+        return Response(
+            dict(response_serializer.data, from_cache=from_cache),
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class WebhookView(APIView):
+    """
+    API endpoint for the user's webhook: GET shows the URL and signing secret,
+    PUT sets the URL (`rotate_secret` replaces the secret), DELETE removes the URL.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        webhook, _ = UserWebhook.objects.get_or_create(user=request.user)
+        return Response(UserWebhookSerializer(webhook).data)
+
+    def put(self, request, *args, **kwargs):
+        webhook, _ = UserWebhook.objects.get_or_create(user=request.user)
+        serializer = UserWebhookSerializer(webhook, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if serializer.validated_data.pop('rotate_secret', False):
+            serializer.validated_data['secret'] = generate_webhook_secret()
+        serializer.save()
+        return Response(serializer.data)
+
+    def delete(self, request, *args, **kwargs):
+        UserWebhook.objects.filter(user=request.user).update(url='')
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class WebhookDeliveryListView(APIView):
+    """API endpoint listing the webhook deliveries of an upload (most recent first)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, *args, **kwargs):
+        video_upload = VideoUpload.objects.filter(pk=pk, user=request.user).first()
+        if video_upload is None:
+            return Response(
+                {'detail': 'No VideoUpload matches the given query.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        deliveries = video_upload.webhook_deliveries.all()[:100]
+        return Response(WebhookDeliverySerializer(deliveries, many=True).data)
+
+
+class VideoStatusView(View):
+    """
+    API endpoint for checking video processing status (async, for many concurrent pollers).
+
+    Returns the minimal status representation by default; `?fields=status,transcript_text`
+    selects any readable upload fields instead. Anyone may poll the status fields;
+    the others (transcript, callback URL, files, stats...) only to the owner and staff.
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request, pk):
+        fields = None
+        if request.GET.get('fields'):
+            fields = [name.strip() for name in request.GET['fields'].split(',') if name.strip()]
+            unknown = [name for name in fields if name not in readable_upload_fields()]
+            if unknown:
+                return JsonResponse(
+                    {'fields': f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(readable_upload_fields())}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            private = [name for name in fields if name not in STATUS_FIELDS]
+            if private:
+                error = await self.private_fields_error(request, pk, private)
+                if error is not None:
+                    return error
+
+        # Default fields are served from the status cache; the database (replica, if any) is only read on a cache miss
+        with replica_reads():
+            payload = await aget_status_payload(pk, fields)
+        if payload is None and has_replica():
+            # Just-created uploads may not have reached the replica yet
+            payload = await aget_status_payload(pk, fields)
+        if payload is None:
+            return JsonResponse(
+                {'detail': 'No VideoUpload matches the given query.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return JsonResponse(absolutize_payload(payload, request))
+
+    async def private_fields_error(self, request, pk, private):
+        """Return an error response unless the request is made by the upload's owner or staff."""
+        try:
+            user = await aauthenticate_request(request)
+        except InvalidToken as e:
+            return JsonResponse({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        if not user.is_authenticated:
+            return JsonResponse(
+                {'detail': f"Authentication is required for these fields: {', '.join(private)}"},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        row = await VideoUpload.objects.filter(pk=pk).values('user_id').afirst()
+        if row is None:
+            return JsonResponse({'detail': 'No VideoUpload matches the given query.'}, status=status.HTTP_404_NOT_FOUND)
+        if row['user_id'] != user.pk and not user.is_staff:
+            return JsonResponse(
+                {'detail': f"Only the owner of the upload can read these fields: {', '.join(private)}"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return None
+
+
+async def stream_stored_file(field_file, chunk_size=STREAM_CHUNK_SIZE):
+    """Stream a stored file in chunks without blocking the event loop."""
+    f = await sync_to_async(field_file.storage.open, thread_sensitive=False)(field_file.name, 'rb')
+    try:
+        while True:
+            data = await sync_to_async(f.read, thread_sensitive=False)(chunk_size)
+            if not data:
+                break
+            yield data
+    finally:
+        await sync_to_async(f.close, thread_sensitive=False)()
+
+
+class SubtitleDownloadView(View):
+    """API endpoint for downloading generated subtitle files (async streaming)."""
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request, pk):
         """Handle subtitle file download."""
-        video_upload = self.get_object()
+        with replica_reads():
+            video_upload = await VideoUpload.objects.filter(pk=pk).afirst()
+        if (video_upload is None or video_upload.status != 'completed') and has_replica():
+            # The replica may lag behind a job that just finished
+            video_upload = await VideoUpload.objects.filter(pk=pk).afirst()
+        if video_upload is None:
+            return JsonResponse(
+                {'detail': 'No VideoUpload matches the given query.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
         if video_upload.status != 'completed' or not video_upload.subtitle_file:
-            return Response(
+            return JsonResponse(
                 {'error': 'Subtitle file not available'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        subtitle_path = video_upload.subtitle_file.path
+        subtitle_file = video_upload.subtitle_file
         
-        if not os.path.exists(subtitle_path):
+        if not await sync_to_async(file_exists, thread_sensitive=False)(subtitle_file):
             return HttpResponseNotFound('Subtitle file not found')
         
+        # Return the file for download
+        filename = os.path.basename(video_upload.video_file.name)
+        base_filename = os.path.splitext(filename)[0]
+        
+        # With object storage, send the client straight to the bucket instead of proxying bytes
+        download_url = await sync_to_async(presigned_download_url, thread_sensitive=False)(
+            subtitle_file, f"{base_filename}.txt"
+        )
+        if download_url:
+            return HttpResponseRedirect(download_url)
+        
         # Check if file is empty
-        file_size = os.path.getsize(subtitle_path)
-        print(f"Subtitle file path: {subtitle_path}")
-        print(f"Subtitle file size: {file_size} bytes")
+        file_size_bytes = await sync_to_async(file_size, thread_sensitive=False)(subtitle_file)
+        print(f"Subtitle file: {subtitle_file.name}")
+        print(f"Subtitle file size: {file_size_bytes} bytes")
         
-        if file_size == 0:
-            return Response(
+        if file_size_bytes == 0:
+            return JsonResponse(
                 {'error': 'Subtitle file is empty. Please regenerate subtitles.'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Return the file for download
-        filename = os.path.basename(video_upload.video_file.name)
-        base_filename = os.path.splitext(filename)[0]
-        
+        # Stream the file instead of reading it into memory
+        response = StreamingHttpResponse(
+            stream_stored_file(subtitle_file),
+            content_type='text/plain; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{base_filename}.txt"'
+        response['Content-Length'] = file_size_bytes
+        return response
+
+
+class SubtitleExportView(View):
+    """
+    API endpoint for downloading many subtitle files at once as a ZIP archive.
+
+    Selects the user's completed uploads by `ids` or by a `created_after` /
+    `created_before` range, in the requested `formats` (srt, vtt, txt). The
+    archive is streamed while it is built, so the response starts at once.
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request):
         try:
-            # Read file content as text to ensure proper encoding
-            with open(subtitle_path, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-            
-            print(f"File content length: {len(file_content)} characters")
-            print(f"File content preview (first 200 chars): {file_content[:200]}")
-            
-            # Check if content is actually empty (after reading)
-            if not file_content or len(file_content.strip()) == 0:
-                print("WARNING: File content is empty after reading!")
-                return Response(
-                    {'error': 'Subtitle file is empty. Please regenerate subtitles.'}, 
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            # Create response with file content
-            response = HttpResponse(file_content, content_type='text/plain; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="{base_filename}.txt"'
-            response['Content-Length'] = len(file_content.encode('utf-8'))
-            
-            return response
-        except UnicodeDecodeError:
-            # If UTF-8 fails, try reading as binary
-            try:
-                with open(subtitle_path, 'rb') as f:
-                    file_content = f.read()
-                
-                if len(file_content) == 0:
-                    return Response(
-                        {'error': 'Subtitle file is empty. Please regenerate subtitles.'}, 
-                        status=status.HTTP_404_NOT_FOUND
-                    )
-                
-                response = HttpResponse(file_content, content_type='text/plain; charset=utf-8')
-                response['Content-Disposition'] = f'attachment; filename="{base_filename}.txt"'
-                response['Content-Length'] = len(file_content)
-                
-                return response
-            except Exception as e:
-                return Response(
-                    {'error': f'Error reading subtitle file: {str(e)}'}, 
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-        except Exception as e:
+            user = await aauthenticate_request(request)
+        except InvalidToken as e:
+            return JsonResponse({'detail': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        if not user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        serializer = ExportRequestSerializer(data=request.GET)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        options = serializer.validated_data
+        if not any(key in options for key in ('ids', 'created_after', 'created_before')):
+            return JsonResponse(
+                {'error': 'Select uploads with "ids" or "created_after"/"created_before"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        uploads = VideoUpload.objects.filter(user=user, status='completed').exclude(subtitle_file='')
+        if 'ids' in options:
+            uploads = uploads.filter(pk__in=options['ids'])
+        if 'created_after' in options:
+            uploads = uploads.filter(created_at__gte=options['created_after'])
+        if 'created_before' in options:
+            uploads = uploads.filter(created_at__lt=options['created_before'])
+        limit = getattr(settings, 'SUBTITLE_EXPORT_MAX_UPLOADS', 500)
+        with replica_reads():
+            uploads = [
+                upload async for upload in
+                uploads.only('id', 'video_file', 'subtitle_file', 'updated_at').order_by('created_at')[:limit + 1]
+            ]
+        if len(uploads) > limit:
+            return JsonResponse(
+                {'error': f'At most {limit} uploads can be exported at once; narrow the selection'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not uploads:
+            return JsonResponse(
+                {'error': 'No completed uploads match the selection'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        response = StreamingHttpResponse(
+            aiter_zip_export(uploads, options['formats']),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="subtitles-{timezone.now():%Y%m%d-%H%M%S}.zip"'
+        return response
+
+
+class TranscriptSearchView(APIView):
+    """API endpoint for full-text search across the current user's transcripts."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
             return Response(
-                {'error': f'Error reading subtitle file: {str(e)}'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+                {'error': 'Query parameter "q" is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        with replica_reads():
+            results = search_transcripts(request.user, query)
+        serializer = TranscriptSearchResultSerializer(
+            [{'upload': upload, 'segments': segments} for upload, segments in results],
+            many=True,
+            context={'request': request}
+        )
+        return Response({'query': query, 'results': serializer.data})
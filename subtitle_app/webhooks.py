@@ -0,0 +1,367 @@
+"""
+Signed job notifications for machine clients.
+
+When a job completes or fails, a delivery is logged for the upload's
+`callback_url` and for its owner's webhook URL (if set). A delivery thread
+running next to the job dispatcher POSTs the JSON payload with an HMAC-SHA256
+signature over "<timestamp>.<body>" made with the user's webhook secret:
+
+    X-Subtitle-Signature: t=<unix timestamp>,v1=<hex digest>
+
+Any 2xx response marks the delivery as delivered; anything else is retried
+with exponential backoff until SUBTITLE_WEBHOOK_MAX_ATTEMPTS is reached.
+Deliveries are claimed with a conditional update, so several processes can
+deliver from the same database without sending twice.
+
+Webhook URLs are chosen by users, so requests are only sent to public
+addresses: the host is resolved when the URL is set and the connected peer is
+checked again on delivery (which also catches DNS rebinding). Hosts in
+SUBTITLE_WEBHOOK_ALLOWED_HOSTS may resolve to private addresses.
+"""
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import UserWebhook, VideoUpload, WebhookDelivery
+
+WEBHOOK_EVENTS = {
+    'completed': 'upload.completed',
+    'failed': 'upload.failed',
+}
+
+
+def sign_payload(secret, timestamp, body):
+    """Return the hex HMAC-SHA256 of "<timestamp>.<body>" (body as bytes)."""
+    message = str(timestamp).encode('utf-8') + b'.' + body
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret, header, body, tolerance=300):
+    """Check an X-Subtitle-Signature header (for receivers written in Python)."""
+    try:
+        parts = dict(item.split('=', 1) for item in header.split(','))
+        timestamp = int(parts['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign_payload(secret, timestamp, body), parts.get('v1', ''))
+
+
+def absolute_url(path):
+    base_url = getattr(settings, 'SUBTITLE_PUBLIC_BASE_URL', '').rstrip('/')
+    return f"{base_url}{path}"
+
+
+def build_payload(video_upload, event):
+    completed = video_upload.status == 'completed'
+    return {
+        'event': event,
+        'upload': {
+            'id': video_upload.id,
+            'status': video_upload.status,
+            'error_message': video_upload.error_message,
+            'filename': video_upload.filename(),
+            'language': video_upload.language,
+            'profile': video_upload.profile,
+            'media_duration': video_upload.media_duration,
+            'start': video_upload.range_start,
+            'end': video_upload.range_end,
+        },
+        'status_url': absolute_url(f'/api/upload/{video_upload.id}/'),
+        'subtitle_url': absolute_url(f'/api/download/{video_upload.id}/') if completed else None,
+        'sent_at': timezone.now().isoformat(),
+    }
+
+
+def webhook_urls(video_upload):
+    """Return the URLs to notify about an upload (its callback URL and its owner's webhook)."""
+    urls = []
+    if video_upload.callback_url:
+        urls.append(video_upload.callback_url)
+    if video_upload.user_id:
+        user_url = UserWebhook.objects.filter(user_id=video_upload.user_id).values_list('url', flat=True).first()
+        if user_url and user_url not in urls:
+            urls.append(user_url)
+    return urls
+
+
+def queue_job_webhooks(upload_id):
+    """
+    Log deliveries for a job that has just completed or failed and wake the
+    delivery thread. Returns the number of deliveries queued.
+    """
+    video_upload = VideoUpload.objects.filter(pk=upload_id).first()
+    if video_upload is None or video_upload.status not in WEBHOOK_EVENTS:
+        return 0
+    urls = webhook_urls(video_upload)
+    if not urls:
+        return 0
+
+    event = WEBHOOK_EVENTS[video_upload.status]
+    payload = build_payload(video_upload, event)
+    WebhookDelivery.objects.bulk_create([
+        WebhookDelivery(upload=video_upload, url=url, event=event, payload=payload)
+        for url in urls
+    ])
+    print(f"Queued {event} webhook for upload {video_upload.id} to {len(urls)} URL(s)")
+    wake_delivery_worker()
+    return len(urls)
+
+
+class UnsafeWebhookURL(ValueError):
+    """Raised for webhook URLs that point at loopback, private or otherwise non-public addresses."""
+
+
+def host_allowed(host):
+    allowed = getattr(settings, 'SUBTITLE_WEBHOOK_ALLOWED_HOSTS', [])
+    return (host or '').lower() in {name.lower() for name in allowed}
+
+
+def check_address(address, host):
+    """Raise UnsafeWebhookURL unless `address` (an IP) is public or `host` is allowlisted."""
+    if host_allowed(host):
+        return
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    if not ip.is_global or ip.is_multicast:
+        raise UnsafeWebhookURL(f"Webhook host {host} resolves to a non-public address ({ip}).")
+
+
+def check_webhook_url(url):
+    """Resolve a webhook URL's host and raise UnsafeWebhookURL if any of its addresses is not public."""
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise UnsafeWebhookURL("Must be an http:// or https:// URL.")
+    if host_allowed(parsed.hostname):
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, parsed.port or 443, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        raise UnsafeWebhookURL(f"Could not resolve webhook host {parsed.hostname}.")
+    for address in addresses:
+        check_address(address, parsed.hostname)
+
+
+class CheckedHTTPConnection(http.client.HTTPConnection):
+    def connect(self):
+        super().connect()
+        check_address(self.sock.getpeername()[0], self.host)
+
+
+class CheckedHTTPSConnection(http.client.HTTPSConnection):
+    def connect(self):
+        super().connect()
+        check_address(self.sock.getpeername()[0], self.host)
+
+
+class CheckedHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(CheckedHTTPConnection, req)
+
+
+class CheckedHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(CheckedHTTPSConnection, req, context=self._context)
+
+
+# Every connection, including redirects, is checked against the peer it actually reached
+webhook_opener = urllib.request.build_opener(CheckedHTTPHandler, CheckedHTTPSHandler)
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt: exponential backoff with jitter, capped."""
+    base = getattr(settings, 'SUBTITLE_WEBHOOK_BACKOFF_SECONDS', 10.0)
+    cap = getattr(settings, 'SUBTITLE_WEBHOOK_MAX_BACKOFF_SECONDS', 3600.0)
+    delay = min(base * 2 ** max(attempts - 1, 0), cap)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def post_delivery(delivery, secret):
+    """POST a delivery; returns the HTTP status code (raises on network errors)."""
+    body = json.dumps(delivery.payload, separators=(',', ':')).encode('utf-8')
+    timestamp = int(time.time())
+    request = urllib.request.Request(
+        delivery.url,
+        data=body,
+        method='POST',
+        headers={
+            'Content-Type': 'application/json',
+            'User-Agent': 'subtitle-generator-webhooks',
+            'X-Subtitle-Event': delivery.event,
+            'X-Subtitle-Delivery': str(delivery.id),
+            'X-Subtitle-Signature': f"t={timestamp},v1={sign_payload(secret, timestamp, body)}",
+        },
+    )
+    timeout = getattr(settings, 'SUBTITLE_WEBHOOK_TIMEOUT', 10.0)
+    try:
+        with webhook_opener.open(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def deliver(delivery):
+    """
+    Attempt one claimed delivery and record the outcome. Returns True if it was delivered.
+
+    The outcome is only saved while the claim is still held (`next_attempt_at`
+    is the lease set by deliver_due); a delivery whose lease ran out may have
+    been claimed by another process meanwhile.
+    """
+    claimed_until = delivery.next_attempt_at
+    secret = ''
+    if delivery.upload.user_id:
+        # Per-upload callbacks are signed with the user's secret too; create it on first use
+        webhook, _ = UserWebhook.objects.get_or_create(user_id=delivery.upload.user_id)
+        secret = webhook.secret
+
+    now = timezone.now()
+    delivery.attempts += 1
+    delivery.last_attempt_at = now
+    give_up = delivery.attempts >= getattr(settings, 'SUBTITLE_WEBHOOK_MAX_ATTEMPTS', 8)
+    try:
+        delivery.response_status = post_delivery(delivery, secret)
+        delivery.last_error = '' if 200 <= delivery.response_status < 300 else f"HTTP {delivery.response_status}"
+    except UnsafeWebhookURL as e:
+        # Retrying would not change where the URL points
+        delivery.response_status = None
+        delivery.last_error = str(e)
+        give_up = True
+    except Exception as e:
+        delivery.response_status = None
+        delivery.last_error = str(e)[:1000]
+
+    if not delivery.last_error:
+        delivery.status = 'delivered'
+        delivery.delivered_at = now
+    elif give_up:
+        delivery.status = 'failed'
+    else:
+        delivery.next_attempt_at = now + timedelta(seconds=retry_delay(delivery.attempts))
+
+    saved = WebhookDelivery.objects.filter(
+        pk=delivery.pk, status='pending', next_attempt_at=claimed_until
+    ).update(
+        status=delivery.status,
+        attempts=delivery.attempts,
+        last_attempt_at=delivery.last_attempt_at,
+        response_status=delivery.response_status,
+        last_error=delivery.last_error,
+        next_attempt_at=delivery.next_attempt_at,
+        delivered_at=delivery.delivered_at,
+    )
+    if not saved:
+        print(f"Lost the claim on webhook {delivery.id} while sending it; its outcome was not recorded")
+        return False
+
+    if delivery.status == 'delivered':
+        print(f"Delivered {delivery.event} webhook {delivery.id} to {delivery.url}")
+    elif delivery.status == 'failed':
+        print(f"Giving up on webhook {delivery.id} to {delivery.url} after {delivery.attempts} attempts: {delivery.last_error}")
+    else:
+        print(f"Webhook {delivery.id} to {delivery.url} failed ({delivery.last_error}), "
+              f"retrying at {delivery.next_attempt_at.isoformat()}")
+    return delivery.status == 'delivered'
+
+
+def deliver_due(limit=50):
+    """Deliver pending deliveries whose next attempt is due. Returns the number attempted."""
+    # Claimed deliveries are leased until the request has certainly timed out
+    lease = timedelta(seconds=getattr(settings, 'SUBTITLE_WEBHOOK_TIMEOUT', 10.0) + 30)
+    due = list(
+        WebhookDelivery.objects
+        .filter(status='pending', next_attempt_at__lte=timezone.now())
+        .select_related('upload')
+        .order_by('next_attempt_at')[:limit]
+    )
+    attempted = 0
+    for delivery in due:
+        # Leased from the time of the claim: earlier sends in the batch may have taken a while
+        claimed_until = timezone.now() + lease
+        claimed = WebhookDelivery.objects.filter(
+            pk=delivery.pk, status='pending', next_attempt_at=delivery.next_attempt_at
+        ).update(next_attempt_at=claimed_until)
+        if not claimed:
+            continue
+        delivery.next_attempt_at = claimed_until
+        deliver(delivery)
+        attempted += 1
+    return attempted
+
+
+class WebhookDeliveryWorker:
+    """Background thread that delivers due webhooks; woken early when a delivery is queued."""
+
+    def __init__(self, poll_interval=None):
+        if poll_interval is None:
+            poll_interval = getattr(settings, 'SUBTITLE_WEBHOOK_POLL_INTERVAL', 5.0)
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self, daemon=True):
+        """Start the delivery thread (idempotent)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name='webhook-delivery', daemon=daemon)
+        self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                attempted = deliver_due()
+            except Exception as e:
+                print(f"Webhook delivery failed: {str(e)}")
+                attempted = 0
+            finally:
+                close_old_connections()
+            if not attempted:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+
+_delivery_worker = None
+_delivery_worker_lock = threading.Lock()
+
+
+def get_delivery_worker():
+    """Return the process-wide delivery worker (not started)."""
+    global _delivery_worker
+    with _delivery_worker_lock:
+        if _delivery_worker is None:
+            _delivery_worker = WebhookDeliveryWorker()
+        return _delivery_worker
+
+
+def wake_delivery_worker():
+    """Wake this process's delivery thread if it runs; otherwise another process's thread polls for it."""
+    if _delivery_worker is not None:
+        _delivery_worker.wake()
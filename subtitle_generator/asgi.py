@@ -1,5 +1,8 @@
 """
 ASGI config for subtitle_generator project.
+
+HTTP goes to Django; WebSocket connections go to the live transcription
+endpoint (subtitle_app/live.py).
 """
 
 import os
@@ -7,5 +10,16 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'subtitle_generator.settings')
+# Read by settings.py (persistent database connections are off by default under ASGI)
+os.environ.setdefault('SUBTITLE_SERVER_INTERFACE', 'asgi')
+
+django_application = get_asgi_application()
+
 
-application = get_asgi_application()
\ No newline at end of file
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        # Imported on the first connection, so HTTP-only processes don't load the audio stack
+        from subtitle_app.live import live_application
+        await live_application(scope, receive, send)
+        return
+    await django_application(scope, receive, send)